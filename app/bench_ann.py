@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs latency benchmark: IVF-flat and quantized (int8 / float16) scans
+against the exact float32 scan, with the memory each index holds. Each scan is
+timed per query (p50 / p99) and as one search_batch call over all the queries
+(ms per query), with its speedup over the exact scan.
+
+Runs fully offline on a synthetic clustered corpus (no embeddings provider
+needed). Example:
+
+    python bench_ann.py --n 200000 --dim 384 --nlist 512 --nprobe 1 4 8 16 32 --rerank 0 4
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from utils.ann import ExactIndex, IVFFlatIndex, QuantizedIndex
+from utils.vector_store import VectorStore
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    embs = centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return embs
+
+
+def build_store(vector_dir: str, embs: np.ndarray) -> VectorStore:
+    store = VectorStore(vector_dir)
+    n = embs.shape[0]
+    store._append_rows([f"doc_{i}" for i in range(n)], [""] * n, [{}] * n, embs)
+    return store
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    results, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        idxs, _ = index.search(q, k)
+        latencies.append(time.perf_counter() - t0)
+        results.append(set(int(i) for i in idxs))
+    lat = np.array(latencies) * 1000
+    return results, float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+
+def time_batch(index, queries: np.ndarray, k: int):
+    t0 = time.perf_counter()
+    idxs, _ = index.search_batch(queries, k)
+    per_query_ms = (time.perf_counter() - t0) * 1000 / queries.shape[0]
+    return [set(int(i) for i in row if i >= 0) for row in idxs], per_query_ms
+
+
+def recall_of(approx, exact) -> float:
+    return float(np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size (rows)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000, help="synthetic topic clusters")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--quantize", nargs="*", default=["int8", "float16"], choices=["int8", "float16"])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 4], help="exact re-rank factors for quantized scans (0 = none)")
+    args = parser.parse_args()
+
+    embs = synthetic_corpus(args.n, args.dim, args.clusters)
+    rng = np.random.default_rng(1)
+    queries = embs[rng.choice(args.n, size=args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as vector_dir:
+        store = build_store(vector_dir, embs)
+        exact, exact_p50, exact_p99 = time_queries(ExactIndex(store), queries, args.k)
+        _, exact_batch = time_batch(ExactIndex(store), queries, args.k)
+        print(f"exact            p50={exact_p50:8.3f}ms  p99={exact_p99:8.3f}ms  batch={exact_batch:7.3f}ms/q  recall@{args.k}=1.000")
+        float32_mb = args.n * args.dim * 4 / 2**20
+        report = {
+            "n": args.n,
+            "dim": args.dim,
+            "k": args.k,
+            "exact": {"p50_ms": exact_p50, "p99_ms": exact_p99, "batch_ms_per_query": exact_batch, "mb": float32_mb},
+            "ivf": [],
+            "quantized": [],
+        }
+
+        t0 = time.perf_counter()
+        ivf = IVFFlatIndex(store, nlist=args.nlist, nprobe=1)
+        ivf.sync()
+        build_s = time.perf_counter() - t0
+        print(f"ivf build (nlist={args.nlist}): {build_s:.2f}s")
+        report["ivf_build_s"] = build_s
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            approx, p50, p99 = time_queries(ivf, queries, args.k)
+            recall = recall_of(approx, exact)
+            print(f"ivf nprobe={nprobe:<4d} p50={p50:8.3f}ms  p99={p99:8.3f}ms  recall@{args.k}={recall:.3f}")
+            report["ivf"].append({"nlist": args.nlist, "nprobe": nprobe, "p50_ms": p50, "p99_ms": p99, "recall": recall})
+
+        for dtype in args.quantize:
+            quantized = QuantizedIndex(store, dtype=dtype)
+            quantized.sync()
+            mb = quantized.stats()["bytes"] / 2**20
+            print(f"{dtype} index: {mb:.1f}MB (float32 {float32_mb:.1f}MB)")
+            for rerank in args.rerank:
+                quantized.rerank = rerank
+                approx, p50, p99 = time_queries(quantized, queries, args.k)
+                batched, batch_ms = time_batch(quantized, queries, args.k)
+                recall, batch_recall = recall_of(approx, exact), recall_of(batched, exact)
+                print(
+                    f"{dtype:<7s} rerank={rerank:<3d} p50={p50:8.3f}ms ({exact_p50 / p50:.2f}x exact)  p99={p99:8.3f}ms  "
+                    f"batch={batch_ms:7.3f}ms/q ({exact_batch / batch_ms:.2f}x exact)  recall@{args.k}={recall:.3f} (batch {batch_recall:.3f})"
+                )
+                report["quantized"].append(
+                    {
+                        "dtype": dtype, "rerank": rerank, "mb": mb, "p50_ms": p50, "p99_ms": p99, "recall": recall,
+                        "batch_ms_per_query": batch_ms, "batch_recall": batch_recall,
+                        "speedup_p50": exact_p50 / p50, "speedup_batch": exact_batch / batch_ms,
+                    }
+                )
+
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Stub Gradient provider for offline benchmarks: OpenAI-compatible
+/v1/embeddings and /v1/chat/completions (plain and streaming) with
+configurable latency and no network access.
+
+Embeddings are feature-hashed bags of words, so texts that share words get
+similar vectors and vector search behaves sensibly on synthetic corpora.
+`hash_embed_ids` computes the same vectors for pre-tokenized corpora without
+going through HTTP. Example:
+
+    BENCH_STUB_EMBED_LATENCY_MS=20 uvicorn bench_stub:app --port 8765
+"""
+import asyncio
+import json
+import os
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DIM = int(os.getenv("BENCH_STUB_DIM", "384"))
+EMBED_LATENCY_MS = float(os.getenv("BENCH_STUB_EMBED_LATENCY_MS", "10"))
+LLM_LATENCY_MS = float(os.getenv("BENCH_STUB_LLM_LATENCY_MS", "50"))
+# non-zero dimensions per word in the hashed embedding
+HASH_FEATURES = 8
+ANSWER = "Doors open at 9:00 and the keynote starts at 10:30 in Hall B-12, see the schedule for details."
+
+
+@lru_cache(maxsize=200_000)
+def word_features(word: str, dim: int = DIM):
+    """(positions, signs) of a word's hashed features; deterministic across processes."""
+    rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+    return rng.integers(0, dim, HASH_FEATURES), rng.choice(np.array([-1.0, 1.0]), HASH_FEATURES)
+
+
+def hash_embed(texts, dim: int = DIM) -> np.ndarray:
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().split():
+            pos, sign = word_features(word, dim)
+            np.add.at(out[i], pos, sign)
+    return out
+
+
+def vocabulary_features(words, dim: int = DIM):
+    """Stacked word_features for a vocabulary: (V, HASH_FEATURES) positions and signs."""
+    feats = [word_features(w.lower(), dim) for w in words]
+    return np.stack([f[0] for f in feats]), np.stack([f[1] for f in feats])
+
+
+def hash_embed_ids(ids: np.ndarray, positions: np.ndarray, signs: np.ndarray, dim: int = DIM) -> np.ndarray:
+    """hash_embed for texts given as a (n, words) array of vocabulary ids."""
+    n = ids.shape[0]
+    flat = (np.arange(n)[:, None, None] * dim + positions[ids]).ravel()
+    out = np.bincount(flat, weights=signs[ids].ravel(), minlength=n * dim)
+    return out.reshape(n, dim).astype(np.float32)
+
+
+app = FastAPI(title="EventEase benchmark stub provider")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(EMBED_LATENCY_MS / 1000)
+    embs = hash_embed(texts)
+    data = [{"object": "embedding", "index": i, "embedding": e.tolist()} for i, e in enumerate(embs)]
+    return JSONResponse({"object": "list", "data": data, "model": body.get("model")})
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_LATENCY_MS / 1000)
+        return JSONResponse({"choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}}]})
+
+    words = ANSWER.split(" ")
+
+    async def events():
+        # first token after a third of the latency, the rest spread over the remainder
+        await asyncio.sleep(LLM_LATENCY_MS / 3000)
+        for word in words:
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n"
+            await asyncio.sleep(LLM_LATENCY_MS * 2 / 3000 / len(words))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the retrieval stack and the /chat pipeline.
+
+Runs against the stub provider in bench_stub.py (no Gradient account or
+network needed) on synthetic corpora and reports, per corpus size:
+
+  ingest   bulk commit throughput (append + index sync + persist) and
+           VectorStore.add_documents throughput through the HTTP provider
+  search   p50/p99 per retrieval mode, retrieval only and end to end
+           (query embedding included)
+  load     index load time and memory of a fresh process opening the store
+  chat     /chat throughput and latency of a `uvicorn main:app` process under
+           concurrent load, plus its time to liveness (/health) and readiness
+           (/ready) and its resident memory
+
+Results are written as JSON; compare two runs (e.g. before/after a commit)
+with --compare. Examples:
+
+    python bench_suite.py --sizes 1000 10000 100000 --out bench.json
+    python bench_suite.py --sizes 1000000 --skip-chat --out bench-1m.json
+    python bench_suite.py --compare base.json bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SYLLABLES = "ka lo mi ne su ta ri vo pe da lu ki mo za fe ro ni sa".split()
+
+# run in a fresh interpreter so load time and memory are not skewed by this process
+LOAD_SNIPPET = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+from utils.vector_store import VectorStore
+t1 = time.perf_counter()
+store = VectorStore(sys.argv[1])
+t2 = time.perf_counter()
+rss = None
+try:
+    with open("/proc/self/statm") as f:
+        rss = int(f.read().split()[1]) * resource.getpagesize() / 2**20
+except OSError:
+    pass
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+print(json.dumps({"import_s": t1 - t0, "load_s": t2 - t1, "rows": len(store), "rss_mb": rss, "peak_rss_mb": peak}))
+"""
+
+
+class SyntheticCorpus:
+    """
+    Deterministic topic-clustered chunks of pseudo-words, grouped into
+    documents (sources) spread over a few events. Any row range can be
+    generated on its own, so corpora larger than memory are built in blocks.
+    """
+
+    def __init__(self, vocab: int = 20000, topics: int = 200, words: int = 150, chunks_per_doc: int = 200, events: int = 8, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.words = words
+        self.chunks_per_doc = chunks_per_doc
+        self.events = events
+        self.seed = seed
+        vocabulary = set()
+        while len(vocabulary) < vocab:
+            vocabulary.add("".join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+        # room codes and times exercise the tokenizer's compound tokens
+        self.vocab = sorted(vocabulary)[: vocab - vocab // 50]
+        self.vocab += [f"{'abcdh'[i % 5]}-{i}" for i in range(vocab // 100)]
+        self.vocab += [f"{8 + i % 12}:{(i * 5) % 60:02d}" for i in range(vocab - len(self.vocab))]
+        self.vocab_arr = np.array(self.vocab, dtype=object)
+        self.topic_words = rng.integers(0, len(self.vocab), size=(topics, 100))
+
+    def token_ids(self, lo: int, hi: int):
+        rng = np.random.default_rng([self.seed, lo])
+        n = hi - lo
+        topics = rng.integers(0, self.topic_words.shape[0], n)
+        on_topic = self.topic_words[topics[:, None], rng.integers(0, 100, (n, self.words))]
+        background = (rng.zipf(1.3, (n, self.words)) - 1) % len(self.vocab)
+        ids = np.where(rng.random((n, self.words)) < 0.6, on_topic, background)
+        return ids, topics
+
+    def block(self, lo: int, hi: int):
+        """(docs, token ids) for rows lo..hi, shaped like utils/loader.py output."""
+        from utils.embedding_cache import content_hash
+
+        ids, topics = self.token_ids(lo, hi)
+        docs = []
+        for i, (row, topic) in enumerate(zip(ids, topics)):
+            doc = (lo + i) // self.chunks_per_doc
+            text = " ".join(self.vocab_arr[row])
+            source = f"brochure-{doc:05d}.pdf"
+            meta = {
+                "source": source,
+                "event_id": f"event-{doc % self.events}",
+                "tags": [f"topic-{topic % 20}"],
+                "hash": content_hash(text),
+                "pages": [(lo + i) % self.chunks_per_doc // 4 + 1],
+            }
+            docs.append({"id": f"{source}_{meta['hash']}", "text": text, "meta": meta})
+        return docs, ids
+
+    def queries(self, count: int, seed: int = 1):
+        rng = np.random.default_rng([self.seed, 10_000 + seed])
+        out = []
+        for _ in range(count):
+            words = self.vocab_arr[rng.choice(self.topic_words[rng.integers(self.topic_words.shape[0])], 5)].tolist()
+            if rng.random() < 0.2:
+                words.append(self.vocab[-1 - int(rng.integers(len(self.vocab) // 50))])
+            out.append("where is " + " ".join(words))
+        return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_rss_mb(pid: int | str = "self") -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _dir_mb(path: str) -> float:
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file()) / 2**20
+
+
+def _latency(samples) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def _start_server(module: str, port: int, env: dict) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=APP_DIR, env=env)
+
+
+def _wait_http(proc: subprocess.Popen, url: str, timeout: float) -> float:
+    """Seconds until `url` answers 200; raises if the process exits or the timeout passes."""
+    import httpx
+
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode} before {url} was up")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not up after {timeout:.0f}s")
+
+
+def _stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+async def bench_ingest(store, corpus: SyntheticCorpus, n: int, args) -> dict:
+    from bench_stub import hash_embed_ids, vocabulary_features
+
+    positions, signs = vocabulary_features(corpus.vocab, args.dim)
+    embedded = min(args.embed_chunks, n)
+    bulk = n - embedded
+    commit_s = 0.0
+    for lo in range(0, bulk, args.block):
+        hi = min(lo + args.block, bulk)
+        docs, ids = corpus.block(lo, hi)
+        embs = hash_embed_ids(ids, positions, signs, args.dim)
+        t0 = time.perf_counter()
+        store._add_embedded(docs, embs, override=False)
+        commit_s += time.perf_counter() - t0
+        print(f"  committed {hi}/{bulk} rows", flush=True)
+
+    # the rest goes through the real ingest path: HTTP embeddings + commit, one document per call
+    calls = []
+    for lo in range(bulk, n, corpus.chunks_per_doc):
+        docs, _ = corpus.block(lo, min(lo + corpus.chunks_per_doc, n))
+        t0 = time.perf_counter()
+        await store.add_documents(docs)
+        calls.append(time.perf_counter() - t0)
+    out = {
+        "bulk_rows": bulk,
+        "bulk_commit_s": commit_s,
+        "bulk_rows_per_s": bulk / commit_s if commit_s else None,
+        "add_documents_chunks": embedded,
+        "add_documents_s": float(sum(calls)),
+        "add_documents_chunks_per_s": embedded / sum(calls) if calls else None,
+    }
+    if calls:
+        out["add_documents_call"] = _latency(calls)
+    return out
+
+
+async def bench_search(store, corpus: SyntheticCorpus, args) -> dict:
+    from bench_stub import hash_embed
+    from utils.partitions import normalize_filters
+    from utils.vector_store import _normalize_rows
+
+    queries = corpus.queries(args.queries)
+    q_embs = _normalize_rows(hash_embed(queries, args.dim))
+    filters = {"event_id": "event-0"}
+    scoped = normalize_filters(filters)
+    # retrieval only: the query embedding is already known
+    direct = {
+        "vector": lambda q, e: store._search_vector(e, args.k),
+        "lexical": lambda q, e: store._search_lexical(q, args.k),
+        "hybrid": lambda q, e: store._search_hybrid(e, q, args.k),
+        "hybrid_filtered": lambda q, e: store._search_filtered(e, q, args.k, "hybrid", scoped),
+    }
+    out = {}
+    for name, fn in direct.items():
+        samples = []
+        for q, e in zip(queries, q_embs):
+            t0 = time.perf_counter()
+            fn(q, e)
+            samples.append(time.perf_counter() - t0)
+        out[name] = _latency(samples)
+
+    # all queries in one similarity_search_vectors call (tiled Q x N matmul), per query
+    t0 = time.perf_counter()
+    store.similarity_search_vectors(q_embs, args.k)
+    out["vector"]["batch_mean_ms"] = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    # end to end through VectorStore.search: query embedding via the stub, result rows materialized
+    for name, mode, f in (("vector", "vector", None), ("lexical", "lexical", None), ("hybrid", "hybrid", None), ("hybrid_filtered", "hybrid", filters)):
+        samples = []
+        for q in queries:
+            t0 = time.perf_counter()
+            await store.search(q, k=args.k, mode=mode, filters=f)
+            samples.append(time.perf_counter() - t0)
+        out[name]["e2e"] = _latency(samples)
+    return out
+
+
+def bench_load(vector_dir: str) -> dict:
+    proc = subprocess.run([sys.executable, "-c", LOAD_SNIPPET, vector_dir], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["disk_mb"] = _dir_mb(vector_dir)
+    return out
+
+
+async def _load_test(base: str, queries, concurrency: int, timeout: float) -> dict:
+    import httpx
+
+    pending = list(reversed(queries))
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while pending:
+            query = pending.pop()
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(f"{base}/chat", json={"query": query})
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    out = {"concurrency": concurrency, "requests": len(queries), "errors": errors, "wall_s": wall, "requests_per_s": len(latencies) / wall}
+    if latencies:
+        out.update(_latency(latencies))
+    return out
+
+
+async def bench_chat(data_dir: str, vector_dir: str, corpus: SyntheticCorpus, args) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATA_DIR": data_dir,
+        "VECTOR_DIR": vector_dir,
+        # measure the full pipeline, not the answer / retrieval caches
+        "ANSWER_CACHE_SIZE": "0",
+        "RETRIEVAL_CACHE_SIZE": "0",
+    }
+    t0 = time.perf_counter()
+    proc = _start_server("main:app", port, env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_http(proc, f"{base}/health", args.startup_timeout)
+        live_s = time.perf_counter() - t0
+        _wait_http(proc, f"{base}/ready", args.startup_timeout)
+        out = {"live_s": live_s, "startup_s": time.perf_counter() - t0, "rss_mb_idle": _proc_rss_mb(proc.pid), "runs": []}
+        print(f"  live after {live_s:.2f}s, ready after {out['startup_s']:.2f}s", flush=True)
+        for i, concurrency in enumerate(args.concurrency):
+            # distinct questions, so concurrent requests are never coalesced
+            queries = corpus.queries(args.chat_requests, seed=100 + i)
+            run = await _load_test(base, queries, concurrency, args.request_timeout)
+            print(f"  /chat c={concurrency:<4d} {run['requests_per_s']:8.1f} req/s  p50={run.get('p50_ms', 0):8.1f}ms  p99={run.get('p99_ms', 0):8.1f}ms  errors={run['errors']}", flush=True)
+            out["runs"].append(run)
+        out["rss_mb_loaded"] = _proc_rss_mb(proc.pid)
+        return out
+    finally:
+        _stop(proc)
+
+
+async def run_size(n: int, root: str, corpus: SyntheticCorpus, args) -> dict:
+    from utils.vector_store import VectorStore
+
+    data_dir = os.path.join(root, f"n{n}")
+    vector_dir = os.path.join(data_dir, "vector_store")
+    rss_before = _proc_rss_mb()
+    store = VectorStore(vector_dir)
+    result = {"n": n}
+    print(f"[n={n}] ingest", flush=True)
+    result["ingest"] = await bench_ingest(store, corpus, n, args)
+    result["ingest"]["rss_mb_delta"] = (_proc_rss_mb() - rss_before) if rss_before is not None else None
+    print(f"  bulk {result['ingest']['bulk_rows_per_s'] or 0:.0f} rows/s, add_documents {result['ingest']['add_documents_chunks_per_s'] or 0:.0f} chunks/s", flush=True)
+
+    print(f"[n={n}] search", flush=True)
+    result["search"] = await bench_search(store, corpus, args)
+    for mode, r in result["search"].items():
+        print(f"  {mode:<16s} p50={r['p50_ms']:8.3f}ms  p99={r['p99_ms']:8.3f}ms  e2e p50={r['e2e']['p50_ms']:8.3f}ms", flush=True)
+
+    print(f"[n={n}] load", flush=True)
+    result["load"] = bench_load(vector_dir)
+    print(f"  load {result['load']['load_s']:.3f}s  rss={result['load']['rss_mb'] or 0:.0f}MB  disk={result['load']['disk_mb']:.0f}MB", flush=True)
+
+    if not args.skip_chat:
+        print(f"[n={n}] chat", flush=True)
+        result["chat"] = await bench_chat(data_dir, vector_dir, corpus, args)
+    if not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return result
+
+
+async def run(args, root: str) -> list:
+    from utils import aio
+
+    corpus = SyntheticCorpus(words=args.chunk_words, chunks_per_doc=args.chunks_per_doc)
+    try:
+        return [await run_size(n, root, corpus, args) for n in args.sizes]
+    finally:
+        await aio.shutdown()
+
+
+def _environment(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _flatten(v, f"{prefix}.{k}" if prefix else k)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            key = f"c{v['concurrency']}" if isinstance(v, dict) and "concurrency" in v else str(i)
+            yield from _flatten(v, f"{prefix}.{key}")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def compare(base_path: str, new_path: str, threshold: float):
+    """Print metrics that changed by more than `threshold` (relative) between two reports."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{base['environment'].get('commit')} -> {new['environment'].get('commit')}")
+    old = {f"n{r['n']}.{k}": v for r in base["results"] for k, v in _flatten(r)}
+    for r in new["results"]:
+        for key, value in _flatten(r):
+            key = f"n{r['n']}.{key}"
+            if key not in old or not old[key]:
+                continue
+            change = (value - old[key]) / abs(old[key])
+            if abs(change) >= threshold:
+                print(f"{key:<60s} {old[key]:14.4f} -> {value:14.4f}  ({change:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="corpus sizes (chunks)")
+    parser.add_argument("--dim", type=int, default=384, help="stub embedding dimension")
+    parser.add_argument("--chunk-words", type=int, default=150, help="words per synthetic chunk (~1000 chars)")
+    parser.add_argument("--chunks-per-doc", type=int, default=200, help="chunks per synthetic source document")
+    parser.add_argument("--block", type=int, default=50000, help="rows per bulk commit")
+    parser.add_argument("--embed-chunks", type=int, default=2000, help="chunks ingested through add_documents + HTTP embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="search queries per mode")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="/chat client concurrency levels")
+    parser.add_argument("--chat-requests", type=int, default=200, help="/chat requests per concurrency level")
+    parser.add_argument("--skip-chat", action="store_true", help="skip the /chat load test")
+    parser.add_argument("--embed-latency-ms", type=float, default=10.0, help="stub embeddings latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="stub chat completion latency")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--workdir", help="where stores are built (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the built stores")
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two reports instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1, help="--compare: smallest relative change shown")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+        return
+
+    root = args.workdir or tempfile.mkdtemp(prefix="eventease-bench-")
+    os.makedirs(root, exist_ok=True)
+    stub_port = _free_port()
+    # settings are read at import time, so configure the stub provider before importing the app
+    os.environ.update(
+        {
+            "DATA_DIR": os.path.join(root, "data"),
+            "VECTOR_DIR": os.path.join(root, "data", "vector_store"),
+            "USE_GRADIENT": "true",
+            "USE_GRADIENT_EMBEDDINGS": "true",
+            "GRADIENT_API_KEY": "bench",
+            "GRADIENT_API_BASE": f"http://127.0.0.1:{stub_port}",
+            "GRADIENT_EMBEDDING_MODEL": "bench-hash-embedding",
+            "EMBEDDING_CACHE_ENABLED": "false",
+            "RETRIEVAL_CACHE_SIZE": "0",
+            "BENCH_STUB_DIM": str(args.dim),
+            "BENCH_STUB_EMBED_LATENCY_MS": str(args.embed_latency_ms),
+            "BENCH_STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        }
+    )
+    stub = _start_server("bench_stub:app", stub_port, dict(os.environ))
+    try:
+        _wait_http(stub, f"http://127.0.0.1:{stub_port}/health", 60)
+        results = asyncio.run(run(args, root))
+    finally:
+        _stop(stub)
+        if not args.workdir and not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {"environment": _environment(args), "results": results}
+    report["environment"]["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
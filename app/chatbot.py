@@ -1,11 +1,24 @@
 # app/chatbot.py
+import asyncio
 import os
-from typing import List
+import threading
+from typing import Dict, List
 from utils.vector_store import VectorStore
-from utils.loader import load_document_chunks
+from utils.loader import iter_document_chunks
+from utils.embedding_cache import content_hash
+from utils.local_embeddings import loaded_embedders
 from utils.config import settings
+from utils.aio import get_http_client, iter_blocking, run_blocking, upstream_limit
+from utils.batcher import SingleFlight
+from utils.metrics import CHAT_REQUESTS, CHAT_STAGE_SECONDS, INGEST_STAGE_SECONDS, PROVIDER_ERRORS
+from utils.cache import TTLCache, normalize_query
+from utils.conversations import make_conversation_store
+from utils.prompt import build_prompt
+from utils.tokens import count_tokens
+import hashlib
 import json
-import requests
+import time
+import httpx
 import logging
 
 # OpenAI fallback removed to enforce Gradient-only usage
@@ -14,128 +27,504 @@ openai = None
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
 
-# Read gradient settings via config/settings or env
-USE_GRADIENT_ENV = os.getenv("USE_GRADIENT", "true")
-USE_GRADIENT_SETTINGS = getattr(settings, "USE_GRADIENT", True)
-USE_GRADIENT = (USE_GRADIENT_ENV.lower() in ("1", "true", "yes") if isinstance(USE_GRADIENT_ENV, str) else USE_GRADIENT_ENV) or USE_GRADIENT_SETTINGS
-GRADIENT_API_KEY = os.getenv("GRADIENT_API_KEY") or getattr(settings, "GRADIENT_API_KEY", None)
-GRADIENT_API_BASE = os.getenv("GRADIENT_API_BASE", getattr(settings, "GRADIENT_API_BASE", "https://apis.gradient.network"))
-GRADIENT_MODEL = os.getenv("GRADIENT_MODEL", getattr(settings, "GRADIENT_MODEL", "gpt-4o-mini"))
+# OpenAI settings removed - using Gradient AI only
 
-# Debug logging
-LOGGER.info(f"USE_GRADIENT: {USE_GRADIENT}")
-LOGGER.info(f"GRADIENT_API_KEY: {'***' + GRADIENT_API_KEY[-4:] if GRADIENT_API_KEY else 'NOT SET'}")
-LOGGER.info(f"GRADIENT_API_BASE: {GRADIENT_API_BASE}")
-LOGGER.info(f"GRADIENT_MODEL: {GRADIENT_MODEL}")
 
-# OpenAI settings removed - using Gradient AI only
+def _cap_top_k(top_k: int) -> int:
+    # clients cannot make the prompt (and the search) arbitrarily large
+    return max(1, min(top_k, settings.MAX_TOP_K))
+
+
+def _document_chunks(filepath: str, progress=None, meta: Dict | None = None):
+    """The file's chunks with `meta` added, parsed lazily; runs on the worker pool (see iter_blocking)."""
+    labels = json.dumps(meta, sort_keys=True) if meta else None
+    chunks = iter_document_chunks(filepath, progress=progress)
+    parsing = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            c = next(chunks, None)
+            parsing += time.perf_counter() - started
+            if c is None:
+                break
+            if meta:
+                c["meta"].update(meta)
+                # relabelling a document counts as a change, so its chunks are re-stored
+                c["meta"]["hash"] = content_hash(f"{labels}\0{c['text']}")
+                c["id"] = f"{c['meta']['source']}_{c['meta']['hash']}"
+            yield c
+    finally:
+        chunks.close()
+        # time spent extracting and chunking, not waiting for the embeddings
+        INGEST_STAGE_SECONDS.observe(parsing, stage="parse")
 
 class EventChatbot:
     def __init__(self):
         """
-        Initialize vector store (loads persisted index if present).
+        Cheap by design: the persisted vector index and other heavy components
+        are loaded by warm-up (start_warmup), or on first use of `vs`.
         """
-        self.vs = VectorStore(vector_dir=settings.VECTOR_DIR)
-        self.conversations = {}
+        # Read gradient settings via config/settings or env
+        use_gradient_env = os.getenv("USE_GRADIENT", "true")
+        self.use_gradient = use_gradient_env.lower() in ("1", "true", "yes") or getattr(settings, "USE_GRADIENT", True)
+        self.gradient_api_key = os.getenv("GRADIENT_API_KEY") or getattr(settings, "GRADIENT_API_KEY", None)
+        self.gradient_api_base = os.getenv("GRADIENT_API_BASE", getattr(settings, "GRADIENT_API_BASE", "https://apis.gradient.network"))
+        self.gradient_model = os.getenv("GRADIENT_MODEL", getattr(settings, "GRADIENT_MODEL", "gpt-4o-mini"))
+        self._vs: VectorStore | None = None
+        self._vs_lock = threading.Lock()
+        self._warmup: asyncio.Task | None = None
+        # failed attempts in a row, and the pending retry of the last one
+        self._warmup_failures = 0
+        self._warmup_retry: asyncio.TimerHandle | None = None
+        self.warmup_seconds: float | None = None
+        self._watcher: asyncio.Task | None = None
+        # conversation history backend (memory / sqlite / redis), see utils/conversations.py
+        self.conversations = make_conversation_store()
+        # (generation, normalized query, context ids, model) -> answer
+        self.answer_cache = TTLCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL)
+        # identical conversation-less completions in flight share one upstream call
+        self.llm_calls = SingleFlight()
 
-    def ingest_document(self, filepath: str, override: bool = False):
-        chunks = load_document_chunks(filepath)
-        self.vs.add_documents(chunks, override=override)
-        return {"added": len(chunks)}
+    @property
+    def vs(self) -> VectorStore:
+        """The vector store; opened here (blocking) if warm-up has not done it yet."""
+        if self._vs is None:
+            with self._vs_lock:
+                if self._vs is None:
+                    self._vs = VectorStore(vector_dir=settings.VECTOR_DIR)
+        return self._vs
 
-    def retrieve(self, query: str, top_k: int = 4):
-        return self.vs.similarity_search(query, k=top_k)
+    def start_warmup(self) -> asyncio.Task:
+        """
+        Load the vector index, the tokenizer and (if PRELOAD_LOCAL_EMBEDDINGS) the
+        local embedding model in the background. Idempotent; a failed warm-up
+        is retried with backoff (WARMUP_RETRY_SECONDS), or at once by the next call.
+        """
+        task = self._warmup
+        if task is None or task.get_loop() is not asyncio.get_running_loop() or (task.done() and not self.ready):
+            if self._warmup_retry is not None:
+                self._warmup_retry.cancel()
+                self._warmup_retry = None
+            self._warmup = asyncio.get_running_loop().create_task(self._warm_up())
+            self._warmup.add_done_callback(self._warmup_done)
+        return self._warmup
 
-    def _build_prompt(self, query: str, contexts: List[dict], conv_history: List[dict] | None = None):
-        system = (
-            "You are EventEase — an assistant answering user questions about an event. "
-            "Answer concisely and naturally without mentioning chunk IDs or source references."
+    def _warmup_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            self._warmup_failures = 0
+            return
+        self._warmup_failures += 1
+        # /ready must recover without a request to kick it (the health check only reads it)
+        delay = min(settings.WARMUP_RETRY_SECONDS * 2 ** (self._warmup_failures - 1), settings.WARMUP_RETRY_MAX_SECONDS)
+        LOGGER.error("Warm-up failed (attempt %d): %s; retrying in %.1fs.", self._warmup_failures, error, delay)
+        self._warmup_retry = task.get_loop().call_later(delay, self.start_warmup)
+
+    async def _warm_up(self):
+        started = time.perf_counter()
+        LOGGER.info(
+            "Gradient chat: %s (model %s, key %s)",
+            self.gradient_api_base,
+            self.gradient_model,
+            "***" + self.gradient_api_key[-4:] if self.gradient_api_key else "NOT SET",
         )
-        ctx_texts = "\n\n".join([f"CHUNK_ID:{c['id']}\n{c['text']}" for c in contexts])
-        prompt_parts = [system, f"Context:\n{ctx_texts}", "Conversation:"]
-        if conv_history:
-            for m in conv_history:
-                prompt_parts.append(f"{m['role'].upper()}: {m['text']}")
-        prompt_parts.append(f"USER: {query}")
-        prompt_parts.append("ASSISTANT:")
-        return "\n\n".join(prompt_parts)
+        store = await run_blocking(lambda: self.vs)
+        # the BPE tables would otherwise be loaded inside the first request
+        await run_blocking(count_tokens, "warm-up")
+        if settings.PRELOAD_LOCAL_EMBEDDINGS:
+            try:
+                await run_blocking(store.preload_local_model)
+            except Exception as e:
+                # the fallback stays lazy; not a reason to refuse traffic
+                LOGGER.warning("Could not preload local embedding model: %s", e)
+        self.warmup_seconds = time.perf_counter() - started
+        LOGGER.info("Warm-up finished in %.2fs (%d live rows).", self.warmup_seconds, store.live_count)
+        if settings.INDEX_WATCH_INTERVAL > 0 and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.get_running_loop().create_task(self._watch_index(settings.INDEX_WATCH_INTERVAL))
+
+    async def _watch_index(self, interval: float):
+        """Pick up documents ingested by other workers (see VectorStore.refresh)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_blocking(self.vs.refresh)
+            except Exception as e:
+                LOGGER.warning("Vector index refresh failed: %s", e)
+
+    def close(self):
+        """Stop background tasks (index watcher, unfinished warm-up) and flush the embedding cache."""
+        for task in (self._watcher, self._warmup):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._warmup_retry is not None:
+            self._warmup_retry.cancel()
+            self._warmup_retry = None
+        self._watcher = None
+        vs = self._vs
+        if vs is not None and vs.emb_cache is not None:
+            vs.emb_cache.flush()
+
+    @property
+    def ready(self) -> bool:
+        task = self._warmup
+        return task is not None and task.done() and not task.cancelled() and task.exception() is None
 
-    def _call_gradient_chat(self, prompt: str, max_tokens: int = 300, temperature: float = 0.7):
+    async def wait_ready(self):
+        """Wait for warm-up, starting it if needed; raises if it failed."""
+        if not self.ready:
+            await asyncio.shield(self.start_warmup())
+
+    def readiness(self) -> Dict:
+        task = self._warmup
+        if task is None or not task.done():
+            return {"status": "starting"}
+        if not self.ready:
+            out = {"status": "failed", "error": "cancelled" if task.cancelled() else str(task.exception())}
+            retry = self._warmup_retry
+            if retry is not None and not retry.cancelled():
+                out["attempts"] = self._warmup_failures
+                out["retry_in"] = round(max(0.0, retry.when() - time.monotonic()), 1)
+            return out
+        return {"status": "ready", "rows": self.vs.live_count, "warmup_seconds": self.warmup_seconds}
+
+    async def ingest_document(self, filepath: str, override: bool = False, progress=None, meta: Dict | None = None):
         """
-        Calls DigitalOcean Gradient AI Serverless Inference API.
-        Documentation: https://docs.digitalocean.com/products/ai-ml/gradient/how-to/serverless-inference/
+        meta: extra filterable metadata for every chunk, e.g. {"event_id": ..., "tags": [...]}
         """
-        if not GRADIENT_API_KEY:
+        await self.wait_ready()
+        # PDF extraction and chunking are CPU-bound; they run on the worker pool a
+        # batch at a time, and each batch is embedded while the next one is parsed
+        chunks = iter_blocking(_document_chunks(filepath, progress=progress, meta=meta), settings.INGEST_STREAM_BATCH)
+        if override:
+            # wipe the whole store, other documents included
+            return await self.vs.add_documents(chunks, override=True, progress=progress)
+        # new version of this document: only new or changed chunks are embedded
+        return await self.vs.replace_source(
+            os.path.basename(filepath), chunks, progress=progress, event_id=(meta or {}).get("event_id")
+        )
+
+    def stats(self, recall: bool = False):
+        out = {
+            "ready": self.ready,
+            "conversations": len(self.conversations),
+            "answer_cache": self.answer_cache.stats(),
+            "llm_single_flight": self.llm_calls.stats(),
+        }
+        # store stats would block on (or trigger) the index load
+        vs = self._vs
+        if vs is not None:
+            if recall:
+                # only on request: re-estimates the quantized index's recall now
+                vs.measure_index_recall()
+            out.update(
+                vector_store={
+                    "rows": vs.live_count,
+                    "tombstoned": len(vs) - vs.live_count,
+                    "index": vs.index.name,
+                    "memory": vs.memory_stats(),
+                },
+                embedding_cache=vs.emb_cache.stats() if vs.emb_cache else None,
+                query_batcher=vs.query_batcher.stats(),
+                retrieval_cache=vs.results_cache.stats(),
+            )
+        # only once the local model has been used (fallback or primary)
+        local = loaded_embedders()
+        if local:
+            out["local_embeddings"] = [e.stats() for e in local]
+        return out
+
+    async def retrieve(self, query: str, top_k: int = 4, mode: str | None = None, filters: Dict | None = None):
+        await self.wait_ready()
+        return await self.vs.search(query, k=top_k, mode=mode or settings.RETRIEVAL_MODE, filters=filters)
+
+    def _build_prompt(self, query: str, contexts: List[dict], conv_history: List[dict] | None = None):
+        """(prompt, token usage) assembled within settings.PROMPT_MAX_TOKENS, see utils/prompt.py."""
+        return build_prompt(query, contexts, conv_history)
+
+    def _gradient_chat_request(self, prompt: str, max_tokens: int, temperature: float, stream: bool = False):
+        if not self.gradient_api_key:
             raise RuntimeError("GRADIENT_API_KEY not set.")
 
         # Use the official DigitalOcean Gradient AI endpoint
-        url = f"{GRADIENT_API_BASE}/v1/chat/completions"
+        url = f"{self.gradient_api_base}/v1/chat/completions"
         
-        LOGGER.info(f"Calling DigitalOcean Gradient AI: {url}")
-        LOGGER.info(f"Using model: {GRADIENT_MODEL}")
+        LOGGER.debug(f"Calling DigitalOcean Gradient AI: {url} (model {self.gradient_model})")
         
         headers = {
-            "Authorization": f"Bearer {GRADIENT_API_KEY}",
+            "Authorization": f"Bearer {self.gradient_api_key}",
             "Content-Type": "application/json",
         }
         
         # Format according to DigitalOcean Gradient AI documentation
         payload = {
-            "model": GRADIENT_MODEL,
+            "model": self.gradient_model,
             "messages": [
                 {"role": "user", "content": prompt}
             ],
             "temperature": temperature,
             "max_tokens": max_tokens
         }
+        if stream:
+            payload["stream"] = True
+        return url, headers, payload
+
+    async def _call_gradient_chat(self, prompt: str, max_tokens: int = 300, temperature: float = 0.7):
+        """
+        Calls DigitalOcean Gradient AI Serverless Inference API.
+        Documentation: https://docs.digitalocean.com/products/ai-ml/gradient/how-to/serverless-inference/
+        """
+        url, headers, payload = self._gradient_chat_request(prompt, max_tokens, temperature)
         
         try:
-            resp = requests.post(url, headers=headers, json=payload, timeout=30)
-            LOGGER.info(f"Response status: {resp.status_code}")
+            async with upstream_limit("gradient-chat"):
+                resp = await get_http_client().post(url, headers=headers, json=payload)
+            LOGGER.debug(f"Response status: {resp.status_code}")
             
             if resp.status_code == 200:
                 data = resp.json()
-                LOGGER.info(f"Response received: {data}")
                 # Handle DigitalOcean Gradient AI response format
                 if "choices" in data and len(data["choices"]) > 0:
                     message = data["choices"][0].get("message", {})
                     content = message.get("content", "")
                     return content.strip()
                 else:
-                    LOGGER.warning(f"Unexpected response format: {data}")
+                    LOGGER.warning(f"Unexpected response format: {str(data)[:200]}")
                     return "Response received but format not recognized."
             else:
+                PROVIDER_ERRORS.inc(upstream="gradient-chat", status=str(resp.status_code))
                 LOGGER.error(f"API returned status {resp.status_code}: {resp.text[:200]}")
                 raise RuntimeError(f"DigitalOcean Gradient AI API error: {resp.status_code} - {resp.text[:200]}")
                 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
+            PROVIDER_ERRORS.inc(upstream="gradient-chat", status="transport")
             LOGGER.error(f"Request failed: {e}")
             raise RuntimeError(f"Failed to connect to DigitalOcean Gradient AI: {e}")
 
+    async def _stream_gradient_chat(self, prompt: str, max_tokens: int = 300, temperature: float = 0.7):
+        """
+        Same call as _call_gradient_chat with OpenAI-compatible `stream: true`;
+        yields content deltas as the server-sent chunks arrive. The response is
+        read by a separate task, so the "gradient-chat" slot is held until the
+        upstream is done, not until a slow client has read every delta.
+        """
+        url, headers, payload = self._gradient_chat_request(prompt, max_tokens, temperature, stream=True)
+        # at most max_tokens deltas, so the buffer stays small
+        deltas: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.ensure_future(self._read_gradient_stream(url, headers, payload, deltas))
+        # the error is re-raised below, unless the client has gone by then
+        reader.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            while True:
+                delta = await deltas.get()
+                if delta is None:
+                    break
+                yield delta
+            await reader
+        finally:
+            # the client went away (or we were cancelled) before the end of the answer
+            reader.cancel()
+
+    async def _read_gradient_stream(self, url: str, headers: Dict, payload: Dict, deltas: asyncio.Queue):
+        """Put the content deltas of a streamed completion on `deltas`, then None."""
+        try:
+            async with upstream_limit("gradient-chat"):
+                async with get_http_client().stream("POST", url, headers=headers, json=payload) as resp:
+                    if resp.status_code != 200:
+                        PROVIDER_ERRORS.inc(upstream="gradient-chat", status=str(resp.status_code))
+                        body = (await resp.aread()).decode("utf-8", errors="ignore")
+                        LOGGER.error(f"API returned status {resp.status_code}: {body[:200]}")
+                        raise RuntimeError(f"DigitalOcean Gradient AI API error: {resp.status_code} - {body[:200]}")
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except json.JSONDecodeError:
+                            LOGGER.warning(f"Skipping malformed stream chunk: {data[:200]}")
+                            continue
+                        choices = chunk.get("choices") or []
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if delta:
+                            deltas.put_nowait(delta)
+        except httpx.HTTPError as e:
+            PROVIDER_ERRORS.inc(upstream="gradient-chat", status="transport")
+            LOGGER.error(f"Request failed: {e}")
+            raise RuntimeError(f"Failed to connect to DigitalOcean Gradient AI: {e}")
+        finally:
+            deltas.put_nowait(None)
+
+    async def _complete(self, prompt: str, shared: bool, max_tokens: int = 300, temperature: float = 0.7):
+        """_call_gradient_chat, coalesced with identical in-flight calls when `shared`."""
+        if not shared:
+            return await self._call_gradient_chat(prompt, max_tokens, temperature)
+        key = (hashlib.sha256(prompt.encode("utf-8")).hexdigest(), self.gradient_model, temperature, max_tokens)
+        return await self.llm_calls.do(key, lambda: self._call_gradient_chat(prompt, max_tokens, temperature))
+
     # OpenAI function removed - using Gradient AI only
 
-    def answer_query(self, query: str, conversation_id: str | None = None, top_k: int = 4):
-        conv_history = None
-        if conversation_id:
-            conv_history = self.conversations.get(conversation_id, [])
+    async def answer_query(
+        self,
+        query: str,
+        conversation_id: str | None = None,
+        top_k: int = 4,
+        retrieval: str | None = None,
+        filters: Dict | None = None,
+        usage: Dict | None = None,
+    ):
+        """
+        usage: if given, filled with the request's token accounting (see utils/prompt.py)
+        """
+        with CHAT_STAGE_SECONDS.time(stage="history_load"):
+            conv_history = await self._load_history(conversation_id)
 
-        contexts = self.retrieve(query, top_k=top_k)
-        prompt = self._build_prompt(query, contexts, conv_history)
+        contexts = await self.retrieve(query, top_k=_cap_top_k(top_k), mode=retrieval, filters=filters)
+        cache_key = self._answer_cache_key(query, contexts, conversation_id)
+        if cache_key is not None:
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                CHAT_REQUESTS.inc(cached="true")
+                if usage is not None:
+                    usage.update(cached=True, prompt_tokens=0, completion_tokens=0)
+                return cached
+        with CHAT_STAGE_SECONDS.time(stage="prompt_build"):
+            prompt, prompt_usage = self._build_prompt(query, contexts, conv_history)
 
         # Use Gradient AI only; hard error if it fails
         try:
-            answer = self._call_gradient_chat(prompt)
-            LOGGER.info("Successfully got response from Gradient AI")
+            with CHAT_STAGE_SECONDS.time(stage="llm"):
+                answer = await self._complete(prompt, shared=conversation_id is None)
         except Exception as e:
             LOGGER.error(f"Gradient chat call failed: {e}")
             raise
+        if usage is not None:
+            usage.update(prompt_usage, cached=False, completion_tokens=count_tokens(answer))
 
-        # Save conversation history
+        if cache_key is not None:
+            self.answer_cache.set(cache_key, answer)
+        with CHAT_STAGE_SECONDS.time(stage="history_update"):
+            await self._save_turn(conversation_id, query, answer)
+        CHAT_REQUESTS.inc(cached="false")
+        return answer
+
+    async def answer_batch(
+        self,
+        queries: List[str],
+        top_k: int = 4,
+        retrieval: str | None = None,
+        filters: Dict | None = None,
+        concurrency: int | None = None,
+    ):
+        """
+        Answer many conversation-less questions: retrieval for all of them runs as
+        one batch (see VectorStore.search_batch), then at most `concurrency` LLM
+        calls are in flight (capped at CHAT_BATCH_CONCURRENCY). Yields {"index", "query", "answer", "usage"} (or
+        {"index", "query", "error"}) per question, in completion order.
+        """
+        await self.wait_ready()
+        with CHAT_STAGE_SECONDS.time(stage="search"):
+            contexts = await self.vs.search_batch(queries, k=_cap_top_k(top_k), mode=retrieval or settings.RETRIEVAL_MODE, filters=filters)
+        # a request may lower the batch's share of the upstream, not raise it
+        slots = asyncio.Semaphore(max(1, min(concurrency or settings.CHAT_BATCH_CONCURRENCY, settings.CHAT_BATCH_CONCURRENCY)))
+
+        async def answer(i: int):
+            query = queries[i]
+            try:
+                cache_key = self._answer_cache_key(query, contexts[i], None)
+                cached = self.answer_cache.get(cache_key)
+                if cached is not None:
+                    CHAT_REQUESTS.inc(cached="true")
+                    return {"index": i, "query": query, "answer": cached, "usage": {"cached": True, "prompt_tokens": 0, "completion_tokens": 0}}
+                prompt, usage = self._build_prompt(query, contexts[i])
+                async with slots:
+                    with CHAT_STAGE_SECONDS.time(stage="llm"):
+                        text = await self._complete(prompt, shared=True)
+                self.answer_cache.set(cache_key, text)
+                CHAT_REQUESTS.inc(cached="false")
+                return {"index": i, "query": query, "answer": text, "usage": {**usage, "cached": False, "completion_tokens": count_tokens(text)}}
+            except Exception as e:
+                LOGGER.error(f"Batch question {i} failed: {e}")
+                return {"index": i, "query": query, "error": str(e)}
+
+        tasks = [asyncio.ensure_future(answer(i)) for i in range(len(queries))]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # the client went away: don't keep calling the LLM for nobody
+            for task in tasks:
+                task.cancel()
+
+    async def stream_answer(
+        self,
+        query: str,
+        conversation_id: str | None = None,
+        top_k: int = 4,
+        retrieval: str | None = None,
+        filters: Dict | None = None,
+        usage: Dict | None = None,
+    ):
+        """
+        Streaming variant of answer_query: yields answer tokens as they arrive and
+        records the full answer in the conversation once the stream completes.
+        """
+        with CHAT_STAGE_SECONDS.time(stage="history_load"):
+            conv_history = await self._load_history(conversation_id)
+
+        contexts = await self.retrieve(query, top_k=_cap_top_k(top_k), mode=retrieval, filters=filters)
+        cache_key = self._answer_cache_key(query, contexts, conversation_id)
+        if cache_key is not None:
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                CHAT_REQUESTS.inc(cached="true")
+                if usage is not None:
+                    usage.update(cached=True, prompt_tokens=0, completion_tokens=0)
+                yield cached
+                return
+        with CHAT_STAGE_SECONDS.time(stage="prompt_build"):
+            prompt, prompt_usage = self._build_prompt(query, contexts, conv_history)
+
+        parts = []
+        # time to the last token; includes time the client takes to read the stream
+        # (the upstream slot is released as soon as the answer has arrived)
+        started = time.perf_counter()
+        async for token in self._stream_gradient_chat(prompt):
+            parts.append(token)
+            yield token
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+
+        answer = "".join(parts).strip()
+        if usage is not None:
+            usage.update(prompt_usage, cached=False, completion_tokens=count_tokens(answer))
+        if cache_key is not None:
+            self.answer_cache.set(cache_key, answer)
+        with CHAT_STAGE_SECONDS.time(stage="history_update"):
+            await self._save_turn(conversation_id, query, answer)
+        CHAT_REQUESTS.inc(cached="false")
+
+    def _answer_cache_key(self, query: str, contexts: List[dict], conversation_id: str | None):
+        # answers depend on history, so only conversation-less requests are cached
         if conversation_id:
-            hist = self.conversations.setdefault(conversation_id, [])
-            hist.append({"role": "user", "text": query})
-            hist.append({"role": "assistant", "text": answer})
-            if len(hist) > 30:
-                self.conversations[conversation_id] = hist[-30:]
+            return None
+        return (self.vs.generation, normalize_query(query), tuple(c["id"] for c in contexts), self.gradient_model)
 
-        return answer
+    async def _load_history(self, conversation_id: str | None):
+        if not conversation_id:
+            return None
+        if self.conversations.blocking:
+            return await run_blocking(self.conversations.get, conversation_id)
+        return self.conversations.get(conversation_id)
+
+    async def _save_turn(self, conversation_id: str | None, query: str, answer: str):
+        # Save conversation history (trimmed to the store's token budget)
+        if not conversation_id:
+            return
+        turn = [{"role": "user", "text": query}, {"role": "assistant", "text": answer}]
+        if self.conversations.blocking:
+            await run_blocking(self.conversations.append, conversation_id, turn)
+        else:
+            self.conversations.append(conversation_id, turn)
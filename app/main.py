@@ -1,15 +1,31 @@
 # app/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import shutil
+import json
+import logging
 import os
 from pathlib import Path
+from typing import List, Literal
 
 from utils.config import settings
+from utils import aio, metrics
+from utils.jobs import JobManager
 from chatbot import EventChatbot
 
-app = FastAPI(title="EventEase Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load the index etc. in the background: /health answers at once, /ready when warm
+    bot.start_warmup()
+    yield
+    bot.close()
+    # close the pooled Gradient HTTP client and the CPU worker pool
+    await aio.shutdown()
+
+app = FastAPI(title="EventEase Backend", lifespan=lifespan)
 
 # CORS configuration
 allowed_origins = ["*"] if settings.DEBUG else [
@@ -31,41 +47,191 @@ app.add_middleware(
 Path(settings.DATA_DIR).mkdir(parents=True, exist_ok=True)
 Path(settings.VECTOR_DIR).mkdir(parents=True, exist_ok=True)
 
-# instantiate chatbot (loads vector db if exists)
+LOGGER = logging.getLogger(__name__)
+
+# instantiate chatbot (the vector db is loaded by warm-up, see lifespan)
 bot = EventChatbot()
+# background ingestion jobs; status is shared with the other workers through DATA_DIR
+jobs = JobManager(
+    max_workers=settings.INGEST_WORKERS,
+    retention=settings.INGEST_JOB_RETENTION,
+    status_dir=settings.INGEST_JOB_STATUS_DIR or os.path.join(settings.DATA_DIR, "jobs"),
+)
+
+# gauges are read only when /metrics is scraped
+metrics.Gauge("eventease_vector_rows", "Live (searchable) rows in the vector store.", lambda: bot.vs.live_count if bot.ready else None)
+metrics.Gauge("eventease_vector_tombstoned_rows", "Deleted rows still held in segments.", lambda: len(bot.vs) - bot.vs.live_count if bot.ready else None)
+metrics.Gauge("eventease_conversations", "Conversations held by the conversation store.", lambda: len(bot.conversations))
+metrics.Gauge("eventease_ingest_jobs_running", "Ingest jobs currently running.", lambda: sum(j.status == "running" for j in jobs.list()))
+metrics.Gauge("eventease_llm_calls_in_flight", "Distinct LLM completions in flight.", lambda: bot.llm_calls.stats()["in_flight"])
+
+class ChatFilter(BaseModel):
+    # a list matches any of its values; all given fields must match
+    source: str | List[str] | None = None
+    event_id: str | List[str] | None = None
+    tags: List[str] | None = None
+
+class RetrievalOptions(BaseModel):
+    """Retrieval settings shared by the chat endpoints."""
+    top_k: int | None = 4
+    # "vector", "lexical" or "hybrid"; defaults to settings.RETRIEVAL_MODE
+    retrieval: Literal["vector", "lexical", "hybrid"] | None = None
+    filters: ChatFilter | None = None
+
+    def filter_dict(self):
+        return self.filters.model_dump(exclude_none=True) if self.filters else None
 
-class ChatRequest(BaseModel):
+class ChatRequest(RetrievalOptions):
     query: str
     conversation_id: str | None = None
-    top_k: int | None = 4
 
 @app.get("/health")
 def health():
     return {"status": "ok", "service": "EventEase", "version": "0.1"}
 
-@app.post("/ingest")
-async def ingest(file: UploadFile = File(...), override: bool = False):
+@app.get("/ready")
+def ready():
+    """Readiness: 503 until startup warm-up (index load, model preload) has finished."""
+    state = bot.readiness()
+    if state["status"] != "ready":
+        return JSONResponse(state, status_code=503)
+    return state
+
+@app.get("/stats")
+def stats(recall: bool = False):
+    # a sync endpoint runs on the threadpool, so ?recall=true does not block the loop
+    return bot.stats(recall=recall)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _save_upload(src, target: str):
+    with open(target, "wb") as buffer:
+        shutil.copyfileobj(src, buffer)
+
+@app.post("/ingest", status_code=202)
+async def ingest(
+    file: UploadFile = File(...),
+    override: bool = False,
+    event_id: str | None = None,
+    tags: List[str] | None = Query(None),
+):
     """
     Upload a PDF or text file to ingest into vector store.
+    Re-uploading a file replaces its previous version (unchanged chunks are not
+    re-embedded); override=true wipes every document first.
+    event_id / tags label every chunk for filtered /chat requests.
+    Returns a job id immediately; poll GET /ingest/{job_id} for progress.
     """
     filename = file.filename
     target = os.path.join(settings.DATA_DIR, filename)
 
     # Save uploaded file
-    with open(target, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await aio.run_blocking(_save_upload, file.file, target)
+
+    meta = {}
+    if event_id:
+        meta["event_id"] = event_id
+    if tags:
+        meta["tags"] = tags
+    job = jobs.submit(filename, lambda job: bot.ingest_document(target, override=override, progress=job.progress, meta=meta))
+    return {"status": "queued", "job_id": job.id, "filename": filename}
 
-    try:
-        bot.ingest_document(target, override=override)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/ingest")
+def list_ingest_jobs():
+    return {"jobs": [job.to_dict() for job in jobs.list()]}
 
-    return {"status": "success", "filename": filename}
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job.")
+    return job.to_dict()
+
+@app.delete("/ingest/{job_id}")
+def cancel_ingest(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job.")
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status} ({job.stage}) and can no longer be cancelled.")
+    return job.to_dict()
 
 @app.post("/chat")
 async def chat(req: ChatRequest):
     if not req.query or req.query.strip() == "":
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
-    answer = bot.answer_query(req.query, conversation_id=req.conversation_id, top_k=req.top_k or 4)
-    return {"answer": answer}
+    usage = {}
+    answer = await bot.answer_query(
+        req.query, conversation_id=req.conversation_id, top_k=req.top_k or 4, retrieval=req.retrieval, filters=req.filter_dict(), usage=usage
+    )
+    return {"answer": answer, "usage": usage}
+
+
+class ChatBatchRequest(RetrievalOptions):
+    queries: List[str]
+    # LLM calls in flight for this batch; defaults to (and is capped at) settings.CHAT_BATCH_CONCURRENCY
+    concurrency: int | None = None
+
+@app.post("/chat/batch")
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Answer many independent (conversation-less) questions, e.g. to pre-warm the
+    answer cache or evaluate answers after an ingest. Streams one JSON object per
+    line (NDJSON) as answers complete: {"index", "query", "answer", "usage"} or
+    {"index", "query", "error"}; a failure of the whole batch is {"error": ...}.
+    """
+    if not req.queries or any(not q or not q.strip() for q in req.queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty.")
+    if len(req.queries) > settings.CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CHAT_BATCH_MAX_QUERIES} queries per batch.")
+
+    async def lines():
+        try:
+            async for item in bot.answer_batch(
+                req.queries, top_k=req.top_k or 4, retrieval=req.retrieval, filters=req.filter_dict(), concurrency=req.concurrency
+            ):
+                yield json.dumps(item) + "\n"
+        except Exception as e:
+            LOGGER.error(f"Batch chat failed: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-Sent Events variant of /chat: one `data: {"token": ...}` event per
+    generated chunk, then `event: done` with the full answer and token usage
+    (or `event: error`).
+    """
+    if not req.query or req.query.strip() == "":
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    async def events():
+        parts = []
+        usage = {}
+        try:
+            async for token in bot.stream_answer(
+                req.query, conversation_id=req.conversation_id, top_k=req.top_k or 4, retrieval=req.retrieval, filters=req.filter_dict(), usage=usage
+            ):
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            LOGGER.error(f"Streaming chat failed: {e}")
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        yield _sse({"answer": "".join(parts).strip(), "usage": usage}, event="done")
 
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,6 +2,7 @@
 
 import requests
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -42,13 +43,20 @@ def test_file_upload():
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.text}")
         
-        if response.status_code == 200:
-            print("✅ File upload successful!")
-            try:
-                json_response = response.json()
-                print(f"Response: {json_response}")
-            except:
-                print("Response is not JSON format")
+        if response.status_code == 202:
+            print("✅ File upload accepted, waiting for ingest job...")
+            job_id = response.json()["job_id"]
+            job = {}
+            for _ in range(60):
+                job = requests.get(f"{url}/{job_id}", timeout=10).json()
+                if job["status"] in ("succeeded", "failed", "cancelled"):
+                    break
+                time.sleep(1)
+            print(f"Job: {job}")
+            if job.get("status") == "succeeded":
+                print("✅ File ingested successfully!")
+            else:
+                print(f"❌ Ingest job ended with status {job.get('status')}")
         else:
             print(f"❌ File upload failed with status {response.status_code}")
             
@@ -0,0 +1,64 @@
+# app/tests/conftest.py
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+# settings are read when utils.config is first imported: keep tests off real data and providers
+_DATA_DIR = tempfile.mkdtemp(prefix="eventease-tests-")
+os.environ.update(
+    DATA_DIR=_DATA_DIR,
+    VECTOR_DIR=os.path.join(_DATA_DIR, "vector_store"),
+    USE_GRADIENT_EMBEDDINGS="false",
+    CONVERSATION_BACKEND="memory",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.vector_store import VectorStore  # noqa: E402
+
+DIM = 16
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """Deterministic pseudo-random vector per text."""
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+
+class FakeEmbedder:
+    """Stands in for the embeddings provider and records every text it embeds."""
+
+    def __init__(self):
+        self.texts = []
+        # called with the texts before they are embedded, e.g. to change the store meanwhile
+        self.on_embed = None
+
+    async def __call__(self, texts, progress=None, slots=None):
+        self.texts.extend(texts)
+        if self.on_embed:
+            self.on_embed(texts)
+        if progress:
+            progress("embedding", len(texts), len(texts))
+        return np.stack([fake_embedding(t) for t in texts])
+
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
+
+
+@pytest.fixture
+def make_store(tmp_path, embedder):
+    """VectorStore factory on one temp directory, embedding with `embedder` and no embedding cache."""
+
+    def make():
+        store = VectorStore(str(tmp_path / "vectors"))
+        store.emb_cache = None
+        store._embed_uncached = embedder
+        return store
+
+    return make
+
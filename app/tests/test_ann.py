@@ -0,0 +1,179 @@
+# app/tests/test_ann.py
+import numpy as np
+import pytest
+
+from utils import segments
+from utils.ann import IVFFlatIndex, QuantizedIndex
+from utils.config import settings
+
+from conftest import DIM
+
+
+def clustered(n, seed, centers=24):
+    """n unit vectors spread around a fixed set of cluster centres."""
+    rng = np.random.default_rng(seed)
+    means = np.random.default_rng(42).standard_normal((centers, DIM))
+    vecs = means[rng.integers(centers, size=n)] + 0.3 * rng.standard_normal((n, DIM))
+    return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def fill(store, vecs, tag):
+    docs = [{"id": f"{tag}:{i}", "text": f"{tag} {i}", "meta": {"source": tag}} for i in range(len(vecs))]
+    store._add_embedded(docs, vecs, override=False)
+
+
+def queries(vecs, n=20, seed=7):
+    rng = np.random.default_rng(seed)
+    picks = vecs[rng.choice(len(vecs), size=n, replace=False)]
+    qs = picks + 0.1 * rng.standard_normal(picks.shape).astype(np.float32)
+    return qs / np.linalg.norm(qs, axis=1, keepdims=True)
+
+
+def recall(store, qs, k=10):
+    exact, _ = store.similarity_search_vectors(qs, k, exact=True)
+    approx, _ = store.similarity_search_vectors(qs, k)
+    return np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)])
+
+
+@pytest.fixture
+def ivf_store(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX", "ivf")
+    monkeypatch.setattr(settings, "IVF_NLIST", 16)
+    monkeypatch.setattr(settings, "IVF_NPROBE", 4)
+
+    def make():
+        store = make_store()
+        assert isinstance(store.index, IVFFlatIndex)
+        return store
+
+    return make
+
+
+def test_ivf_answers_exactly_until_trained(ivf_store):
+    store = ivf_store()
+    vecs = clustered(100, seed=1)
+    fill(store, vecs, "a")
+    assert not store.index.trained
+    qs = queries(vecs)
+    assert recall(store, qs) == 1.0
+
+
+def test_ivf_recall_against_exact(ivf_store):
+    store = ivf_store()
+    vecs = np.vstack([clustered(300, seed=1), clustered(300, seed=2)])
+    fill(store, vecs[:300], "a")
+    fill(store, vecs[300:], "b")
+    assert store.index.trained and store.index.count == 600
+    assert recall(store, queries(vecs)) >= 0.9
+
+    # tombstoned rows are skipped by the probed lists
+    qs = queries(vecs, n=1)
+    (best,), _ = store.similarity_search_vectors(qs, 1)
+    store._mark_deleted([best[0]])
+    (after,), _ = store.similarity_search_vectors(qs, 10)
+    assert best[0] not in after
+
+
+def test_ivf_reopen_loads_quantizer_and_segment_parts(ivf_store, monkeypatch):
+    store = ivf_store()
+    vecs = np.vstack([clustered(300, seed=1), clustered(300, seed=2)])
+    fill(store, vecs[:300], "a")
+    fill(store, vecs[300:], "b")
+    names = [seg["name"] for seg in segments.read_manifest(store.vector_dir)["segments"]]
+    assert store.index._parts == set(names)
+    qs = queries(vecs)
+    expected = store.similarity_search_vectors(qs, 10)
+
+    def no_training(self):
+        raise AssertionError("the saved centroids should have been loaded")
+
+    monkeypatch.setattr(IVFFlatIndex, "_train", no_training)
+    reopened = ivf_store()
+    assert reopened.index.quantizer_id == store.index.quantizer_id
+    assert reopened.index._parts == set(names)
+    assert reopened.index.count == 600
+    got = reopened.similarity_search_vectors(qs, 10)
+    np.testing.assert_array_equal(got[0], expected[0])
+    np.testing.assert_allclose(got[1], expected[1], rtol=1e-6)
+
+
+@pytest.fixture(params=["int8", "float16"])
+def quantized_store(request, make_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX", request.param)
+
+    def make(rerank=4):
+        monkeypatch.setattr(settings, "QUANTIZED_RERANK", rerank)
+        store = make_store()
+        assert isinstance(store.index, QuantizedIndex) and store.index.name == request.param
+        return store
+
+    return make
+
+
+def test_quantized_codes_widen_exactly(quantized_store):
+    store = quantized_store()
+    fill(store, clustered(300, seed=1), "a")
+    index = store.index
+    rows = np.arange(index.count)
+    widened = np.empty((index.count, DIM), dtype=np.float32)
+    index._widen(index.codes[: index.count], widened)
+    np.testing.assert_array_equal(widened, index.codes[: index.count].astype(np.float32))
+    # the codes approximate the float32 rows
+    np.testing.assert_allclose(index._decode(rows), store._row_vectors(rows), atol=0.02)
+
+
+@pytest.mark.parametrize("rerank, floor", [(4, 0.95), (0, 0.8)])
+def test_quantized_recall_against_exact(quantized_store, rerank, floor):
+    store = quantized_store(rerank=rerank)
+    vecs = np.vstack([clustered(300, seed=1), clustered(300, seed=2)])
+    fill(store, vecs[:300], "a")
+    fill(store, vecs[300:], "b")
+    qs = queries(vecs)
+    assert recall(store, qs) >= floor
+
+    # the tiled batch scan matches one query at a time
+    idxs, sims = store.index.search_batch(qs, 10)
+    for q, row_ids, scores in zip(qs, idxs, sims):
+        one_ids, one_scores = store.index.search(q, 10)
+        np.testing.assert_array_equal(row_ids, one_ids)
+        np.testing.assert_allclose(scores, one_scores, rtol=1e-5, atol=1e-6)
+
+    # tombstoned rows are never candidates
+    (best,), _ = store.similarity_search_vectors(qs[:1], 1)
+    store._mark_deleted([best[0]])
+    (after,), _ = store.similarity_search_vectors(qs[:1], 10)
+    assert best[0] not in after
+
+
+def test_quantized_recall_is_cached_by_save(quantized_store, monkeypatch):
+    store = quantized_store()
+    fill(store, clustered(300, seed=1), "a")
+    measured = store.index.stats()["recall"]
+    assert measured["measured_at_rows"] == 300
+    assert measured["recall_reranked"] >= 0.95
+
+    def no_measuring(self, *args, **kwargs):
+        raise AssertionError("stats() must not measure recall")
+
+    monkeypatch.setattr(QuantizedIndex, "recall", no_measuring)
+    assert store.index.stats()["recall"] == measured
+    assert store.memory_stats()
+
+
+def test_quantized_reopen_loads_segment_parts(quantized_store, monkeypatch):
+    store = quantized_store()
+    vecs = np.vstack([clustered(300, seed=1), clustered(300, seed=2)])
+    fill(store, vecs[:300], "a")
+    fill(store, vecs[300:], "b")
+    names = [seg["name"] for seg in segments.read_manifest(store.vector_dir)["segments"]]
+    assert store.index._parts == set(names)
+
+    def no_encoding(self, vecs):
+        raise AssertionError("the saved codes should have been loaded")
+
+    monkeypatch.setattr(QuantizedIndex, "_encode", no_encoding)
+    reopened = quantized_store()
+    assert reopened.index.count == 600
+    np.testing.assert_array_equal(reopened.index.codes[:600], store.index.codes[:600])
+    qs = queries(vecs)
+    np.testing.assert_array_equal(reopened.similarity_search_vectors(qs, 10)[0], store.similarity_search_vectors(qs, 10)[0])
@@ -0,0 +1,217 @@
+# app/tests/test_api.py
+import asyncio
+import json
+import re
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import chatbot
+import main
+from utils import aio
+from utils.config import settings
+
+
+class FakeLLM:
+    """Stands in for the Gradient chat completions endpoint and records the prompts it gets."""
+
+    def __init__(self):
+        self.prompts = []
+        self.in_flight = self.max_in_flight = 0
+
+    @staticmethod
+    def answer_for(prompt):
+        question = re.findall(r"^USER: (.*)$", prompt, re.M)[-1]
+        return f"Answer to {question}"
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        prompt = payload["messages"][0]["content"]
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # let the other calls of a batch start
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        if "fail" in self.answer_for(prompt):
+            return httpx.Response(503, text="overloaded")
+        answer = self.answer_for(prompt)
+        if not payload.get("stream"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": answer}}]})
+        words = answer.split(" ")
+        chunks = [{"choices": [{"delta": {"content": w if i == 0 else " " + w}}]} for i, w in enumerate(words)]
+        body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+
+@pytest.fixture
+def api(monkeypatch, make_store):
+    monkeypatch.setattr(settings, "INDEX_WATCH_INTERVAL", 0)
+    llm = FakeLLM()
+    transport = httpx.MockTransport(llm.handle)
+    monkeypatch.setattr(chatbot, "get_http_client", lambda: httpx.AsyncClient(transport=transport))
+    bot = chatbot.EventChatbot()
+    bot.gradient_api_key = "test-key"
+    bot._vs = make_store()
+    monkeypatch.setattr(main, "bot", bot)
+    with TestClient(main.app) as client:
+        client.llm = llm
+        client.bot = bot
+        yield client
+
+
+def test_failed_warmup_is_retried_until_ready(monkeypatch, make_store):
+    monkeypatch.setattr(settings, "INDEX_WATCH_INTERVAL", 0)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_SECONDS", 0.05)
+    bot = chatbot.EventChatbot()
+    bot._vs = make_store()
+    warm_up, attempts = bot._warm_up, []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OSError("volume not mounted")
+        await warm_up()
+
+    bot._warm_up = flaky
+    monkeypatch.setattr(main, "bot", bot)
+    with TestClient(main.app) as client:
+        statuses = []
+        for _ in range(200):
+            resp = client.get("/ready")
+            statuses.append(resp.json()["status"])
+            if resp.status_code == 200:
+                break
+            time.sleep(0.01)
+    # only /ready was polled, nothing called wait_ready()
+    assert "failed" in statuses and statuses[-1] == "ready"
+    assert len(attempts) == 3
+
+
+def ingest(client, name, text):
+    resp = client.post("/ingest", files={"file": (name, text.encode("utf-8"), "text/plain")})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+    for _ in range(200):
+        state = client.get(f"/ingest/{job_id}").json()
+        if state["status"] not in ("queued", "running"):
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"ingest job did not finish: {state}")
+
+
+def test_ingest_then_chat(api):
+    assert api.get("/ready").json()["status"] == "ready"
+    state = ingest(api, "faq.txt", "Doors open at 9am.\n\nThe venue is the Riverside Hall.")
+    assert (state["status"], state["result"]) == ("succeeded", {"added": 1, "unchanged": 0, "removed": 0})
+
+    resp = api.post("/chat", json={"query": "When do doors open?"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["answer"] == "Answer to When do doors open?"
+    assert body["usage"]["cached"] is False and body["usage"]["chunks_used"] == 1
+    assert "Doors open at 9am." in api.llm.prompts[-1]
+
+    # the same conversation-less question is answered from the cache
+    again = api.post("/chat", json={"query": "when do doors open"}).json()
+    assert again["usage"]["cached"] is True
+    assert len(api.llm.prompts) == 1
+
+
+def test_chat_keeps_conversation_history(api):
+    ingest(api, "faq.txt", "Doors open at 9am.")
+    api.post("/chat", json={"query": "When do doors open?", "conversation_id": "c1"})
+    api.post("/chat", json={"query": "And parking?", "conversation_id": "c1"})
+    assert "USER: When do doors open?\n\nASSISTANT: Answer to When do doors open?" in api.llm.prompts[-1]
+    assert api.bot.conversations.get("c1")[-1] == {"role": "assistant", "text": "Answer to And parking?"}
+
+
+def test_chat_rejects_empty_queries_and_reports_upstream_errors(api):
+    assert api.post("/chat", json={"query": "  "}).status_code == 400
+    assert api.post("/chat", json={"query": "hi", "retrieval": "fuzzy"}).status_code == 422
+    with pytest.raises(RuntimeError, match="503"):
+        api.post("/chat", json={"query": "please fail"})
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_chat_stream_sends_tokens_then_done(api):
+    ingest(api, "faq.txt", "Doors open at 9am.")
+    with api.stream("POST", "/chat/stream", json={"query": "When do doors open?", "conversation_id": "c1"}) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = sse_events(resp.read().decode("utf-8"))
+
+    tokens = [data["token"] for event, data in events if event == "message"]
+    assert "".join(tokens) == "Answer to When do doors open?"
+    assert len(tokens) > 1
+    event, done = events[-1]
+    assert event == "done"
+    assert done["answer"] == "Answer to When do doors open?"
+    assert done["usage"]["cached"] is False and done["usage"]["chunks_used"] == 1
+    # the streamed answer is recorded like a /chat answer
+    assert api.bot.conversations.get("c1")[-1]["text"] == "Answer to When do doors open?"
+
+
+def test_chat_stream_reports_upstream_errors_as_an_event(api):
+    resp = api.post("/chat/stream", json={"query": "please fail"})
+    assert resp.status_code == 200
+    (event, data), = sse_events(resp.text)
+    assert event == "error" and "503" in data["detail"]
+
+
+def test_stream_releases_the_upstream_slot_before_a_slow_client_is_done(api, monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_CONCURRENCY", {"gradient-chat": 1})
+    monkeypatch.setattr(aio, "_upstream_limits", {})
+
+    async def main():
+        stream = api.bot._stream_gradient_chat("USER: When do doors open?")
+        tokens = [await stream.__anext__()]
+        # the client has not asked for more, but the whole answer has arrived
+        await asyncio.sleep(0.05)
+        assert not aio.upstream_limit("gradient-chat").locked()
+        tokens.extend([token async for token in stream])
+        return "".join(tokens)
+
+    assert asyncio.run(main()) == "Answer to When do doors open?"
+
+
+def test_chat_batch_streams_one_line_per_question(api):
+    ingest(api, "faq.txt", "Doors open at 9am.\n\nParking is behind the venue.")
+    queries = ["When do doors open?", "Where can I park?", "please fail", "When do doors open?"]
+    resp = api.post("/chat/batch", json={"queries": queries, "retrieval": "hybrid", "filters": {"source": "faq.txt"}})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted((json.loads(line) for line in resp.text.splitlines()), key=lambda item: item["index"])
+
+    assert [item["query"] for item in lines] == queries
+    assert lines[0]["answer"] == lines[3]["answer"] == "Answer to When do doors open?"
+    assert lines[1]["answer"] == "Answer to Where can I park?"
+    assert "503" in lines[2]["error"]
+    # identical questions share one upstream call
+    assert len(api.llm.prompts) == 3
+
+
+def test_chat_batch_validates_the_request(api):
+    assert api.post("/chat/batch", json={"queries": []}).status_code == 400
+    assert api.post("/chat/batch", json={"queries": ["ok", " "]}).status_code == 400
+    too_many = ["q"] * (settings.CHAT_BATCH_MAX_QUERIES + 1)
+    assert api.post("/chat/batch", json={"queries": too_many}).status_code == 400
+
+
+def test_chat_batch_concurrency_is_capped(api, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_BATCH_CONCURRENCY", 2)
+    queries = [f"Question {i}?" for i in range(8)]
+    resp = api.post("/chat/batch", json={"queries": queries, "concurrency": 1000})
+    assert len(resp.text.splitlines()) == 8
+    assert len(api.llm.prompts) == 8 and api.llm.max_in_flight == 2
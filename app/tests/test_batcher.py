@@ -0,0 +1,138 @@
+# app/tests/test_batcher.py
+import asyncio
+
+import pytest
+
+from utils.batcher import MicroBatcher, SingleFlight
+
+
+class Recorder:
+    """Batch function that records the batches it is called with."""
+
+    def __init__(self, delay: float = 0.0, error: Exception | None = None):
+        self.batches = []
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [item * 10 for item in items]
+
+
+def test_micro_batcher_coalesces_concurrent_requests():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch=32, max_wait=0.01)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in [1, 2, 3, 2]))
+
+    assert asyncio.run(main()) == [10, 20, 30, 20]
+    assert fn.batches == [[1, 2, 3]]
+    stats = batcher.stats()
+    assert (stats["requests"], stats["coalesced"], stats["batches"]) == (4, 1, 1)
+    assert stats["avg_batch_size"] == 3
+    assert stats["batch_size_histogram"] == {"4": 1}
+
+
+def test_micro_batcher_flushes_full_batches_without_waiting():
+    fn = Recorder()
+    batcher = MicroBatcher(fn, max_batch=2, max_wait=60)
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(4))), timeout=5)
+
+    assert asyncio.run(main()) == [0, 10, 20, 30]
+    assert fn.batches == [[0, 1], [2, 3]]
+
+
+def test_micro_batcher_shares_in_flight_items():
+    fn = Recorder(delay=0.05)
+    batcher = MicroBatcher(fn, max_batch=32, max_wait=0.001)
+
+    async def main():
+        first = asyncio.ensure_future(batcher.submit(7))
+        await asyncio.sleep(0.01)  # the first batch is running now
+        return await asyncio.gather(first, batcher.submit(7))
+
+    assert asyncio.run(main()) == [70, 70]
+    assert fn.batches == [[7]]
+
+
+def test_micro_batcher_errors_reach_every_caller():
+    batcher = MicroBatcher(Recorder(error=ValueError("upstream down")), max_wait=0.001)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_micro_batcher_cancelled_caller_does_not_cancel_others():
+    fn = Recorder(delay=0.05)
+    batcher = MicroBatcher(fn, max_wait=0.001)
+
+    async def main():
+        quitter = asyncio.ensure_future(batcher.submit(1))
+        stayer = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.01)
+        quitter.cancel()
+        return await stayer, quitter.cancelled()
+
+    assert asyncio.run(main()) == (10, True)
+
+
+def test_single_flight_shares_concurrent_calls():
+    flight = SingleFlight()
+    runs = []
+
+    async def fetch(key):
+        runs.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", lambda: fetch("a")),
+            flight.do("a", lambda: fetch("a")),
+            flight.do("b", lambda: fetch("b")),
+        )
+
+    assert asyncio.run(main()) == ["A", "A", "B"]
+    assert sorted(runs) == ["a", "b"]
+    assert flight.stats() == {"calls": 2, "shared": 1, "in_flight": 0}
+
+
+def test_single_flight_runs_again_after_completion_and_propagates_errors():
+    flight = SingleFlight()
+
+    async def boom():
+        raise KeyError("missing")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(KeyError):
+                await flight.do("k", boom)
+
+    asyncio.run(main())
+    assert flight.stats()["calls"] == 2
+
+
+def test_single_flight_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        quitter = asyncio.ensure_future(flight.do("k", slow))
+        stayer = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        quitter.cancel()
+        return await stayer
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,117 @@
+# app/tests/test_caches.py
+import itertools
+
+import numpy as np
+
+from utils import cache as cache_module
+from utils import embedding_cache as embedding_cache_module
+from utils.cache import TTLCache, normalize_query
+from utils.embedding_cache import EmbeddingCache
+
+from conftest import fake_embedding
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_items=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "items": 2}
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = TTLCache(max_items=10, ttl=5)
+    cache.set("a", 1)
+    clock.now += 4
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_ttl_cache_zero_items_disables_it():
+    cache = TTLCache(max_items=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_normalize_query():
+    assert normalize_query("  When does   the EVENT start?? ") == normalize_query("when does the event start")
+
+
+def vecs(texts):
+    return [fake_embedding(t) for t in texts]
+
+
+def test_embedding_cache_memory_and_disk_tiers(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), memory_items=2)
+    texts = ["one", "two", "three"]
+    cache.put_many("m", texts, vecs(texts))
+    assert cache.stats()["memory_items"] == 2
+
+    got = cache.get_many("m", ["three", "one", "four"])
+    np.testing.assert_array_equal(got[0], fake_embedding("three"))
+    np.testing.assert_array_equal(got[1], fake_embedding("one"))
+    assert got[2] is None
+    assert (cache.hits_memory, cache.hits_disk, cache.misses) == (1, 1, 1)
+
+    # keys include the model and the normalized text
+    assert cache.get_many("other", ["one"]) == [None]
+    assert cache.get_many("m", ["  one "])[0] is not None
+
+
+def test_embedding_cache_memory_only_leaves_misses_uncounted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), memory_items=1)
+    cache.put_many("m", ["one", "two"], vecs(["one", "two"]))
+    got = cache.get_many("m", ["one", "two"], memory_only=True)
+    assert got[0] is None and got[1] is not None
+    assert (cache.hits_memory, cache.misses) == (1, 0)
+
+
+def test_embedding_cache_evicts_least_recently_used_rows(tmp_path, monkeypatch):
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache_module.time, "time", lambda: float(next(ticks)))
+    path = str(tmp_path / "emb.sqlite3")
+    cache = EmbeddingCache(path, memory_items=100)
+    row_bytes = fake_embedding("x").nbytes
+    cache.max_disk_bytes = 10 * row_bytes
+
+    texts = [f"text {i}" for i in range(10)]
+    for text in texts:
+        cache.put_many("m", [text], vecs([text]))
+    # a hit is only buffered, then written before the next eviction reads last_used
+    assert cache.get_many("m", ["text 0"])[0] is not None
+    assert cache._touched
+    cache.put_many("m", ["text 10", "text 11"], vecs(["text 10", "text 11"]))
+    assert cache.stats()["disk_bytes"] <= 0.9 * cache.max_disk_bytes
+
+    fresh = EmbeddingCache(path, memory_items=100)
+    found = [t for t, v in zip(texts, fresh.get_many("m", texts)) if v is not None]
+    assert found == ["text 0"] + texts[4:]
+
+
+def test_embedding_cache_flush_writes_buffered_hits(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache_module.time, "time", clock)
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    cache.put_many("m", ["one"], vecs(["one"]))
+    clock.now += 100
+    cache.get_many("m", ["one"])
+    cache.flush()
+    assert not cache._touched
+    ((last_used,),) = cache._db().execute("SELECT last_used FROM embeddings").fetchall()
+    assert last_used == clock.now
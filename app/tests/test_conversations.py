@@ -0,0 +1,87 @@
+# app/tests/test_conversations.py
+import pytest
+
+from utils import conversations
+from utils.conversations import MemoryConversationStore, SQLiteConversationStore
+from utils.tokens import count_tokens
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conversations.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_conv_store(request, tmp_path):
+    def make(max_conversations=10, idle_ttl=3600, token_budget=1000):
+        if request.param == "memory":
+            return MemoryConversationStore(max_conversations, idle_ttl, token_budget)
+        return SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"), max_conversations, idle_ttl, token_budget)
+
+    return make
+
+
+def exchange(n):
+    return [{"role": "user", "text": f"question {n}"}, {"role": "assistant", "text": f"answer {n}"}]
+
+
+def test_append_and_get(make_conv_store, clock):
+    store = make_conv_store()
+    assert store.get("c1") == []
+    store.append("c1", exchange(1))
+    store.append("c1", exchange(2))
+    assert store.get("c1") == exchange(1) + exchange(2)
+    assert store.get("c2") == []
+    assert len(store) == 1
+
+
+def test_token_budget_drops_oldest_messages(make_conv_store, clock):
+    per_message = count_tokens("question 1")
+    assert per_message == count_tokens("answer 1")
+    store = make_conv_store(token_budget=4 * per_message)
+    for n in range(5):
+        store.append("c1", exchange(n))
+    assert store.get("c1") == exchange(3) + exchange(4)
+
+
+def test_token_budget_keeps_the_latest_exchange(make_conv_store, clock):
+    store = make_conv_store(token_budget=1)
+    store.append("c1", exchange(1))
+    store.append("c1", exchange(2))
+    assert store.get("c1") == exchange(2)
+
+
+def test_idle_conversations_expire(make_conv_store, clock):
+    store = make_conv_store(idle_ttl=60)
+    store.append("old", exchange(1))
+    clock.now += 30
+    store.append("new", exchange(2))
+    clock.now += 31
+    assert store.get("old") == []
+    assert store.get("new") == exchange(2)
+    store.append("new", exchange(3))
+    assert len(store) == 1
+
+
+def test_least_recently_active_conversation_is_evicted(make_conv_store, clock):
+    store = make_conv_store(max_conversations=2)
+    for conv_id in ("a", "b"):
+        clock.now += 1
+        store.append(conv_id, exchange(1))
+    clock.now += 1
+    store.append("a", exchange(2))
+    clock.now += 1
+    store.append("c", exchange(1))
+    assert len(store) == 2
+    assert store.get("b") == []
+    assert store.get("a") == exchange(1) + exchange(2)
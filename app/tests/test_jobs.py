@@ -0,0 +1,180 @@
+# app/tests/test_jobs.py
+import asyncio
+import json
+import logging
+import threading
+
+import pytest
+
+from utils import jobs
+from utils.jobs import IngestJob, JobCancelled, JobManager
+
+
+def test_job_runs_through_its_states():
+    manager = JobManager(max_workers=1)
+    seen = []
+
+    async def run(job):
+        seen.append(job.status)
+        job.progress("parsing", 1, 2)
+        job.progress("parsing", 2, 2)
+        job.progress("embedding", 5, 10)
+        assert job.to_dict()["chunks_total"] == 10
+        return {"added": 10}
+
+    async def main():
+        job = manager.submit("guide.pdf", run)
+        assert job.status == "queued"
+        await job._task
+        return job
+
+    job = asyncio.run(main())
+    assert seen == ["running"]
+    state = job.to_dict()
+    assert (state["status"], state["stage"], state["result"]) == ("succeeded", "done", {"added": 10})
+    assert (state["pages_parsed"], state["pages_total"], state["chunks_embedded"]) == (2, 2, 5)
+    assert state["eta_seconds"] == 0.0
+    assert state["created_at"] <= state["started_at"] <= state["finished_at"]
+    assert manager.get(job.id) is job and manager.list() == [job]
+
+
+def test_failed_job_reports_its_error():
+    manager = JobManager()
+
+    async def run(job):
+        raise RuntimeError("PDF is encrypted")
+
+    async def main():
+        job = manager.submit("locked.pdf", run)
+        await job._task
+        return job
+
+    job = asyncio.run(main())
+    assert (job.status, job.error) == ("failed", "PDF is encrypted")
+
+
+def test_jobs_queue_for_a_worker_slot_and_can_be_cancelled():
+    manager = JobManager(max_workers=1)
+    started = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def run(job):
+            started.append(job.filename)
+            await release.wait()
+            return {}
+
+        first = manager.submit("a.pdf", run)
+        second = manager.submit("b.pdf", run)
+        third = manager.submit("c.pdf", run)
+        await asyncio.sleep(0.01)
+        assert (first.status, second.status, third.status) == ("running", "queued", "queued")
+
+        # a queued job never starts, a running one is interrupted
+        assert manager.cancel(second.id)
+        assert manager.cancel(first.id)
+        await asyncio.sleep(0.01)
+        assert third.status == "running"
+        release.set()
+        await asyncio.gather(first._task, second._task, third._task)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert [j.status for j in (first, second, third)] == ["cancelled", "cancelled", "succeeded"]
+    assert started == ["a.pdf", "c.pdf"]
+    assert not manager.cancel(third.id)
+
+
+def test_progress_raises_once_cancelled_except_while_committing():
+    manager = JobManager()
+
+    async def main():
+        embedding = manager.submit("a.pdf", lambda job: asyncio.sleep(60))
+        committing = manager.submit("b.pdf", lambda job: asyncio.sleep(60))
+        await asyncio.sleep(0)
+        embedding.progress("embedding", 0, 2)
+        committing.progress("committing", 0, 1)
+
+        assert manager.cancel(embedding.id)
+        # work running on a thread stops at its next progress update
+        with pytest.raises(JobCancelled):
+            embedding.progress("embedding", 1, 2)
+        # rows are being written: too late to cancel
+        assert not manager.cancel(committing.id)
+        committing.progress("committing", 1, 1)
+        committing._task.cancel()
+        await asyncio.gather(embedding._task, committing._task, return_exceptions=True)
+        return embedding
+
+    assert asyncio.run(main()).status == "cancelled"
+
+
+def test_workers_share_status_and_cancellation(tmp_path):
+    owner = JobManager(status_dir=str(tmp_path))
+    other = JobManager(status_dir=str(tmp_path))
+
+    async def main():
+        stop = asyncio.Event()
+
+        async def run(job):
+            job.progress("parsing", 1, 4)
+            await stop.wait()
+            # the owner looks for another worker's cancel marker when the stage changes
+            job.progress("embedding", 0, 8)
+            return {}
+
+        job = owner.submit("a.pdf", run)
+        await asyncio.sleep(0.01)
+        remote = other.get(job.id)
+        assert remote is not None and remote is not job
+        assert (remote.status, remote.to_dict()["pages_parsed"]) == ("running", 1)
+        assert [j.id for j in other.list()] == [job.id]
+
+        assert other.cancel(job.id)
+        stop.set()
+        await job._task
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == "cancelled"
+    assert other.get(job.id).status == "cancelled"
+    assert other.get("../etc/passwd") is None
+
+
+def test_cancel_marker_is_looked_for_at_most_once_per_interval(tmp_path, monkeypatch):
+    manager = JobManager(status_dir=str(tmp_path))
+    job = IngestJob("a.pdf")
+    job._manager = manager
+    checks = []
+    monkeypatch.setattr(manager, "_cancel_marked", lambda job_id: checks.append(job_id) or False)
+
+    job.progress("parsing", 0, 100)
+    for page in range(1, 101):
+        job.progress("parsing", page, 100)
+    assert len(checks) == 1
+    job.progress("embedding", 0, 10)
+    assert len(checks) == 2
+    monkeypatch.setattr(jobs, "_CANCEL_CHECK_INTERVAL", 0)
+    job.progress("embedding", 1, 10)
+    assert len(checks) == 3
+
+
+def test_snapshots_written_from_several_threads_stay_whole(tmp_path, caplog):
+    manager = JobManager(status_dir=str(tmp_path))
+    job = IngestJob("a.pdf")
+
+    def write(n):
+        for i in range(50):
+            job.chunks_embedded = n * 50 + i
+            manager._write_snapshot(job)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    with caplog.at_level(logging.WARNING, logger=jobs.__name__):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert not caplog.records
+    assert json.loads((tmp_path / f"{job.id}.json").read_text())["job_id"] == job.id
+    assert [p.name for p in tmp_path.iterdir()] == [f"{job.id}.json"]
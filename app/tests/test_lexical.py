@@ -0,0 +1,87 @@
+# app/tests/test_lexical.py
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils.config import settings
+from utils.lexical import RRF_K, reciprocal_rank_fusion, tokenize
+
+CORPUS = [
+    "The keynote starts at 10:30 in the main hall.",
+    "Workshop on vector search in room B-12.",
+    "Lunch is served in the main hall after the keynote.",
+    "Parking is available behind the venue.",
+    "The closing party is in room B-14.",
+]
+
+
+def load(store, texts=CORPUS, source="guide"):
+    docs = [{"id": f"{source}:{i}", "text": t, "meta": {"source": source}} for i, t in enumerate(texts)]
+    asyncio.run(store.add_documents(docs))
+
+
+def bm25(store, query, k=10, rows=None):
+    with store._lock:
+        idxs, scores = store.lexical.search(query, k, rows=rows)
+    return idxs.tolist(), scores
+
+
+def test_tokenize_keeps_codes_whole_and_drops_stopwords():
+    assert tokenize("Where is Room B-12 at 10:30?") == ["room", "b-12", "b", "12", "10:30", "10", "30"]
+
+
+def test_reciprocal_rank_fusion():
+    rows, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 4])], k=3)
+    assert rows.tolist() == [3, 1, 2]
+    assert scores[0] == pytest.approx(1 / (RRF_K + 3) + 1 / (RRF_K + 1))
+    assert scores[1] == pytest.approx(1 / (RRF_K + 1))
+
+
+def test_bm25_ranks_exact_tokens_and_rare_terms(make_store):
+    store = make_store()
+    load(store)
+    # "b-12" matches whole; its part "b" also matches room B-14, lower
+    assert bm25(store, "B-12")[0] == [1, 4]
+    # "keynote" is in two rows, "parking" in one: a match on the rarer term weighs more
+    assert bm25(store, "keynote parking")[0][0] == 3
+    assert sorted(bm25(store, "main hall")[0]) == [0, 2]
+    assert bm25(store, "the of")[0] == []
+    # restricted to the given rows
+    assert bm25(store, "hall", rows=np.array([2, 3]))[0] == [2]
+
+
+def test_bm25_score_matches_the_formula(make_store):
+    store = make_store()
+    load(store)
+    _, (score,) = bm25(store, "parking")
+    lengths = [len(tokenize(t)) for t in CORPUS]
+    n, avgdl, k1, b = len(CORPUS), sum(lengths) / len(CORPUS), store.lexical.k1, store.lexical.b
+    idf = np.log1p((n - 1 + 0.5) / (1 + 0.5))
+    assert score == pytest.approx(idf * (k1 + 1) / (1 + k1 * (1 - b + b * lengths[3] / avgdl)), rel=1e-5)
+
+
+def test_bm25_skips_tombstoned_rows_and_reloads_parts(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACT_RATIO", 0)
+    store = make_store()
+    asyncio.run(store.replace_source("guide", [{"id": f"guide:{i}", "text": t} for i, t in enumerate(CORPUS)]))
+    asyncio.run(store.replace_source("guide", [{"id": f"guide:{i}", "text": t} for i, t in enumerate(CORPUS[1:])]))
+    assert bm25(store, "keynote")[0] == [2]
+    # the tombstoned row no longer counts towards document frequencies
+    assert store.lexical.df["keynote"] == 1
+    assert store.lexical.live_docs == len(CORPUS) - 1
+
+    reopened = make_store()
+    assert reopened.lexical._parts == store.lexical._parts
+    assert reopened.lexical.df == store.lexical.df
+    assert bm25(reopened, "keynote main hall")[0] == bm25(store, "keynote main hall")[0]
+
+
+def test_hybrid_search_fuses_both_rankings(make_store):
+    store = make_store()
+    load(store)
+    # the fake embeddings carry no meaning, so only BM25 can find the room code
+    hybrid = asyncio.run(store.search("room B-12", k=2, mode="hybrid"))
+    assert hybrid[0]["id"] == "guide:1"
+    lexical = asyncio.run(store.search("room B-12", k=3, mode="lexical"))
+    assert [r["id"] for r in lexical[:2]] == ["guide:1", "guide:4"]
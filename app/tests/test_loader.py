@@ -0,0 +1,74 @@
+# app/tests/test_loader.py
+import re
+
+from utils.embedding_cache import content_hash
+from utils.loader import iter_document_chunks
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with one line of text per entry in each page's list."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+
+
+def test_pdf_chunks_carry_the_pages_they_span(tmp_path):
+    # uneven page lengths, so chunks group different numbers of pages
+    pages = [[f"page {p} line {i} of the event schedule" for i in range(4 + 7 * (p % 4))] for p in range(1, 13)]
+    path = tmp_path / "schedule.pdf"
+    write_pdf(path, pages)
+    calls = []
+    chunks = list(iter_document_chunks(str(path), progress=lambda *args: calls.append(args)))
+
+    assert len(chunks) > 2
+    assert calls[-1] == ("parsing", 12, 12)
+    seen = set()
+    for chunk in chunks:
+        on = {int(p) for p in re.findall(r"page (\d+) line", chunk["text"])}
+        # a chunk may open with the tail of a line from the previous page
+        if not chunk["text"].startswith("page"):
+            on.add(min(chunk["meta"]["pages"]))
+        assert chunk["meta"]["pages"] == sorted(on)
+        seen.update(on)
+    assert seen == set(range(1, 13))
+    assert any(len(chunk["meta"]["pages"]) > 1 for chunk in chunks)
+
+
+def test_chunk_ids_are_content_addressed(tmp_path):
+    paragraphs = [f"Session {i}: " + " ".join(f"topic{i}-{j}" for j in range(150)) for i in range(4)]
+    path = tmp_path / "notes.txt"
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    chunks = list(iter_document_chunks(str(path)))
+    for chunk in chunks:
+        assert chunk["meta"]["hash"] == content_hash(chunk["text"])
+        assert chunk["id"] == f"notes.txt_{chunk['meta']['hash']}"
+        assert chunk["meta"]["source"] == "notes.txt"
+        assert "pages" not in chunk["meta"]
+
+    # re-reading gives the same ids; editing the last session only changes its chunks
+    assert [c["id"] for c in iter_document_chunks(str(path))] == [c["id"] for c in chunks]
+    paragraphs[-1] = paragraphs[-1].replace("topic3-", "track3-")
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    edited = list(iter_document_chunks(str(path)))
+    before = {c["id"] for c in chunks}
+    assert any(c["id"] in before for c in edited)
+    for c in edited:
+        assert (c["id"] in before) == ("track3-" not in c["text"])
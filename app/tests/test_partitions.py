@@ -0,0 +1,68 @@
+# app/tests/test_partitions.py
+import asyncio
+
+import pytest
+
+from utils.config import settings
+from utils.partitions import normalize_filters
+
+DOCS = [
+    ("keynote", {"source": "agenda.pdf", "event_id": "devfest", "tags": ["keynote", "main"]}),
+    ("workshop", {"source": "agenda.pdf", "event_id": "devfest", "tags": ["workshop"]}),
+    ("parking", {"source": "venue.pdf", "event_id": "devfest"}),
+    ("meetup", {"source": "agenda.pdf", "event_id": "meetup", "tags": "keynote"}),
+]
+
+
+def load(store):
+    docs = [{"id": text, "text": text, "meta": meta} for text, meta in DOCS]
+    asyncio.run(store.add_documents(docs))
+
+
+def match(store, filters):
+    with store._lock:
+        return [store._row(int(i))["id"] for i in store.partitions.match(normalize_filters(filters))]
+
+
+def test_normalize_filters():
+    assert normalize_filters(None) is None
+    assert normalize_filters({"tags": None}) is None
+    assert normalize_filters({"tags": ["b", "a", "a"], "event_id": 7}) == (("event_id", ("7",)), ("tags", ("a", "b")))
+    # the canonical form is the same however the filter was written
+    assert normalize_filters({"tags": "a", "source": ["x"]}) == normalize_filters({"source": "x", "tags": ["a"]})
+    with pytest.raises(ValueError):
+        normalize_filters({"speaker": "ada"})
+
+
+def test_match_any_value_within_a_key_and_all_keys(make_store):
+    store = make_store()
+    load(store)
+    assert match(store, {"source": "agenda.pdf"}) == ["keynote", "workshop", "meetup"]
+    assert match(store, {"tags": ["keynote", "workshop"]}) == ["keynote", "workshop", "meetup"]
+    assert match(store, {"event_id": "devfest", "tags": "keynote"}) == ["keynote"]
+    assert match(store, {"event_id": "devfest", "source": "nowhere.pdf"}) == []
+    assert store.partitions.values("event_id") == ["devfest", "meetup"]
+
+
+def test_match_drops_tombstoned_rows(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACT_RATIO", 0)
+    store = make_store()
+    docs = [{"id": text, "text": text, "meta": meta} for text, meta in DOCS[:2]]
+    asyncio.run(store.replace_source("agenda.pdf", docs, event_id="devfest"))
+    asyncio.run(store.replace_source("agenda.pdf", docs[1:], event_id="devfest"))
+    assert store.live_count == 1
+    assert match(store, {"source": "agenda.pdf"}) == ["workshop"]
+    assert match(store, {"tags": "keynote"}) == []
+
+    reopened = make_store()
+    assert reopened.partitions._parts == store.partitions._parts
+    assert match(reopened, {"source": "agenda.pdf"}) == ["workshop"]
+
+
+def test_filtered_search_only_returns_matching_rows(make_store):
+    store = make_store()
+    load(store)
+    for mode in ("vector", "lexical", "hybrid"):
+        found = asyncio.run(store.search("keynote meetup", k=4, mode=mode, filters={"event_id": "meetup"}))
+        assert [r["id"] for r in found] == ["meetup"]
+    assert asyncio.run(store.search("keynote", k=4, filters={"event_id": "other"})) == []
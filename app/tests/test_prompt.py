@@ -0,0 +1,71 @@
+# app/tests/test_prompt.py
+import pytest
+
+from utils.config import settings
+from utils.prompt import build_prompt, strip_overlaps
+from utils.tokens import count_tokens
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(max_tokens=2000, history=400, turn=60):
+        monkeypatch.setattr(settings, "PROMPT_MAX_TOKENS", max_tokens)
+        monkeypatch.setattr(settings, "PROMPT_HISTORY_TOKENS", history)
+        monkeypatch.setattr(settings, "PROMPT_HISTORY_TURN_TOKENS", turn)
+
+    return set_budget
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_small_prompt_uses_everything(budget):
+    budget()
+    contexts = [{"text": "Doors open at 9am."}, {"text": "Lunch is served in Hall B."}]
+    prompt, usage = build_prompt("When do doors open?", contexts)
+    assert "[1] Doors open at 9am." in prompt and "[2] Lunch is served in Hall B." in prompt
+    assert prompt.endswith("USER: When do doors open?\n\nASSISTANT:")
+    assert usage["chunks_used"] == 2
+    assert usage["chunks_truncated"] == usage["chunks_deduplicated"] == 0
+    assert usage["prompt_tokens"] == count_tokens(prompt)
+
+
+def test_context_is_trimmed_to_the_budget(budget):
+    budget(max_tokens=300)
+    contexts = [{"text": words("first", 60)}, {"text": words("second", 200)}, {"text": words("third", 60)}]
+    prompt, usage = build_prompt("What is on?", contexts)
+    assert usage["prompt_tokens"] <= 300
+    assert usage["chunks_used"] == 2
+    assert usage["chunks_truncated"] == 1
+    assert "first59" in prompt
+    assert "second0" in prompt and "second199" not in prompt
+    assert "third" not in prompt
+
+
+def test_duplicate_and_overlapping_chunks_are_removed(budget):
+    budget()
+    first = words("alpha", 20)
+    overlap = words("alpha", 20)[len("alpha0 alpha1 ") :] + " " + words("beta", 10)
+    contexts = [{"text": first}, {"text": first}, {"text": overlap}]
+    prompt, usage = build_prompt("q", contexts)
+    assert usage["chunks_deduplicated"] == 1
+    assert usage["chunks_used"] == 2
+    assert f"[2] {words('beta', 10)}" in prompt
+    assert strip_overlaps(overlap, [first]) == words("beta", 10)
+
+
+def test_history_is_newest_first_within_its_budget(budget):
+    history = []
+    for n in range(6):
+        history += [{"role": "user", "text": f"question {n} " + words("q", 40)}, {"role": "assistant", "text": f"answer {n}"}]
+    line_tokens = count_tokens("USER: " + history[-2]["text"]) + count_tokens("ASSISTANT: answer 5")
+    budget(history=line_tokens + 20, turn=5)
+    prompt, usage = build_prompt("and then?", [], history)
+    assert usage["history_tokens"] <= line_tokens + 20
+    # the latest exchange is verbatim, older turns are shortened, the oldest don't fit
+    assert history[-2]["text"] in prompt and "ASSISTANT: answer 5" in prompt
+    assert "ASSISTANT: answer 4" in prompt
+    assert "question 4 " + words("q", 40) not in prompt
+    assert "question 0" not in prompt
+    assert prompt.index("answer 4") < prompt.index("answer 5")
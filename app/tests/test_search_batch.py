@@ -0,0 +1,70 @@
+# app/tests/test_search_batch.py
+import asyncio
+
+import numpy as np
+import pytest
+
+from conftest import fake_embedding
+
+TEXTS = [f"session {i} on topic {i % 3}" for i in range(12)]
+
+
+@pytest.fixture
+def store(make_store):
+    store = make_store()
+    asyncio.run(store.add_documents([{"id": f"doc:{i}", "text": t, "meta": {"source": "doc"}} for i, t in enumerate(TEXTS)]))
+    return store
+
+
+def test_similarity_search_batch_returns_ranked_arrays(store):
+    queries = ["topic 1", "session 4 on topic 1", "nothing alike"]
+    idxs, sims = asyncio.run(store.similarity_search_batch(queries, k=5))
+    assert idxs.shape == sims.shape == (3, 5)
+    assert idxs.dtype == np.int64 and sims.dtype == np.float32
+    assert idxs[1][0] == 4 and sims[1][0] == pytest.approx(1.0)
+    assert (np.diff(sims, axis=1) <= 0).all()
+
+    # the same as scoring every row against each query
+    rows = np.stack([fake_embedding(t) for t in TEXTS])
+    rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+    for q, row_ids, scores in zip(queries, idxs, sims):
+        q_emb = fake_embedding(q) / np.linalg.norm(fake_embedding(q))
+        expected = np.argsort(-(rows @ q_emb))[:5]
+        assert row_ids.tolist() == expected.tolist()
+        np.testing.assert_allclose(scores, (rows @ q_emb)[expected], rtol=1e-5)
+
+    # raw vectors skip the embedder
+    by_vector, _ = asyncio.run(store.similarity_search_batch(np.stack([fake_embedding(q) for q in queries]), k=5))
+    np.testing.assert_array_equal(by_vector, idxs)
+
+
+def test_similarity_search_batch_pads_past_the_live_rows(store):
+    idxs, sims = asyncio.run(store.similarity_search_batch(["topic 2"], k=20))
+    assert idxs.shape == (1, 20)
+    assert (idxs[0][12:] == -1).all() and np.isneginf(sims[0][12:]).all()
+    rows = store.get_rows(idxs[0])
+    assert rows[12:] == [None] * 8
+    assert sorted(r["id"] for r in rows[:12]) == sorted(f"doc:{i}" for i in range(12))
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_search_batch_matches_search(store, embedder, mode):
+    queries = ["session 3", "topic 2", "session 3", "session 7 on topic 1"]
+    embedder.texts.clear()
+    batch = asyncio.run(store.search_batch(queries, k=3, mode=mode))
+    if mode != "lexical":
+        # one embedding call covers the distinct queries
+        assert sorted(embedder.texts) == sorted(set(queries))
+    store.results_cache.clear()
+    single = [asyncio.run(store.search(q, k=3, mode=mode)) for q in queries]
+    assert [[r["id"] for r in results] for results in batch] == [[r["id"] for r in results] for results in single]
+    for got, want in zip(batch, single):
+        assert [r["score"] for r in got] == pytest.approx([r["score"] for r in want], rel=1e-5)
+
+
+def test_search_batch_reuses_cached_results(store, embedder):
+    first = asyncio.run(store.search_batch(["session 5", "topic 0"], k=2))
+    embedder.texts.clear()
+    again = asyncio.run(store.search_batch(["topic 0", "session 5", "session 6"], k=2))
+    assert again[:2] == [first[1], first[0]]
+    assert embedder.texts == ["session 6"]
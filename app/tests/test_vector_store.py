@@ -0,0 +1,195 @@
+# app/tests/test_vector_store.py
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from utils import segments
+from utils import vector_store as vector_store_module
+from utils.config import settings
+from utils.embedding_cache import EmbeddingCache
+
+from conftest import DIM
+
+
+def docs_for(source, texts):
+    return [{"id": f"{source}:{text}", "text": text, "meta": {"source": source}} for text in texts]
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_rows_are_stored_normalized_in_one_matrix(make_store):
+    store = make_store()
+    rng = np.random.default_rng(0)
+    blocks = [rng.standard_normal((n, DIM)) * 5 for n in (3, 1, 4)]
+    for j, block in enumerate(blocks):
+        n = len(block)
+        store._append_rows([f"r{j}:{i}" for i in range(n)], ["text"] * n, [{}] * n, block)
+
+    stored = store._embs[: store._size]
+    assert stored.dtype == np.float32 and stored.flags.c_contiguous
+    expected = np.vstack(blocks)
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    np.testing.assert_allclose(stored, expected, rtol=1e-5, atol=1e-6)
+
+    # cosine similarity is a plain matmul over the pre-normalized rows
+    idxs, sims = store.similarity_search_vectors(blocks[2][1] * 3, k=2, exact=True)
+    assert idxs[0][0] == 5
+    assert abs(sims[0][0] - 1) < 1e-5
+
+
+def test_segments_survive_reopen(make_store):
+    store = make_store()
+    asyncio.run(store.add_documents(docs_for("a", ["alpha one", "alpha two"])))
+    asyncio.run(store.add_documents(docs_for("b", ["beta one"])))
+    manifest = segments.read_manifest(store.vector_dir)
+    assert [seg["count"] for seg in manifest["segments"]] == [2, 1]
+    # everything was moved from the in-memory tail to mapped segments
+    assert store.memory_stats()["tail_bytes"] == 0
+
+    reopened = make_store()
+    assert len(reopened) == 3
+    assert [reopened._row(i)["id"] for i in range(3)] == ["a:alpha one", "a:alpha two", "b:beta one"]
+    assert ids(asyncio.run(reopened.search("beta one", k=1))) == ["b:beta one"]
+
+
+def test_reader_refresh_picks_up_new_segments(make_store):
+    writer, reader = make_store(), make_store()
+    asyncio.run(writer.add_documents(docs_for("a", ["alpha one"])))
+    assert len(reader) == 0
+    assert reader.refresh()
+    assert len(reader) == 1
+    assert not reader.refresh()
+
+
+def test_replace_source_only_embeds_changed_chunks(make_store, embedder):
+    store = make_store()
+    result = asyncio.run(store.replace_source("guide.pdf", docs_for("guide.pdf", ["intro", "agenda", "venue"])))
+    assert result == {"added": 3, "unchanged": 0, "removed": 0}
+
+    embedder.texts.clear()
+    result = asyncio.run(store.replace_source("guide.pdf", docs_for("guide.pdf", ["intro", "agenda v2", "venue", "venue"])))
+    assert embedder.texts == ["agenda v2"]
+    assert result == {"added": 1, "unchanged": 2, "removed": 1}
+    assert store.live_count == 3
+
+    embedder.texts.clear()
+    result = asyncio.run(store.replace_source("guide.pdf", docs_for("guide.pdf", ["intro", "agenda v2", "venue"])))
+    assert embedder.texts == []
+    assert result == {"added": 0, "unchanged": 3, "removed": 0}
+
+
+def test_replace_source_accepts_streamed_batches(make_store, embedder):
+    store = make_store()
+
+    async def batches():
+        yield docs_for("guide.pdf", ["intro", "agenda"])
+        yield docs_for("guide.pdf", ["agenda", "venue"])
+
+    result = asyncio.run(store.replace_source("guide.pdf", batches()))
+    assert result == {"added": 3, "unchanged": 0, "removed": 0}
+    assert sorted(embedder.texts) == ["agenda", "intro", "venue"]
+
+
+def test_tombstoned_rows_are_not_returned(make_store, monkeypatch):
+    # keep the tombstones around instead of compacting them away
+    monkeypatch.setattr(settings, "VECTOR_COMPACT_RATIO", 1.0)
+    store = make_store()
+    asyncio.run(store.replace_source("a", docs_for("a", ["alpha one", "alpha two"])))
+    asyncio.run(store.replace_source("b", docs_for("b", ["beta one", "beta two"])))
+    asyncio.run(store.replace_source("a", docs_for("a", ["alpha three"])))
+    assert len(store) - store.live_count == 2
+
+    dead = {"a:alpha one", "a:alpha two"}
+    for mode in ("vector", "lexical", "hybrid"):
+        found = ids(asyncio.run(store.search("alpha one", k=10, mode=mode)))
+        assert found
+        assert not dead & set(found)
+    idxs, _ = asyncio.run(store.similarity_search_batch(["alpha one"], k=10))
+    live = idxs[0][idxs[0] >= 0]
+    assert len(live) == 3
+    assert not store.deleted_mask(live).any()
+
+    # tombstones are persisted with the manifest
+    assert make_store().live_count == store.live_count == 3
+
+
+def test_compaction_drops_tombstoned_rows(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACT_RATIO", 0.3)
+    store = make_store()
+    asyncio.run(store.replace_source("a", docs_for("a", [f"alpha {i}" for i in range(6)])))
+    asyncio.run(store.replace_source("b", docs_for("b", [f"beta {i}" for i in range(4)])))
+    reader = make_store()
+    # 2 of 10 rows tombstoned: below the ratio
+    asyncio.run(store.replace_source("a", docs_for("a", [f"alpha {i}" for i in range(4)])))
+    assert len(store) == 10
+    # 5 of 10 rows tombstoned: the "a" segment is rewritten with its live rows only
+    asyncio.run(store.replace_source("b", docs_for("b", ["beta 0"])))
+    assert len(store) == store.live_count == 5
+    assert store._manifest["tombstones"] is None
+    assert not any(f.startswith("tombstones-") for f in os.listdir(store.vector_dir))
+
+    assert reader.refresh()
+    assert reader.live_count == 5
+    assert sorted(r["text"] for r in asyncio.run(reader.search("alpha", k=10, filters={"source": "a"}))) == [f"alpha {i}" for i in range(4)]
+
+
+def test_search_survives_a_commit_during_query_embedding(make_store, embedder):
+    store = make_store()
+    asyncio.run(store.add_documents(docs_for("a", [f"alpha {i}" for i in range(11)])))
+
+    def commit_meanwhile(texts):
+        # e.g. another ingest, a compaction or the watcher's refresh()
+        with store._lock:
+            store._bump_generation()
+
+    embedder.on_embed = commit_meanwhile
+    for mode in ("vector", "hybrid"):
+        assert len(asyncio.run(store.search(f"{mode} query", k=4, mode=mode))) == 4
+    batch = asyncio.run(store.search_batch(["batch one", "batch two"], k=3))
+    assert [len(results) for results in batch] == [3, 3]
+
+    # the ids were cached under the generation they were computed at
+    embedder.on_embed = None
+    embedder.texts.clear()
+    assert asyncio.run(store.search_batch(["batch one", "batch two"], k=3)) == batch
+    assert embedder.texts == []
+
+
+def test_query_cache_miss_is_looked_up_once(make_store, embedder, tmp_path):
+    store = make_store()
+    store.emb_cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    lookups = []
+    get_many = store.emb_cache.get_many
+
+    def counting(model, texts, memory_only=False):
+        lookups.append(memory_only)
+        return get_many(model, texts, memory_only=memory_only)
+
+    store.emb_cache.get_many = counting
+    emb = asyncio.run(store._embed_query("where is the keynote"))
+    assert np.linalg.norm(emb) == pytest.approx(1.0)
+    assert embedder.texts == ["where is the keynote"]
+    # one memory-tier and one SQLite lookup, none repeated on the way to the provider
+    assert lookups == [True, False]
+
+
+def test_embed_stage_excludes_waiting_for_the_parser(make_store, monkeypatch):
+    observed = []
+    monkeypatch.setattr(
+        vector_store_module.INGEST_STAGE_SECONDS, "observe", lambda value, stage: observed.append((stage, value))
+    )
+
+    async def slow_parser():
+        for n in range(2):
+            await asyncio.sleep(0.2)
+            yield docs_for("slow.pdf", [f"chunk {n}"])
+
+    store = make_store()
+    asyncio.run(store.replace_source("slow.pdf", slow_parser()))
+    stages = dict(observed)
+    assert set(stages) == {"embed", "commit"}
+    assert stages["embed"] < 0.1
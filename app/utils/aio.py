@@ -0,0 +1,102 @@
+# app/utils/aio.py
+import asyncio
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import httpx
+
+from utils.config import settings
+
+# Shared, lazily created resources for the async request path:
+# - one pooled keep-alive HTTP client for every Gradient call
+# - one bounded thread pool for blocking/CPU-bound work (PDF parsing,
+#   chunking, NumPy scoring, local embedding models)
+_client: httpx.AsyncClient | None = None
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# upstream name -> semaphore bounding concurrent requests to it
+_upstream_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.GRADIENT_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.GRADIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GRADIENT_MAX_CONNECTIONS,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _client
+
+
+def upstream_limit(name: str) -> asyncio.Semaphore:
+    """
+    Semaphore capping concurrent requests to one upstream API, so bursts queue
+    here instead of tripping the provider's rate limit. Limits come from
+    settings.UPSTREAM_CONCURRENCY (upstream name -> max requests in flight).
+    """
+    sem = _upstream_limits.get(name)
+    if sem is None:
+        sem = _upstream_limits[name] = asyncio.Semaphore(settings.UPSTREAM_CONCURRENCY.get(name, settings.GRADIENT_MAX_CONNECTIONS))
+    return sem
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.CPU_WORKERS, thread_name_prefix="eventease-cpu")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking callable on the bounded executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def iter_blocking(iterator, batch_size: int):
+    """
+    Async iteration over a blocking iterator (e.g. a file being parsed) in lists
+    of up to batch_size items, each read on the executor. When iteration stops
+    early the iterator is closed on the executor too.
+    """
+    it = iter(iterator)
+    # a read whose awaiting task was cancelled may still be running when we close
+    lock = threading.Lock()
+
+    def next_batch():
+        with lock:
+            return list(itertools.islice(it, batch_size))
+
+    def close():
+        with lock:
+            if hasattr(it, "close"):
+                it.close()
+
+    try:
+        while True:
+            batch = await run_blocking(next_batch)
+            if not batch:
+                return
+            yield batch
+    finally:
+        await run_blocking(close)
+
+
+async def shutdown():
+    global _client, _executor
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _upstream_limits.clear()
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
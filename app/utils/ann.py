@@ -0,0 +1,619 @@
+# app/utils/ann.py
+"""
+Nearest-neighbour index backends for VectorStore.
+
+Every backend works on the store's L2-normalized rows (inner product == cosine)
+and exposes the same small surface:
+
+    load()                  restore persisted backend state, if any
+    sync()                  index any store rows added since the last call
+    search(q, k)            -> (row indices, scores), best first
+    search_batch(Q, k)      -> (q, k) row indices and scores for a matrix of queries;
+                               slots past a query's last hit are -1 / -inf
+    reset()                 forget everything (store was cleared)
+    save()                  persist backend state next to the segments
+    stats()                 -> dict with the backend name and its memory use
+
+Side indexes that persist per-row state do so per segment (see utils/segments.py):
+save() writes the part of every fully indexed segment that has none yet, and
+load()/sync() read a segment's part instead of re-indexing its rows.
+
+The backend is chosen with settings.VECTOR_INDEX ("exact", "ivf", "int8"
+or "float16").
+"""
+import hashlib
+import logging
+import os
+from typing import Tuple
+
+import numpy as np
+
+from utils import segments
+from utils.config import settings
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+# rows scored per matmul while assigning/training, keeps temporaries bounded
+_ASSIGN_CHUNK = 65536
+# recall of quantized scores is re-estimated on save once the store grew by this fraction
+_RECALL_STALE_GROWTH = 0.1
+# batched exact search scores (queries x rows) tiles of at most this size:
+# 256 x 16384 float32 = 16 MB, whatever the number of queries or rows
+_QUERY_TILE = 256
+_ROW_TILE = 16384
+# quantized rows are widened to float32 this many at a time, into a buffer that
+# stays in cache (256 x 384 float32 = 384 KB), and scored with BLAS
+_SCAN_TILE = 256
+_BATCH_SCAN_TILE = 4096
+# float16 -> float32 with integer ops (numpy's half-to-float cast is a scalar loop):
+# keep the sign and shift exponent + mantissa into place, then fix the exponent bias
+_HALF_BITS = np.uint32(0x8FFFE000).view(np.int32)
+_HALF_BIAS = np.float32(2.0**112)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first (argpartition + sort of k only)."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idxs = np.argpartition(-scores, k - 1)[:k]
+    return idxs[np.argsort(-scores[idxs])]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """top_k for every row of a (q, n) score matrix: (q, k) indices and scores, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    idxs = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    sims = np.take_along_axis(scores, idxs, axis=1)
+    order = np.argsort(-sims, axis=1)
+    return np.take_along_axis(idxs, order, axis=1), np.take_along_axis(sims, order, axis=1)
+
+
+def stack_results(results, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pad per-query (indices, scores) results into (q, k) arrays; empty slots are -1 / -inf."""
+    idxs = np.full((len(results), k), -1, dtype=np.int64)
+    sims = np.full((len(results), k), -np.inf, dtype=np.float32)
+    for r, (i, s) in enumerate(results):
+        idxs[r, : len(i)] = i[:k]
+        sims[r, : len(s)] = s[:k]
+    return idxs, sims
+
+
+def iter_rows(store, start: int = 0, chunk: int = _ASSIGN_CHUNK, end: int | None = None):
+    """Yield (first_row, matrix) chunks covering store rows [start, end or len(store))."""
+    offset = 0
+    for block in store._blocks():
+        n = block.shape[0] if end is None else min(block.shape[0], end - offset)
+        lo = max(start - offset, 0)
+        while lo < n:
+            hi = min(lo + chunk, n)
+            yield offset + lo, np.asarray(block[lo:hi], dtype=np.float32)
+            lo = hi
+        offset += block.shape[0]
+
+
+def segment_spans(store, start: int = 0):
+    """
+    Yield (segment name, first row, end row) spans covering store rows
+    [start, len(store)) in order. The name is None for the unpersisted tail and
+    for a segment only partly covered, i.e. wherever no part file applies.
+    """
+    for seg, first in zip(store._segments, store._seg_starts):
+        end = first + seg.count
+        if end > start:
+            yield (seg.name if first >= start else None), max(first, start), end
+    if len(store) > max(start, store._base_size):
+        yield None, max(start, store._base_size), len(store)
+
+
+def unsaved_segments(store, count: int, saved: set):
+    """Yield (segment name, first row, end row) of segments within the first `count` rows missing from `saved`."""
+    for seg, first in zip(store._segments, store._seg_starts):
+        if first + seg.count > count:
+            break
+        if seg.name not in saved:
+            yield seg.name, first, first + seg.count
+
+
+def blocked_top_k(store, Q: np.ndarray, k: int, query_tile: int = _QUERY_TILE, row_tile: int = _ROW_TILE, blocks=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k store rows for every row of Q (q, dim), best first. Q x N is scored
+    one (query_tile x row_tile) matmul at a time and each tile's per-query
+    argpartition is merged into a running (q, k) best, so memory stays bounded by
+    the tile and the result. Each row tile is read once for all queries. Slots
+    past the last live row are -1 / -inf. `blocks` replaces the store's float32
+    rows with other (first_row, matrix) tiles, e.g. decoded quantized rows.
+    """
+    nq = Q.shape[0]
+    idxs = np.full((nq, k), -1, dtype=np.int64)
+    sims = np.full((nq, k), -np.inf, dtype=np.float32)
+    if not nq or k <= 0:
+        return idxs, sims
+    for first_row, rows in blocks if blocks is not None else iter_rows(store, chunk=row_tile):
+        dead = None
+        if store._deleted_count:
+            dead = store.deleted_mask(np.arange(first_row, first_row + rows.shape[0]))
+        for lo in range(0, nq, query_tile):
+            hi = min(lo + query_tile, nq)
+            tile = Q[lo:hi] @ rows.T
+            if dead is not None:
+                tile[:, dead] = -np.inf
+            tile_idxs, tile_sims = top_k_rows(tile, k)
+            cand_idxs = np.concatenate([idxs[lo:hi], tile_idxs + first_row], axis=1)
+            cand_sims = np.concatenate([sims[lo:hi], tile_sims], axis=1)
+            keep = np.argpartition(-cand_sims, k - 1, axis=1)[:, :k]
+            idxs[lo:hi] = np.take_along_axis(cand_idxs, keep, axis=1)
+            sims[lo:hi] = np.take_along_axis(cand_sims, keep, axis=1)
+    order = np.argsort(-sims, axis=1)
+    idxs = np.take_along_axis(idxs, order, axis=1)
+    sims = np.take_along_axis(sims, order, axis=1)
+    # tombstoned rows can only fill slots when fewer than k rows are live
+    idxs[sims == -np.inf] = -1
+    return idxs, sims
+
+
+class ExactIndex:
+    """Brute-force scan over every row; always exact."""
+
+    name = "exact"
+
+    def __init__(self, store):
+        self.store = store
+
+    def load(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims = self.store._scores(q)
+        idxs = top_k(sims, k)
+        return idxs, sims[idxs]
+
+    def search_batch(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # tiled matrix-matrix products instead of q matrix-vector scans
+        return blocked_top_k(self.store, Q, k)
+
+    def reset(self):
+        pass
+
+    def save(self):
+        pass
+
+    def stats(self):
+        # scans the mmap'd segments directly; nothing held besides them
+        return {"name": self.name, "bytes": 0}
+
+
+class _InvertedList:
+    """Row ids plus a contiguous copy of their vectors, grown by doubling."""
+
+    def __init__(self, dim: int):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vecs = np.zeros((0, dim), dtype=np.float32)
+        self.size = 0
+
+    def extend(self, ids: np.ndarray, vecs: np.ndarray):
+        n = ids.shape[0]
+        if self.size + n > self.ids.shape[0]:
+            capacity = max(self.size + n, 2 * self.ids.shape[0], 16)
+            ids_grown = np.zeros(capacity, dtype=np.int64)
+            vecs_grown = np.zeros((capacity, self.vecs.shape[1]), dtype=np.float32)
+            ids_grown[: self.size] = self.ids[: self.size]
+            vecs_grown[: self.size] = self.vecs[: self.size]
+            self.ids, self.vecs = ids_grown, vecs_grown
+        self.ids[self.size : self.size + n] = ids
+        self.vecs[self.size : self.size + n] = vecs
+        self.size += n
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index with a spherical k-means coarse quantizer.
+
+    Rows are bucketed by nearest centroid; a query scores only the `nprobe`
+    closest buckets. Until the store holds enough rows to train the quantizer
+    the index answers with an exact scan, so small corpora lose nothing.
+    The centroids are saved to ``ivf.npz``, each segment's bucket assignments
+    to its ``ivf`` part, tagged with the centroids they were made with.
+    """
+
+    name = "ivf"
+    KIND = "ivf"
+
+    def __init__(self, store, nlist: int, nprobe: int, train_min: int | None = None, kmeans_iters: int = 10):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_min = train_min or nlist * 16
+        self.kmeans_iters = kmeans_iters
+        self.path = os.path.join(store.vector_dir, "ivf.npz")
+        self._clear()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _clear(self):
+        self.centroids: np.ndarray | None = None
+        self.quantizer_id: str | None = None
+        self.lists: list[_InvertedList] = []
+        # bucket of every indexed row, for writing segment parts
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.count = 0
+        self._quantizer_saved = False
+        self._parts: set = set()
+
+    def reset(self):
+        self._clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _set_centroids(self, centroids: np.ndarray):
+        self.centroids = centroids
+        self.quantizer_id = hashlib.sha1(centroids.tobytes()).hexdigest()[:16]
+        self.lists = [_InvertedList(centroids.shape[1]) for _ in range(self.nlist)]
+        self.count = 0
+
+    def _train(self):
+        n = len(self.store)
+        rng = np.random.default_rng(0)
+        sample_size = min(n, self.nlist * 64)
+        sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.vstack([self.store._row_vectors(sample_rows[i : i + _ASSIGN_CHUNK]) for i in range(0, sample_size, _ASSIGN_CHUNK)])
+
+        centroids = sample[rng.choice(sample_size, size=self.nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=self.nlist)
+            empty = counts == 0
+            if empty.any():
+                # re-seed empty clusters from random sample points
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12
+            centroids = (sums / norms).astype(np.float32)
+
+        self._set_centroids(centroids)
+        LOGGER.info("Trained IVF quantizer (nlist=%d) on %d of %d rows.", self.nlist, sample_size, n)
+
+    def _load_quantizer(self) -> bool:
+        # centroids another process (or an earlier run) trained and saved
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as state:
+                centroids = state["centroids"]
+        except Exception as e:
+            LOGGER.warning("Could not load IVF centroids, they will be retrained: %s", e)
+            return False
+        if centroids.shape[0] != self.nlist or centroids.shape[1] != (self.store._dim() or centroids.shape[1]):
+            LOGGER.info("IVF centroids do not match settings/store, they will be retrained.")
+            return False
+        self._set_centroids(centroids)
+        self._quantizer_saved = True
+        return True
+
+    def _assign(self, first_row: int, vecs: np.ndarray, assign: np.ndarray | None = None):
+        if assign is None:
+            assign = np.argmax(vecs @ self.centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+        rows = first_row + order
+        for c in range(self.nlist):
+            lo, hi = bounds[c], bounds[c + 1]
+            if lo < hi:
+                self.lists[c].extend(rows[lo:hi], vecs[order[lo:hi]])
+        end = first_row + vecs.shape[0]
+        if end > self.assignments.shape[0]:
+            grown = np.full(max(end, 2 * self.assignments.shape[0]), -1, dtype=np.int32)
+            grown[: self.assignments.shape[0]] = self.assignments
+            self.assignments = grown
+        self.assignments[first_row:end] = assign
+        self.count = max(self.count, end)
+
+    def _load_part(self, name: str, first: int, end: int) -> bool:
+        try:
+            part = segments.read_sidecar(self.store.vector_dir, name, self.KIND)
+        except Exception as e:
+            LOGGER.warning("Could not read IVF part of %s, it will be rebuilt: %s", name, e)
+            return False
+        # assignments made with other centroids are useless
+        if part is None or str(part["quantizer"]) != self.quantizer_id or part["assign"].shape[0] != end - first:
+            return False
+        for lo, vecs in iter_rows(self.store, start=first, end=end):
+            self._assign(lo, vecs, part["assign"][lo - first : lo - first + vecs.shape[0]])
+        self._parts.add(name)
+        return True
+
+    def sync(self):
+        n = len(self.store)
+        if self.count >= n:
+            return
+        if not self.trained and not self._load_quantizer():
+            if n < max(self.train_min, self.nlist):
+                return
+            self._train()
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                for lo, vecs in iter_rows(self.store, start=first, end=end):
+                    self._assign(lo, vecs)
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.trained:
+            sims = self.store._scores(q)
+            idxs = top_k(sims, k)
+            return idxs, sims[idxs]
+        probe = top_k(self.centroids @ q, self.nprobe)
+        lists = [self.lists[int(c)] for c in probe if self.lists[int(c)].size]
+        if not lists:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        sims = np.concatenate([lst.vecs[: lst.size] @ q for lst in lists])
+        ids = np.concatenate([lst.ids[: lst.size] for lst in lists])
+        if self.store._deleted_count:
+            sims[self.store.deleted_mask(ids)] = -np.inf
+        best = top_k(sims, k)
+        return ids[best], sims[best]
+
+    def search_batch(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # each query probes its own lists
+        return stack_results([self.search(q, k) for q in Q], k)
+
+    def save(self):
+        if not self.trained:
+            return
+        if not self._quantizer_saved:
+            tmp = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp, centroids=self.centroids)
+            os.replace(tmp, self.path)
+            self._quantizer_saved = True
+        for name, first, end in unsaved_segments(self.store, self.count, self._parts):
+            segments.write_sidecar(
+                self.store.vector_dir, name, self.KIND, assign=self.assignments[first:end], quantizer=np.array(self.quantizer_id)
+            )
+            self._parts.add(name)
+
+    def stats(self):
+        held = sum(lst.ids.nbytes + lst.vecs.nbytes for lst in self.lists) + self.assignments.nbytes
+        if self.trained:
+            held += self.centroids.nbytes
+        return {"name": self.name, "bytes": held, "trained": self.trained, "nlist": self.nlist, "nprobe": self.nprobe}
+
+    def load(self):
+        if not self._load_quantizer():
+            return
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                break
+
+
+class QuantizedIndex:
+    """
+    Brute-force scan over a compact in-memory copy of the rows:
+
+      int8     per-row symmetric scalar quantization (codes * scale), 1/4 the size
+      float16  half-precision copy, 1/2 the size
+
+    The approximate scores pick the best k * rerank candidates, which are then
+    re-scored exactly from the float32 rows (mmap'd segments), so only those
+    rows' pages are read per query. rerank=0 returns the approximate scores.
+    The codes are widened to float32 one cache-sized tile at a time and scored
+    with BLAS; search_batch scores each tile against all its queries at once.
+    Each segment's codes are saved to its ``int8`` / ``float16`` part.
+    """
+
+    def __init__(self, store, dtype: str = "int8", rerank: int = 4, recall_sample: int = 20000):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantization: {dtype!r}")
+        self.store = store
+        self.name = dtype
+        self.dtype = np.dtype(dtype)
+        self.rerank = rerank
+        self.recall_sample = recall_sample
+        self._clear()
+
+    def _clear(self):
+        self.codes = np.zeros((0, 0), dtype=self.dtype)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.count = 0
+        self._recall: dict | None = None
+        self._parts: set = set()
+
+    def reset(self):
+        self._clear()
+
+    def _encode(self, vecs: np.ndarray):
+        if self.dtype == np.float16:
+            return vecs.astype(np.float16), np.ones(vecs.shape[0], dtype=np.float32)
+        scales = np.abs(vecs).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vecs / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+    def _widen(self, codes: np.ndarray, out: np.ndarray):
+        if self.dtype == np.float16:
+            bits = out.view(np.int32)
+            np.left_shift(codes.view(np.int16), 13, out=bits, dtype=np.int32)
+            np.bitwise_and(bits, _HALF_BITS, out=bits)
+            np.multiply(out, _HALF_BIAS, out=out)
+        else:
+            np.copyto(out, codes, casting="unsafe")
+
+    def _decoded_tiles(self, tile: int):
+        """Yield (first_row, float32 rows) of the decoded codes through one reused `tile`-row buffer."""
+        buf = np.empty((tile, self.codes.shape[1]), dtype=np.float32)
+        for lo in range(0, self.count, tile):
+            hi = min(lo + tile, self.count)
+            rows = buf[: hi - lo]
+            self._widen(self.codes[lo:hi], rows)
+            if self.dtype == np.int8:
+                rows *= self.scales[lo:hi, None]
+            yield lo, rows
+
+    def _append(self, codes: np.ndarray, scales: np.ndarray):
+        n = codes.shape[0]
+        if self.count + n > self.codes.shape[0] or self.codes.shape[1] != codes.shape[1]:
+            capacity = max(self.count + n, 2 * self.codes.shape[0], 64)
+            grown = np.zeros((capacity, codes.shape[1]), dtype=self.dtype)
+            grown_scales = np.ones(capacity, dtype=np.float32)
+            if self.count:
+                grown[: self.count] = self.codes[: self.count]
+                grown_scales[: self.count] = self.scales[: self.count]
+            self.codes, self.scales = grown, grown_scales
+        self.codes[self.count : self.count + n] = codes
+        self.scales[self.count : self.count + n] = scales
+        self.count += n
+
+    def _load_part(self, name: str, first: int, end: int) -> bool:
+        try:
+            part = segments.read_sidecar(self.store.vector_dir, name, self.name)
+        except Exception as e:
+            LOGGER.warning("Could not read %s part of %s, it will be rebuilt: %s", self.name, name, e)
+            return False
+        if part is None:
+            return False
+        codes, scales = part["codes"], part["scales"]
+        if codes.dtype != self.dtype or codes.shape[0] != end - first or codes.shape[1] != (self.store._dim() or codes.shape[1]):
+            return False
+        self._append(codes, scales)
+        self._parts.add(name)
+        return True
+
+    def sync(self):
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                for _, vecs in iter_rows(self.store, start=first, end=end):
+                    self._append(*self._encode(vecs))
+
+    def _approx_scores(self, q: np.ndarray) -> np.ndarray:
+        # widen a cache-sized tile at a time and score it with a BLAS matrix-vector
+        # product: only the compact codes stream from memory, never a float32 copy
+        sims = np.empty(self.count, dtype=np.float32)
+        buf = np.empty((_SCAN_TILE, self.codes.shape[1]), dtype=np.float32)
+        for lo in range(0, self.count, _SCAN_TILE):
+            hi = min(lo + _SCAN_TILE, self.count)
+            rows = buf[: hi - lo]
+            self._widen(self.codes[lo:hi], rows)
+            np.matmul(rows, q, out=sims[lo:hi])
+        if self.dtype == np.int8:
+            sims *= self.scales[: self.count]
+        if self.store._deleted_count:
+            dead = self.store._deleted[: self.count]
+            sims[: dead.shape[0]][dead] = -np.inf
+        return sims
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims = self._approx_scores(q)
+        if not self.rerank:
+            idxs = top_k(sims, k)
+            return idxs, sims[idxs]
+        cand = top_k(sims, k * self.rerank)
+        cand = np.sort(cand[np.isfinite(sims[cand])])
+        if not cand.size:
+            return cand, np.empty(0, dtype=np.float32)
+        exact = self.store._row_vectors(cand) @ q
+        best = top_k(exact, k)
+        return cand[best], exact[best]
+
+    def search_batch(self, Q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # each tile is decoded once and scored against all the queries in one matmul
+        depth = k * self.rerank if self.rerank else k
+        cands, sims = blocked_top_k(self.store, Q, depth, blocks=self._decoded_tiles(_BATCH_SCAN_TILE))
+        if not self.rerank:
+            return cands, sims
+        results = []
+        for q, cand in zip(Q, cands):
+            cand = np.sort(cand[cand >= 0])
+            if not cand.size:
+                results.append((cand, np.empty(0, dtype=np.float32)))
+                continue
+            exact = self.store._row_vectors(cand) @ q
+            best = top_k(exact, k)
+            results.append((cand[best], exact[best]))
+        return stack_results(results, k)
+
+    def save(self):
+        for name, first, end in unsaved_segments(self.store, self.count, self._parts):
+            segments.write_sidecar(self.store.vector_dir, name, self.name, codes=self.codes[first:end], scales=self.scales[first:end])
+            self._parts.add(name)
+        # saving is the writer's build step: searches keep running, nothing else writes
+        self.update_recall()
+
+    def load(self):
+        # superseded by the per-segment parts
+        segments.delete_legacy_sidecar(self.store.vector_dir, f"{self.name}.npz")
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                break
+
+    def recall(self, k: int = 10, queries: int = 32) -> dict:
+        """
+        Recall@k of the quantized scores (and after re-ranking) against exact
+        float32 scores, estimated on a random sample of rows so the full float32
+        matrix is never read. Noisy copies of sampled rows serve as queries.
+        """
+        rng = np.random.default_rng(0)
+        rows = np.sort(rng.choice(self.count, size=min(self.count, self.recall_sample), replace=False))
+        exact_vecs = self.store._row_vectors(rows)
+        approx_vecs = self._decode(rows)
+        picks = exact_vecs[rng.choice(rows.shape[0], size=min(queries, rows.shape[0]), replace=False)]
+        noise = rng.standard_normal(picks.shape).astype(np.float32)
+        qs = picks + 0.5 * noise / np.sqrt(picks.shape[1])
+        qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+        k = min(k, rows.shape[0])
+        plain, reranked = [], []
+        for q in qs:
+            exact = exact_vecs @ q
+            approx = approx_vecs @ q
+            truth = set(top_k(exact, k).tolist())
+            plain.append(len(truth & set(top_k(approx, k).tolist())) / k)
+            cand = top_k(approx, k * max(self.rerank, 1))
+            reranked.append(len(truth & set(cand[top_k(exact[cand], k)].tolist())) / k)
+        return {
+            "k": k,
+            "sample_rows": int(rows.shape[0]),
+            "measured_at_rows": self.count,
+            "recall": float(np.mean(plain)),
+            "recall_reranked": float(np.mean(reranked)) if self.rerank else None,
+        }
+
+    def update_recall(self, force: bool = False) -> dict | None:
+        """
+        Re-estimate recall() if forced or the store grew since the last estimate,
+        and cache it for stats(). Callers must keep writers out meanwhile.
+        """
+        if self.count:
+            stale = self._recall is None or self.count > self._recall["measured_at_rows"] * (1 + _RECALL_STALE_GROWTH)
+            if force or stale:
+                self._recall = self.recall()
+        return self._recall
+
+    def stats(self):
+        n = self.count
+        return {
+            "name": self.name,
+            "bytes": int(self.codes[:n].nbytes + (self.scales[:n].nbytes if self.dtype == np.int8 else 0)),
+            "float32_bytes": int(n * self.codes.shape[1] * 4),
+            "rerank": self.rerank,
+            # last estimate (None until measured), never computed here
+            "recall": self._recall,
+        }
+
+
+def make_index(store):
+    backend = getattr(settings, "VECTOR_INDEX", "exact").lower()
+    if backend == "exact":
+        return ExactIndex(store)
+    if backend == "ivf":
+        return IVFFlatIndex(store, nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+    if backend in ("int8", "float16"):
+        return QuantizedIndex(store, dtype=backend, rerank=settings.QUANTIZED_RERANK)
+    raise ValueError(f"Unknown VECTOR_INDEX backend: {backend!r} (expected 'exact', 'ivf', 'int8' or 'float16')")
@@ -0,0 +1,142 @@
+# app/utils/batcher.py
+"""
+Request coalescing for upstream calls:
+
+- MicroBatcher groups concurrent single-item requests into one batch call
+- SingleFlight lets concurrent identical calls share one execution
+"""
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+
+def _bucket(size: int) -> int:
+    """Histogram bucket: smallest power of two >= size."""
+    return 1 << (size - 1).bit_length()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests for up to `max_wait` seconds, or
+    until `max_batch` distinct items are queued, and resolves them all with one
+    `fn(items) -> results` call. A request for an item that is already queued
+    or in flight shares that item's result instead of adding a duplicate.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Awaitable[List[Any]]], max_batch: int = 32, max_wait: float = 0.005):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        # key -> (item, future) waiting for the next flush, in arrival order
+        self._pending: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # key -> future of batches already sent
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set = set()
+        self.requests = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batch_sizes: Counter = Counter()
+
+    async def submit(self, item: Any, key: Hashable | None = None) -> Any:
+        key = item if key is None else key
+        self.requests += 1
+        fut = self._inflight.get(key)
+        if fut is None and key in self._pending:
+            fut = self._pending[key][1]
+        if fut is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            # callers may all be gone by the time a batch fails
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._pending[key] = (item, fut)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        # one caller giving up must not cancel the shared result for the others
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, OrderedDict()
+        for key, (_, fut) in batch.items():
+            self._inflight[key] = fut
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: "OrderedDict[Hashable, tuple]"):
+        self.batches += 1
+        self.batch_sizes[_bucket(len(batch))] += 1
+        try:
+            results = await self.fn([item for item, _ in batch.values()])
+        except asyncio.CancelledError:
+            for _, fut in batch.values():
+                fut.cancel()
+            raise
+        except Exception as e:
+            for _, fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for (_, fut), result in zip(batch.values(), results):
+                if not fut.done():
+                    fut.set_result(result)
+        finally:
+            for key in batch:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "avg_batch_size": (self.requests - self.coalesced) / self.batches if self.batches else 0.0,
+            # upper bound (power of two) -> number of batches of that size
+            "batch_size_histogram": {str(b): self.batch_sizes[b] for b in sorted(self.batch_sizes)},
+        }
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution of `fn`. The shared
+    call runs as its own task, so a caller that gives up does not cancel it for
+    the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.calls += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # callers may all be gone by the time the call fails
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
@@ -9,12 +9,24 @@ class Settings(BaseSettings):
     VECTOR_DIR: str = "data/vector_store"
     CHUNK_SIZE: int = 1000        # characters per chunk (simple splitter)
     CHUNK_OVERLAP: int = 200
+    # PDFs with at least this many pages are extracted across a process pool
+    # of PDF_EXTRACT_PROCESSES workers (0 = one per CPU)
+    PDF_PARALLEL_MIN_PAGES: int = 64
+    PDF_EXTRACT_PROCESSES: int = 0
 
     # Enforce Gradient Serverless only for chat + embeddings
     USE_GRADIENT: bool = True
     GRADIENT_API_KEY: str | None = None
     GRADIENT_API_BASE: str = "https://inference.do-ai.run"
     GRADIENT_MODEL: str = "gpt-4o-mini"
+    # Pooled keep-alive HTTP client shared by chat and embeddings calls
+    GRADIENT_TIMEOUT: float = 30.0
+    GRADIENT_MAX_CONNECTIONS: int = 32
+    # Max concurrent requests per upstream API; excess requests wait their turn
+    UPSTREAM_CONCURRENCY: dict[str, int] = {"gradient-chat": 16, "gradient-embeddings": 8}
+
+    # Threads for blocking work (PDF parsing, chunking, scoring) off the event loop
+    CPU_WORKERS: int = 4
 
     # Embeddings via Gradient only
     USE_GRADIENT_EMBEDDINGS: bool = True
@@ -28,7 +40,111 @@ class Settings(BaseSettings):
 
     # Local ST model name retained but not used when Gradient is enabled
     EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Load that model during startup warm-up rather than on the first Gradient failure
+    PRELOAD_LOCAL_EMBEDDINGS: bool = False
+    # A failed warm-up is retried after WARMUP_RETRY_SECONDS, doubling per failure up
+    # to WARMUP_RETRY_MAX_SECONDS, so /ready recovers once e.g. the volume is back
+    WARMUP_RETRY_SECONDS: float = 5.0
+    WARMUP_RETRY_MAX_SECONDS: float = 300.0
+    # Local inference of that model (see utils/local_embeddings.py): "torch"
+    # (sentence-transformers), "onnx" (onnxruntime, LOCAL_EMBEDDING_ONNX_FILE from the
+    # model repo; the default is its int8 export) or "auto" (onnx when onnxruntime is
+    # installed). ONNX vectors get their own model id (cache keys, index manifest), so
+    # switching backends means re-ingesting
+    LOCAL_EMBEDDING_BACKEND: str = "torch"
+    LOCAL_EMBEDDING_ONNX_FILE: str = "onnx/model_quint8_avx2.onnx"
+    LOCAL_EMBEDDING_MAX_LENGTH: int = 256
+    # One inference thread merges concurrent requests into batches of up to MAX_BATCH
+    # texts, waiting up to MAX_WAIT_MS; THREADS intra-op threads (0 = half the CPUs),
+    # optionally pinned to CPUS (e.g. [2, 3])
+    LOCAL_EMBEDDING_MAX_BATCH: int = 64
+    LOCAL_EMBEDDING_MAX_WAIT_MS: float = 2.0
+    LOCAL_EMBEDDING_THREADS: int = 0
+    LOCAL_EMBEDDING_CPUS: list[int] | None = None
     EMBEDDING_BATCH_SIZE: int = 32
+    # Provider batches sent concurrently per embedding call, and a per-batch
+    # token budget (~4 chars/token); 413/429 responses shrink the batch size
+    EMBEDDING_MAX_IN_FLIGHT: int = 4
+    EMBEDDING_MAX_BATCH_TOKENS: int = 8000
+    # Retries with exponential backoff + jitter before falling back to sentence-transformers
+    EMBEDDING_MAX_RETRIES: int = 4
+    EMBEDDING_BACKOFF_BASE: float = 0.5
+    EMBEDDING_BACKOFF_MAX: float = 10.0
+
+    # Background ingestion: concurrent jobs, provider embedding batches in flight
+    # across all jobs, and how long finished job status is kept (seconds)
+    INGEST_WORKERS: int = 2
+    INGEST_MAX_EMBED_BATCHES: int = 4
+    # Chunks are embedded while the file is still parsed, INGEST_STREAM_BATCH at a time;
+    # parsing runs at most INGEST_MAX_EMBED_BATCHES batches ahead of the embeddings
+    INGEST_STREAM_BATCH: int = 64
+    INGEST_JOB_RETENTION: int = 3600
+    # Job status shared by all workers (defaults to DATA_DIR/jobs)
+    INGEST_JOB_STATUS_DIR: str | None = None
+    # Seconds between checks for segments other workers/processes published to
+    # VECTOR_DIR (one small file read); 0 disables the watcher
+    INDEX_WATCH_INTERVAL: float = 1.0
+
+    # On-disk embedding cache (defaults to DATA_DIR/embedding_cache.sqlite3) with an
+    # in-memory LRU tier; the file is trimmed to EMBEDDING_CACHE_MAX_MB
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str | None = None
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 10000
+    EMBEDDING_CACHE_MAX_MB: int = 512
+    # Cache hits update their last-used time in memory; it is written to the file
+    # with the next insert or at most this many seconds later
+    EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS: float = 60.0
+
+    # Query embeddings that miss the cache are collected for up to QUERY_BATCH_MAX_WAIT_MS
+    # (or QUERY_BATCH_MAX_SIZE distinct queries) and embedded in one provider call
+    QUERY_BATCH_MAX_WAIT_MS: float = 5.0
+    QUERY_BATCH_MAX_SIZE: int = 32
+
+    # Query -> top-k chunk ids and (query, context ids, model) -> answer caches for
+    # repeated FAQs; invalidated whenever the corpus changes. Size 0 disables.
+    RETRIEVAL_CACHE_SIZE: int = 2048
+    RETRIEVAL_CACHE_TTL: int = 600
+    ANSWER_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_TTL: int = 900
+
+    # Conversation history: "memory" (per process), "sqlite" (shared file, defaults to
+    # DATA_DIR/conversations.sqlite3) or "redis" (any Redis-protocol server; needs `redis`)
+    CONVERSATION_BACKEND: str = "memory"
+    CONVERSATION_MAX: int = 10000
+    CONVERSATION_IDLE_TTL: int = 6 * 3600
+    CONVERSATION_TOKEN_BUDGET: int = 1500
+    CONVERSATION_SQLITE_PATH: str | None = None
+    CONVERSATION_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Nearest-neighbour backend for the vector store: "exact" (brute-force scan),
+    # "ivf" (k-means inverted file; scans IVF_NPROBE of IVF_NLIST buckets) or a quantized scan
+    VECTOR_INDEX: str = "exact"
+    IVF_NLIST: int = 256
+    IVF_NPROBE: int = 8
+    # "int8" / "float16" scan a compact in-memory copy of the rows (1/4 / 1/2 of float32)
+    # and re-score the best k * QUANTIZED_RERANK candidates exactly from the mmap'd
+    # float32 segments (0 = keep the approximate scores)
+    QUANTIZED_RERANK: int = 4
+    # Segments holding tombstoned rows are rewritten without them once more than this
+    # fraction of all rows is tombstoned (0 disables compaction)
+    VECTOR_COMPACT_RATIO: float = 0.3
+    # Default /chat retrieval: "vector", "lexical" (BM25) or "hybrid" (both, rank-fused);
+    # requests can opt into another mode with "retrieval"
+    RETRIEVAL_MODE: str = "vector"
+
+    # Prompt token budget (question + history + retrieved context), history share,
+    # and the size older history turns are shortened to; top_k is capped at MAX_TOP_K.
+    # Tokens are counted with tiktoken's TOKENIZER_ENCODING when it is installed.
+    PROMPT_MAX_TOKENS: int = 2000
+    PROMPT_HISTORY_TOKENS: int = 400
+    PROMPT_HISTORY_TURN_TOKENS: int = 60
+    MAX_TOP_K: int = 8
+    TOKENIZER_ENCODING: str = "o200k_base"
+
+    # POST /chat/batch: questions per request, and LLM calls one batch may have in flight
+    # (all requests together are still capped by UPSTREAM_CONCURRENCY["gradient-chat"])
+    CHAT_BATCH_MAX_QUERIES: int = 500
+    CHAT_BATCH_CONCURRENCY: int = 4
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,234 @@
+# app/utils/conversations.py
+"""
+Conversation history stores.
+
+All backends keep a list of {"role", "text"} messages per conversation id and
+apply the same limits:
+
+- token_budget: oldest messages are dropped once a conversation's history
+  exceeds this many tokens (the latest exchange is always kept)
+- idle_ttl: conversations untouched for this many seconds expire
+- max_conversations: least recently active conversations are evicted first
+
+"memory" is per-process. "sqlite" (a shared file) and "redis" (any
+Redis-protocol server) let several workers share conversations.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from utils.config import settings
+from utils.tokens import count_tokens
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+# the newest user/assistant exchange survives trimming even if it alone exceeds the budget
+_KEEP_LAST = 2
+
+
+def _trim_to_budget(messages: List[Dict], budget: int) -> int:
+    """Number of leading messages to drop so the rest fits in `budget` tokens."""
+    total = 0
+    keep = 0
+    for m in reversed(messages):
+        total += m.get("tokens") or count_tokens(m["text"])
+        if total > budget and keep >= _KEEP_LAST:
+            break
+        keep += 1
+    return len(messages) - keep
+
+
+class MemoryConversationStore:
+    """In-process LRU of conversations."""
+
+    blocking = False
+
+    def __init__(self, max_conversations: int, idle_ttl: float, token_budget: int):
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        # conv_id -> (last_active, messages); ordered least -> most recently active
+        self._convs: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now: float):
+        while self._convs:
+            conv_id, (last_active, _) = next(iter(self._convs.items()))
+            if now - last_active <= self.idle_ttl:
+                break
+            del self._convs[conv_id]
+
+    def get(self, conv_id: str) -> List[Dict]:
+        with self._lock:
+            self._purge_expired(time.time())
+            entry = self._convs.get(conv_id)
+            if entry is None:
+                return []
+            return [{"role": m["role"], "text": m["text"]} for m in entry[1]]
+
+    def append(self, conv_id: str, messages: List[Dict]):
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            _, history = self._convs.pop(conv_id, (now, []))
+            history.extend({**m, "tokens": count_tokens(m["text"])} for m in messages)
+            del history[: _trim_to_budget(history, self.token_budget)]
+            self._convs[conv_id] = (now, history)
+            while len(self._convs) > self.max_conversations:
+                self._convs.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._convs)
+
+
+class SQLiteConversationStore:
+    """Conversations in a SQLite file that several worker processes can share."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_conversations: int, idle_ttl: float, token_budget: int):
+        self.path = path
+        self.max_conversations = max_conversations
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (id TEXT PRIMARY KEY, last_active REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS conversations_last_active ON conversations(last_active);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conv_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                text TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_conv ON messages(conv_id, id);
+            """
+        )
+
+    def _purge_expired(self, now: float):
+        expired = [r[0] for r in self._conn.execute("SELECT id FROM conversations WHERE last_active < ?", (now - self.idle_ttl,))]
+        self._delete(expired)
+
+    def _delete(self, conv_ids: List[str]):
+        if not conv_ids:
+            return
+        self._conn.executemany("DELETE FROM messages WHERE conv_id = ?", [(c,) for c in conv_ids])
+        self._conn.executemany("DELETE FROM conversations WHERE id = ?", [(c,) for c in conv_ids])
+
+    def get(self, conv_id: str) -> List[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT last_active FROM conversations WHERE id = ?", (conv_id,)).fetchone()
+            if row is None or time.time() - row[0] > self.idle_ttl:
+                return []
+            rows = self._conn.execute("SELECT role, text FROM messages WHERE conv_id = ? ORDER BY id", (conv_id,)).fetchall()
+        return [{"role": role, "text": text} for role, text in rows]
+
+    def append(self, conv_id: str, messages: List[Dict]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._purge_expired(now)
+            self._conn.execute(
+                "INSERT INTO conversations (id, last_active) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET last_active = excluded.last_active",
+                (conv_id, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO messages (conv_id, role, text, tokens) VALUES (?, ?, ?, ?)",
+                [(conv_id, m["role"], m["text"], count_tokens(m["text"])) for m in messages],
+            )
+            rows = self._conn.execute("SELECT id, tokens FROM messages WHERE conv_id = ? ORDER BY id", (conv_id,)).fetchall()
+            drop = _trim_to_budget([{"text": "", "tokens": t} for _, t in rows], self.token_budget)
+            if drop:
+                self._conn.execute("DELETE FROM messages WHERE conv_id = ? AND id <= ?", (conv_id, rows[drop - 1][0]))
+            excess = self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0] - self.max_conversations
+            if excess > 0:
+                oldest = [r[0] for r in self._conn.execute("SELECT id FROM conversations ORDER BY last_active LIMIT ?", (excess,))]
+                self._delete(oldest)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+class RedisConversationStore:
+    """
+    Conversations in any Redis-protocol server (Redis, Valkey, KeyDB, or a
+    local stand-in). Each conversation is a list of JSON messages with an idle
+    EXPIRE; a sorted set of last-active times drives max_conversations eviction.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, max_conversations: int, idle_ttl: float, token_budget: int, prefix: str = "eventease:conv"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CONVERSATION_BACKEND=redis requires the 'redis' package (pip install redis).") from e
+        self._redis = redis.Redis.from_url(url)
+        self.max_conversations = max_conversations
+        self.idle_ttl = int(idle_ttl)
+        self.token_budget = token_budget
+        self.prefix = prefix
+        self._index_key = f"{prefix}:active"
+
+    def _key(self, conv_id: str) -> str:
+        return f"{self.prefix}:{conv_id}"
+
+    def get(self, conv_id: str) -> List[Dict]:
+        items = self._redis.lrange(self._key(conv_id), 0, -1)
+        return [{"role": m["role"], "text": m["text"]} for m in map(json.loads, items)]
+
+    def append(self, conv_id: str, messages: List[Dict]):
+        now = time.time()
+        key = self._key(conv_id)
+        pipe = self._redis.pipeline()
+        pipe.rpush(key, *[json.dumps({**m, "tokens": count_tokens(m["text"])}) for m in messages])
+        pipe.expire(key, self.idle_ttl)
+        pipe.zadd(self._index_key, {conv_id: now})
+        # forget index entries whose lists have expired
+        pipe.zremrangebyscore(self._index_key, "-inf", now - self.idle_ttl)
+        pipe.lrange(key, 0, -1)
+        pipe.zcard(self._index_key)
+        *_, history, active = pipe.execute()
+
+        drop = _trim_to_budget([json.loads(m) for m in history], self.token_budget)
+        if drop:
+            self._redis.ltrim(key, drop, -1)
+        excess = active - self.max_conversations
+        if excess > 0:
+            oldest = [c.decode() for c in self._redis.zrange(self._index_key, 0, excess - 1)]
+            pipe = self._redis.pipeline()
+            pipe.delete(*[self._key(c) for c in oldest])
+            pipe.zrem(self._index_key, *oldest)
+            pipe.execute()
+
+    def __len__(self) -> int:
+        self._redis.zremrangebyscore(self._index_key, "-inf", time.time() - self.idle_ttl)
+        return self._redis.zcard(self._index_key)
+
+
+def make_conversation_store():
+    backend = settings.CONVERSATION_BACKEND.lower()
+    limits = dict(
+        max_conversations=settings.CONVERSATION_MAX,
+        idle_ttl=settings.CONVERSATION_IDLE_TTL,
+        token_budget=settings.CONVERSATION_TOKEN_BUDGET,
+    )
+    if backend == "memory":
+        return MemoryConversationStore(**limits)
+    if backend == "sqlite":
+        path = settings.CONVERSATION_SQLITE_PATH or os.path.join(settings.DATA_DIR, "conversations.sqlite3")
+        return SQLiteConversationStore(path, **limits)
+    if backend == "redis":
+        return RedisConversationStore(settings.CONVERSATION_REDIS_URL, **limits)
+    raise ValueError(f"Unknown CONVERSATION_BACKEND: {backend!r} (expected 'memory', 'sqlite' or 'redis')")
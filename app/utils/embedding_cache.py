@@ -0,0 +1,207 @@
+# app/utils/embedding_cache.py
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC unicode, collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """Short, model-independent fingerprint of a chunk's normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:16]
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, hash of normalized text).
+
+    Two tiers: an in-memory LRU of `memory_items` vectors in front of a SQLite
+    file bounded to `max_disk_mb`; the least recently used rows are evicted
+    first. The SQLite file is opened lazily on first use. The memory tier and
+    the SQLite tier have separate locks, so memory lookups never wait on disk I/O.
+
+    Hits don't write to SQLite: their recency is kept in memory and written with
+    the next put_many (before any eviction), or by the next disk lookup once
+    `touch_flush_seconds` have passed, or by flush().
+    """
+
+    def __init__(self, path: str, memory_items: int = 10000, max_disk_mb: int = 512, touch_flush_seconds: float = 60.0):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_mb * 1024 * 1024
+        self.touch_flush_seconds = touch_flush_seconds
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # _lock guards the memory tier and the counters, _db_lock the SQLite connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # key -> last hit time not yet written to SQLite (guarded by _lock)
+        self._touched: Dict[str, float] = {}
+        self._touched_flushed = time.monotonic()
+        self._conn: sqlite3.Connection | None = None
+        self._disk_bytes = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            self._disk_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str], memory_only: bool = False) -> List[np.ndarray | None]:
+        """
+        Cached vectors for texts, None for misses. memory_only=True only looks at
+        the in-memory LRU (cheap enough for the event loop) and leaves its misses
+        uncounted for the disk lookup that follows; that one does SQLite I/O and
+        belongs on a worker thread.
+        """
+        keys = [cache_key(model, t) for t in texts]
+        out: List[np.ndarray | None] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        now = time.time()
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    out[i] = vec
+                    self.hits_memory += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+        if not pending or memory_only:
+            return out
+        try:
+            with self._db_lock:
+                db = self._db()
+                found = {}
+                pending_keys = list(pending)
+                for j in range(0, len(pending_keys), 500):
+                    chunk = pending_keys[j : j + 500]
+                    rows = db.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    found.update(rows)
+                if time.monotonic() - self._touched_flushed >= self.touch_flush_seconds:
+                    if self._write_touched(db):
+                        db.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning("Embedding cache read failed: %s", e)
+            found = {}
+        with self._lock:
+            for key, idxs in pending.items():
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += len(idxs)
+                    continue
+                vec = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, vec)
+                self._touched[key] = now
+                for i in idxs:
+                    out[i] = vec
+                self.hits_disk += len(idxs)
+        return out
+
+    def put_many(self, model: str, texts: List[str], vecs):
+        """Store vectors in both tiers; does SQLite I/O, so call it from a worker thread."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vecs):
+                key = cache_key(model, text)
+                vec = np.ascontiguousarray(vec, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((key, vec.tobytes(), now))
+        try:
+            with self._db_lock:
+                db = self._db()
+                # buffered recency goes in the same commit, and before eviction reads it
+                self._write_touched(db)
+                db.executemany("INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)", rows)
+                db.commit()
+                self._disk_bytes += sum(len(r[1]) for r in rows)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict(db)
+        except sqlite3.Error as e:
+            LOGGER.warning("Embedding cache write failed: %s", e)
+
+    def _write_touched(self, db: sqlite3.Connection) -> int:
+        """Write the buffered hit times (caller holds _db_lock and commits); returns how many."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_flushed = time.monotonic()
+        if touched:
+            # keys evicted meanwhile simply match no row
+            db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+        return len(touched)
+
+    def flush(self):
+        """Write buffered hit times to SQLite now (e.g. at shutdown)."""
+        try:
+            with self._db_lock:
+                if self._conn is not None and self._write_touched(self._conn):
+                    self._conn.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning("Embedding cache flush failed: %s", e)
+
+    def _evict(self, db: sqlite3.Connection):
+        # recount (INSERT OR REPLACE may have overwritten rows), then trim to 90% of the bound
+        self._disk_bytes = db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+        target = int(self.max_disk_bytes * 0.9)
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        freed, victims = 0, []
+        for key, size in db.execute("SELECT key, LENGTH(vec) FROM embeddings ORDER BY last_used"):
+            if self._disk_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        db.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        db.commit()
+        self._disk_bytes -= freed
+        LOGGER.info("Evicted %d embeddings from the cache (%d bytes).", len(victims), freed)
+
+    def stats(self) -> Dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
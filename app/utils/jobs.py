@@ -0,0 +1,251 @@
+# app/utils/jobs.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+# Stages after which a job can no longer be cancelled (rows are being written)
+_UNCANCELLABLE_STAGES = ("committing",)
+# progress snapshots for other workers are written at most this often (seconds)
+_SNAPSHOT_INTERVAL = 1.0
+# another worker's cancel marker is looked for at most this often, and at stage changes
+_CANCEL_CHECK_INTERVAL = 1.0
+
+
+class JobCancelled(Exception):
+    """Raised from progress callbacks once a job has been asked to stop."""
+
+
+class IngestJob:
+    def __init__(self, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"  # queued | running | succeeded | failed | cancelled
+        self.stage = "queued"  # queued | parsing | embedding | committing | done
+        self.pages_parsed = 0
+        self.pages_total: int | None = None
+        self.chunks_embedded = 0
+        self.chunks_total: int | None = None
+        self.result: Dict | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._stage_started_at = self.created_at
+        self._cancel_requested = False
+        self._task: asyncio.Task | None = None
+        # set by a JobManager with a shared status directory
+        self._manager: "JobManager | None" = None
+        self._snapshot_at = 0.0
+        # progress() runs on worker threads while the event loop writes too
+        self._snapshot_lock = threading.Lock()
+        self._cancel_checked_at = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def progress(self, stage: str, done: int, total: int | None):
+        """
+        Progress callback handed to the loader and vector store. May be called
+        from worker threads; raises JobCancelled to abort work in progress.
+        """
+        manager = self._manager
+        new_stage = stage != self.stage
+        now = time.time()
+        check_marker = new_stage or now - self._cancel_checked_at >= _CANCEL_CHECK_INTERVAL
+        if not self._cancel_requested and manager is not None and check_marker:
+            self._cancel_checked_at = now
+            self._cancel_requested = manager._cancel_marked(self.id)
+        if self._cancel_requested and self.stage not in _UNCANCELLABLE_STAGES:
+            raise JobCancelled(self.id)
+        if new_stage:
+            self.stage = stage
+            self._stage_started_at = now
+        if stage == "parsing":
+            self.pages_parsed, self.pages_total = done, total
+        elif stage == "embedding":
+            self.chunks_embedded, self.chunks_total = done, total
+        if manager is not None and (new_stage or now - self._snapshot_at >= _SNAPSHOT_INTERVAL):
+            manager._write_snapshot(self)
+
+    def eta_seconds(self) -> float | None:
+        """Remaining time of the current stage, extrapolated from its throughput so far."""
+        if self.stage == "parsing":
+            done, total = self.pages_parsed, self.pages_total
+        elif self.stage == "embedding":
+            done, total = self.chunks_embedded, self.chunks_total
+        else:
+            return 0.0 if self.finished else None
+        if not done or not total:
+            return None
+        elapsed = time.time() - self._stage_started_at
+        return round(elapsed / done * (total - done), 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_parsed": self.pages_parsed,
+            "pages_total": self.pages_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_total": self.chunks_total,
+            "eta_seconds": self.eta_seconds(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _RemoteJob:
+    """Read-only view of a job run by another worker, from its status snapshot."""
+
+    def __init__(self, state: Dict):
+        self.state = state
+        self.id = state["job_id"]
+        self.status = state["status"]
+        self.stage = state["stage"]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> Dict:
+        return self.state
+
+
+class JobManager:
+    """
+    Runs ingestion jobs as background asyncio tasks. At most `max_workers` jobs
+    run at once; the rest wait in FIFO order. Finished jobs are kept for
+    `retention` seconds so clients can read their final status.
+
+    With `status_dir`, several worker processes share job status: each job's
+    state is snapshotted to `<status_dir>/<job_id>.json`, so any worker can
+    report it, and cancelling a job owned by another worker leaves a
+    `<job_id>.cancel` marker that the owner picks up at a progress update (it
+    looks at most every _CANCEL_CHECK_INTERVAL seconds, and at each new stage).
+    """
+
+    def __init__(self, max_workers: int = 2, retention: float = 3600.0, status_dir: str | None = None):
+        self.max_workers = max_workers
+        self.retention = retention
+        self.status_dir = status_dir
+        if status_dir:
+            os.makedirs(status_dir, exist_ok=True)
+        self._jobs: Dict[str, IngestJob] = {}
+        self._slots: asyncio.Semaphore | None = None
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+        if self.status_dir:
+            for name in os.listdir(self.status_dir):
+                path = os.path.join(self.status_dir, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.status_dir, f"{job_id}{suffix}")
+
+    def _write_snapshot(self, job: IngestJob):
+        if not self.status_dir:
+            return
+        path = self._path(job.id, ".json")
+        tmp = f"{path}.tmp"
+        # one writer per job at a time, so the temp file is never shared
+        with job._snapshot_lock:
+            job._snapshot_at = time.time()
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(job.to_dict(), f)
+                os.replace(tmp, path)
+            except OSError as e:
+                LOGGER.warning("Could not write status of ingest job %s: %s", job.id, e)
+
+    def _read_snapshot(self, job_id: str) -> _RemoteJob | None:
+        # job ids are uuid hex; anything else never names a file
+        if not self.status_dir or not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id, ".json"), encoding="utf-8") as f:
+                return _RemoteJob(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def _cancel_marked(self, job_id: str) -> bool:
+        return bool(self.status_dir) and os.path.exists(self._path(job_id, ".cancel"))
+
+    def submit(self, filename: str, run: Callable[[IngestJob], Awaitable[Dict]]) -> IngestJob:
+        self._prune()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        job = IngestJob(filename)
+        self._jobs[job.id] = job
+        if self.status_dir:
+            job._manager = self
+            self._write_snapshot(job)
+        job._task = asyncio.create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: IngestJob, run: Callable[[IngestJob], Awaitable[Dict]]):
+        try:
+            async with self._slots:
+                if job._cancel_requested or self._cancel_marked(job.id):
+                    raise JobCancelled(job.id)
+                job.status = "running"
+                job.started_at = time.time()
+                self._write_snapshot(job)
+                job.result = await run(job)
+                job.status = "succeeded"
+                job.stage = "done"
+        except (JobCancelled, asyncio.CancelledError):
+            job.status = "cancelled"
+            LOGGER.info("Ingest job %s (%s) cancelled.", job.id, job.filename)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            LOGGER.error("Ingest job %s (%s) failed: %s", job.id, job.filename, e)
+        finally:
+            job.finished_at = time.time()
+            self._write_snapshot(job)
+
+    def get(self, job_id: str) -> "IngestJob | _RemoteJob | None":
+        return self._jobs.get(job_id) or self._read_snapshot(job_id)
+
+    def list(self):
+        jobs = list(self._jobs.values())
+        if self.status_dir:
+            names = sorted(n[: -len(".json")] for n in os.listdir(self.status_dir) if n.endswith(".json"))
+            jobs.extend(j for j in map(self._read_snapshot, names) if j is not None and j.id not in self._jobs)
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation. Returns False if the job is finished or already writing rows."""
+        job = self.get(job_id)
+        if job is None or job.finished or job.stage in _UNCANCELLABLE_STAGES:
+            return False
+        if isinstance(job, _RemoteJob):
+            # the owning worker stops at its next progress update
+            open(self._path(job_id, ".cancel"), "w").close()
+            job.state = {**job.state, "cancel_requested": True}
+            return True
+        job._cancel_requested = True
+        if job._task is not None:
+            job._task.cancel()
+        return True
@@ -0,0 +1,207 @@
+# app/utils/lexical.py
+"""
+BM25 inverted index over the vector store's rows, plus rank fusion helpers.
+
+Follows the same load/sync/search/reset/save protocol as the ANN backends in
+utils/ann.py: rows are identified by their global store row, sync() indexes
+rows appended since the last call and discounts newly tombstoned rows from
+the collection statistics. Postings are saved per segment
+(``seg-000001.bm25.npz``); tombstones are applied after loading.
+"""
+import logging
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from utils import segments
+from utils.ann import segment_spans, top_k, unsaved_segments
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+# words joined by - : . / are kept whole ("b-12", "10:30") and also split into parts
+_TOKEN_RE = re.compile(r"\w+(?:[-:./]\w+)*")
+_PART_RE = re.compile(r"[-:./]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its me my of on or "
+    "the this that to was what when where which who will with you your".split()
+)
+
+# reciprocal rank fusion damping constant from the original RRF paper
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.casefold()):
+        if tok in _STOPWORDS:
+            continue
+        tokens.append(tok)
+        if _PART_RE.search(tok):
+            tokens.extend(p for p in _PART_RE.split(tok) if p and p not in _STOPWORDS)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse best-first row rankings; returns the top k rows and their RRF scores."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (RRF_K + rank + 1)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    best = top_k(scores, k)
+    return rows[best], scores[best]
+
+
+class BM25Index:
+    """Okapi BM25 over store rows; postings are kept as compact per-term arrays."""
+
+    KIND = "bm25"
+
+    def __init__(self, store, k1: float = 1.2, b: float = 0.75):
+        self.store = store
+        self.k1 = k1
+        self.b = b
+        self._clear()
+
+    def _clear(self):
+        # term -> (rows, term frequencies); rows are appended in increasing order
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # live document frequency per term (tombstoned rows are subtracted)
+        self.df: Counter = Counter()
+        self.lengths = array("i")
+        self.count = 0
+        self.live_docs = 0
+        self.live_length = 0
+        self.dead = np.zeros(0, dtype=np.int64)
+        # segments whose part file is on disk
+        self._parts: set = set()
+
+    def reset(self):
+        self._clear()
+
+    def _add(self, row: int, text: str):
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("q"), array("i"))
+            entry[0].append(row)
+            entry[1].append(tf)
+            self.df[term] += 1
+        self.lengths.append(len(tokens))
+        self.live_docs += 1
+        self.live_length += len(tokens)
+
+    def _discount(self, row: int):
+        for term in set(tokenize(self.store._row(row)["text"])):
+            self.df[term] -= 1
+        self.live_docs -= 1
+        self.live_length -= self.lengths[row]
+
+    def _discount_deleted(self):
+        # only rows indexed so far; the rest are discounted once they are
+        if self.store._deleted_count != self.dead.shape[0]:
+            deleted = np.flatnonzero(self.store._deleted[: self.count])
+            for row in np.setdiff1d(deleted, self.dead, assume_unique=True):
+                self._discount(int(row))
+            self.dead = deleted
+
+    def _load_part(self, name: str, first: int, end: int) -> bool:
+        try:
+            part = segments.read_sidecar(self.store.vector_dir, name, self.KIND)
+        except Exception as e:
+            LOGGER.warning("Could not read BM25 part of %s, it will be rebuilt: %s", name, e)
+            return False
+        if part is None or part["lengths"].shape[0] != end - first:
+            return False
+        offsets, rows, tfs = part["offsets"], part["rows"] + first, part["tfs"]
+        for i, term in enumerate(part["terms"].tolist()):
+            lo, hi = offsets[i], offsets[i + 1]
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("q"), array("i"))
+            entry[0].frombytes(rows[lo:hi].tobytes())
+            entry[1].frombytes(tfs[lo:hi].tobytes())
+            self.df[term] += int(hi - lo)
+        lengths = part["lengths"].astype(np.int32)
+        self.lengths.frombytes(lengths.tobytes())
+        self.live_docs += end - first
+        self.live_length += int(lengths.sum())
+        self.count = end
+        self._parts.add(name)
+        return True
+
+    def sync(self):
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                for row in range(first, end):
+                    self._add(row, self.store._row(row)["text"])
+                self.count = end
+        self._discount_deleted()
+
+    def search(self, query: str, k: int, rows: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by BM25, optionally restricted to the given sorted rows."""
+        terms = [t for t in set(tokenize(query)) if self.df.get(t, 0) > 0]
+        if not terms or not self.live_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)
+        avgdl = self.live_length / self.live_docs or 1.0
+        rows_parts, score_parts = [], []
+        for term in terms:
+            rows_buf, tfs_buf = self.postings[term]
+            term_rows = np.frombuffer(rows_buf, dtype=np.int64)
+            tfs = np.frombuffer(tfs_buf, dtype=np.int32).astype(np.float32)
+            df = self.df[term]
+            idf = np.log1p((self.live_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[term_rows] / avgdl)
+            rows_parts.append(term_rows)
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        uniq, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if self.store._deleted_count:
+            scores[self.store.deleted_mask(uniq)] = -np.inf
+        if rows is not None:
+            scores[~np.isin(uniq, rows, assume_unique=True)] = -np.inf
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return uniq[best], scores[best]
+
+    def save(self):
+        # a part is built from the segment's own rows, so saving never walks the whole index
+        for name, first, end in unsaved_segments(self.store, self.count, self._parts):
+            postings: Dict[str, Tuple[List[int], List[int]]] = {}
+            lengths = np.zeros(end - first, dtype=np.int32)
+            for row in range(first, end):
+                tokens = tokenize(self.store._row(row)["text"])
+                lengths[row - first] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    entry = postings.setdefault(term, ([], []))
+                    entry[0].append(row - first)
+                    entry[1].append(tf)
+            terms = list(postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum([len(postings[t][0]) for t in terms], out=offsets[1:])
+            segments.write_sidecar(
+                self.store.vector_dir,
+                name,
+                self.KIND,
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                rows=np.fromiter((r for t in terms for r in postings[t][0]), dtype=np.int64, count=int(offsets[-1])),
+                tfs=np.fromiter((f for t in terms for f in postings[t][1]), dtype=np.int32, count=int(offsets[-1])),
+                lengths=lengths,
+            )
+            self._parts.add(name)
+
+    def load(self):
+        # superseded by the per-segment parts
+        segments.delete_legacy_sidecar(self.store.vector_dir, "bm25.npz")
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                break
+        self._discount_deleted()
@@ -1,56 +1,158 @@
 # app/utils/loader.py
-from typing import List, Dict
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
 from PyPDF2 import PdfReader
 import uuid
 import re
 from utils.config import settings
+from utils.embedding_cache import content_hash
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def load_pdf_text(pdf_path: str) -> str:
-    """Extract raw text from PDF file."""
-    text = ""
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    # runs in a worker process for large PDFs: each worker parses its own page range
     with open(pdf_path, "rb") as f:
         reader = PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() or ""
-    return text
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_pdf_pages(pdf_path: str, progress: Callable | None = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for each page, 1-based and in order, without holding
+    the whole document's text. PDFs with at least PDF_PARALLEL_MIN_PAGES pages are
+    extracted across a process pool in page ranges; results still arrive in order.
+    progress("parsing", done, total) is called per page.
+    """
+    with open(pdf_path, "rb") as f:
+        reader = PdfReader(f)
+        total = len(reader.pages)
+        workers = min(settings.PDF_EXTRACT_PROCESSES or os.cpu_count() or 1, total)
+        if total < settings.PDF_PARALLEL_MIN_PAGES or workers < 2:
+            for i, page in enumerate(reader.pages):
+                yield i + 1, page.extract_text() or ""
+                if progress:
+                    progress("parsing", i + 1, total)
+            return
+
+    # a few ranges per worker keeps all cores busy while pages stream back in order
+    step = max(1, -(-total // (workers * 4)))
+    ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+    # "spawn" avoids forking a process that is running an event loop and thread pool
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
+        try:
+            for (start, _), future in zip(ranges, futures):
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+                    if progress:
+                        progress("parsing", start + offset + 1, total)
+        finally:
+            for future in futures:
+                future.cancel()
+
+def load_pdf_text(pdf_path: str, progress: Callable | None = None) -> str:
+    """Extract raw text from PDF file. progress("parsing", done, total) is called per page."""
+    return "\n".join(text for _, text in iter_pdf_pages(pdf_path, progress=progress))
 
 def load_text_file(file_path: str) -> str:
     with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
+def _make_splitter(max_tokens: int, overlap_tokens: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=max_tokens * 4,  # rough char equivalent
+        chunk_overlap=overlap_tokens * 4,
+        length_function=len,
+        separators=["\n\n", "\n", ".", "!", "?", " "],
+        add_start_index=True,
+    )
+
 def chunk_text(text: str, max_tokens: int = 400, overlap_tokens: int = 40) -> List[str]:
     """
     Split text into token-aware chunks.
     Uses LangChain's RecursiveCharacterTextSplitter
     tuned roughly to ~400 tokens (~1500 chars) with overlap.
     """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=max_tokens * 4,  # rough char equivalent
-        chunk_overlap=overlap_tokens * 4,
-        length_function=len,
-        separators=["\n\n", "\n", ".", "!", "?", " "]
-    )
-    return splitter.split_text(text)
+    return _make_splitter(max_tokens, overlap_tokens).split_text(text)
 
-def prepare_docs_from_file(file_path: str) -> List[Dict]:
+def iter_chunks(pages: Iterable[Tuple[int | None, str]], max_tokens: int = 400, overlap_tokens: int = 40) -> Iterator[Tuple[str, List[int]]]:
     """
-    Load, split, and structure docs for ingestion.
+    Incrementally chunk a stream of (page_number, text) pairs, yielding
+    (chunk_text, page_numbers) as soon as enough text has accumulated. Only the
+    unfinished tail (the last, possibly partial chunk) is carried between pages,
+    so memory stays flat regardless of document length.
     """
+    splitter = _make_splitter(max_tokens, overlap_tokens)
+    flush_at = 2 * max_tokens * 4
+    buffer = ""
+    # (offset in buffer, page number) for every page that starts in the buffer
+    page_starts: List[Tuple[int, int | None]] = []
+
+    def pages_for(start: int, end: int) -> List[int]:
+        # page i spans [its offset, next page's offset)
+        return [
+            p for i, (offset, p) in enumerate(page_starts)
+            if p is not None and offset < end and (i + 1 == len(page_starts) or page_starts[i + 1][0] > start)
+        ]
+
+    for page_no, text in pages:
+        if not text:
+            continue
+        if buffer:
+            buffer += "\n"
+        page_starts.append((len(buffer), page_no))
+        buffer += text
+        if len(buffer) < flush_at:
+            continue
+        docs = splitter.create_documents([buffer])
+        if len(docs) < 2:
+            continue
+        for doc in docs[:-1]:
+            start = doc.metadata["start_index"]
+            yield doc.page_content, pages_for(start, start + len(doc.page_content))
+        # keep the last chunk's text; it may continue on the next page
+        cut = docs[-1].metadata["start_index"]
+        buffer = buffer[cut:]
+        # the page containing `cut` continues at offset 0; later pages shift left
+        carried = [p for offset, p in page_starts if offset <= cut][-1:]
+        page_starts = [(0, p) for p in carried] + [(offset - cut, p) for offset, p in page_starts if offset > cut]
+
+    if buffer.strip():
+        for doc in splitter.create_documents([buffer]):
+            start = doc.metadata["start_index"]
+            yield doc.page_content, pages_for(start, start + len(doc.page_content))
+
+def iter_document_chunks(file_path: str, progress: Callable | None = None) -> Iterator[Dict]:
+    """
+    Stream {"id","text","meta"} chunks for a file while it is being read.
+    meta["hash"] is the chunk's content hash (see VectorStore.replace_source).
+    PDF chunks carry the 1-based page numbers they span in meta["pages"].
+    """
+    source = os.path.basename(file_path)
     ext = os.path.splitext(file_path)[1].lower()
     if ext == ".pdf":
-        raw = load_pdf_text(file_path)
+        pages = iter_pdf_pages(file_path, progress=progress)
     else:
-        raw = load_text_file(file_path)
+        pages = [(None, load_text_file(file_path))]
+        if progress:
+            progress("parsing", 1, 1)
+
+    for text, page_numbers in iter_chunks(pages):
+        # ids are content-addressed so re-ingesting an unchanged chunk maps to the same row
+        meta = {"source": source, "hash": content_hash(text)}
+        if page_numbers:
+            meta["pages"] = page_numbers
+        yield {"id": f"{source}_{meta['hash']}", "text": text, "meta": meta}
 
-    chunks = chunk_text(raw)
-    docs = [{"id": f"{os.path.basename(file_path)}_{i}", "text": c, "meta": {"source": os.path.basename(file_path)}} for i, c in enumerate(chunks)]
-    return docs
+def prepare_docs_from_file(file_path: str, progress: Callable | None = None) -> List[Dict]:
+    """
+    Load, split, and structure docs for ingestion.
+    """
+    return list(iter_document_chunks(file_path, progress=progress))
 
-def load_document_chunks(file_path: str) -> List[Dict]:
+def load_document_chunks(file_path: str, progress: Callable | None = None) -> List[Dict]:
     """
     Alias for prepare_docs_from_file for backward compatibility.
     """
-    return prepare_docs_from_file(file_path)
+    return prepare_docs_from_file(file_path, progress=progress)
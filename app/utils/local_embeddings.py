@@ -0,0 +1,308 @@
+# app/utils/local_embeddings.py
+"""
+Local (offline) sentence embeddings, used when Gradient embeddings are disabled
+or fail.
+
+Inference runs on one dedicated worker thread, not on the request path or the
+shared CPU pool:
+
+- concurrent requests (query batches, ingest batches) are merged into one
+  inference batch of up to LOCAL_EMBEDDING_MAX_BATCH texts, waiting at most
+  LOCAL_EMBEDDING_MAX_WAIT_MS for more to arrive
+- texts are encoded in length-sorted chunks, so short texts are not padded to
+  the longest one in the batch
+- the thread (and the intra-op threads the runtime starts from it) can be
+  pinned to LOCAL_EMBEDDING_CPUS and is limited to LOCAL_EMBEDDING_THREADS
+
+Encoders:
+
+- "onnx": an ONNX export of the model run with onnxruntime, with mean pooling
+  and L2 normalization done in NumPy. The model repos of sentence-transformers
+  ship int8-quantized exports (LOCAL_EMBEDDING_ONNX_FILE). Needs `onnxruntime`,
+  `tokenizers` and `huggingface_hub`.
+- "torch": the sentence-transformers model (the default).
+
+Results are float32 NumPy arrays end to end. ONNX vectors are not identical to
+the torch ones, so an embedder's model_id names its variant; that id keys the
+embedding cache and is recorded in the vector index manifest.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+import numpy as np
+
+from utils.config import settings
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+
+def _normalize(embs: np.ndarray) -> np.ndarray:
+    return embs / (np.linalg.norm(embs, axis=1, keepdims=True) + 1e-12)
+
+
+def _default_threads() -> int:
+    # leave the other half of the cores to the event loop and the CPU pool
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class OnnxEncoder:
+    name = "onnx"
+
+    def __init__(self, model_name: str, onnx_file: str, threads: int, max_length: int):
+        try:
+            import onnxruntime as ort
+            from huggingface_hub import hf_hub_download
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "LOCAL_EMBEDDING_BACKEND=onnx requires the 'onnxruntime', 'tokenizers' and 'huggingface_hub' packages (pip install onnxruntime)."
+            ) from e
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(hf_hub_download(model_name, onnx_file), options, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.variant = os.path.splitext(os.path.basename(onnx_file))[0]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+        # mean pooling over real tokens, as the sentence-transformers pipeline does
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return _normalize(pooled.astype(np.float32))
+
+
+class TorchEncoder:
+    name = "torch"
+    variant = "torch"
+
+    def __init__(self, model_name: str, threads: int):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("LOCAL_EMBEDDING_BACKEND=torch requires the 'sentence-transformers' package.") from e
+        torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        embs = self.model.encode(texts, batch_size=len(texts), show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(embs, dtype=np.float32)
+
+
+def resolve_backend(backend: str) -> str:
+    backend = backend.lower()
+    if backend == "auto":
+        return "onnx" if importlib.util.find_spec("onnxruntime") is not None else "torch"
+    if backend not in ("onnx", "torch"):
+        raise ValueError(f"Unknown LOCAL_EMBEDDING_BACKEND: {backend!r} (expected 'auto', 'onnx' or 'torch')")
+    return backend
+
+
+class _Request:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class LocalEmbedder:
+    """
+    Embeds texts on a dedicated inference thread with dynamic batching (see the
+    module docstring). The model is loaded on that thread by the first request;
+    a failed load is retried by the next one.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = "torch",
+        onnx_file: str = "onnx/model_quint8_avx2.onnx",
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+        threads: int = 0,
+        cpus: List[int] | None = None,
+        max_length: int = 256,
+    ):
+        self.model_name = model_name
+        self.backend = resolve_backend(backend)
+        self.onnx_file = onnx_file
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.threads = threads or _default_threads()
+        self.cpus = cpus
+        self.max_length = max_length
+        self._encoder = None
+        self._queue: "queue.Queue[_Request | None]" = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def model_id(self) -> str:
+        """Which vectors this embedder produces: the model name for torch, plus the ONNX export otherwise."""
+        if self.backend == "onnx":
+            return f"{self.model_name}@onnx:{os.path.splitext(os.path.basename(self.onnx_file))[0]}"
+        return self.model_name
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="eventease-embed", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for the inference thread; the future resolves to an (n, dim) float32 array."""
+        req = _Request(list(texts))
+        self.requests += 1
+        self._ensure_started()
+        self._queue.put(req)
+        return req.future
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _pin(self):
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                # pid 0 is the calling thread; threads the runtime starts from here inherit it
+                os.sched_setaffinity(0, self.cpus)
+            except OSError as e:
+                LOGGER.warning("Could not pin the embedding thread to CPUs %s: %s", self.cpus, e)
+
+    def _load(self):
+        started = time.perf_counter()
+        if self.backend == "onnx":
+            self._encoder = OnnxEncoder(self.model_name, self.onnx_file, self.threads, self.max_length)
+        else:
+            self._encoder = TorchEncoder(self.model_name, self.threads)
+        LOGGER.info(
+            "Loaded local embedding model %s (%s, %d threads) in %.2fs.",
+            self.model_name, self._encoder.variant, self.threads, time.perf_counter() - started,
+        )
+
+    def _next_batch(self, first: _Request):
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                req = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if req is None:
+                # close(): finish this batch first
+                self._queue.put(None)
+                break
+            batch.append(req)
+            size += len(req.texts)
+        return batch
+
+    def _run(self):
+        self._pin()
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # requests whose callers gave up are dropped; the rest can no longer be cancelled
+            batch = [req for req in self._next_batch(first) if req.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [t for req in batch for t in req.texts]
+            started = time.perf_counter()
+            try:
+                if self._encoder is None:
+                    self._load()
+                embs = self._encode(texts)
+            except Exception as e:
+                for req in batch:
+                    req.future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for req in batch:
+                req.future.set_result(embs[start : start + len(req.texts)])
+                start += len(req.texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # similar lengths per chunk keep padding (wasted compute) small
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        out = None
+        for lo in range(0, len(texts), self.max_batch):
+            idxs = order[lo : lo + self.max_batch]
+            embs = self._encoder.encode([texts[i] for i in idxs])
+            if out is None:
+                out = np.empty((len(texts), embs.shape[1]), dtype=np.float32)
+            out[idxs] = embs
+        return out
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "model": self.model_id,
+            "loaded": self._encoder is not None,
+            "threads": self.threads,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+_embedders: Dict[str, LocalEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_local_embedder(model_name: str) -> LocalEmbedder:
+    """The process-wide embedder for a model (one copy of the weights per process)."""
+    with _embedders_lock:
+        embedder = _embedders.get(model_name)
+        if embedder is None:
+            embedder = _embedders[model_name] = LocalEmbedder(
+                model_name,
+                backend=settings.LOCAL_EMBEDDING_BACKEND,
+                onnx_file=settings.LOCAL_EMBEDDING_ONNX_FILE,
+                max_batch=settings.LOCAL_EMBEDDING_MAX_BATCH,
+                max_wait=settings.LOCAL_EMBEDDING_MAX_WAIT_MS / 1000,
+                threads=settings.LOCAL_EMBEDDING_THREADS,
+                cpus=settings.LOCAL_EMBEDDING_CPUS,
+                max_length=settings.LOCAL_EMBEDDING_MAX_LENGTH,
+            )
+    return embedder
+
+
+def loaded_embedders() -> List[LocalEmbedder]:
+    with _embedders_lock:
+        return list(_embedders.values())
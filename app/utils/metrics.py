@@ -0,0 +1,161 @@
+# app/utils/metrics.py
+"""
+Minimal in-process metrics rendered in the Prometheus text exposition format.
+
+Histograms and counters are updated on the request path, so recording is a
+dict lookup, a bisect and a couple of additions under a lock. Gauges are
+callbacks evaluated only when /metrics is scraped.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# seconds; covers cache hits (sub-millisecond) through slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REGISTRY: List = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(s[0]), s[1], s[2]]) for k, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _label_str(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float] | None = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        _REGISTRY.append(self)
+
+    def collect(self) -> List[str]:
+        if self.fn is None:
+            return []
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        # None: not available yet (e.g. during warm-up)
+        if value is None:
+            return []
+        return [f"{self.name} {float(value):g}"]
+
+
+def render() -> str:
+    out = []
+    for metric in _REGISTRY:
+        lines = metric.collect()
+        if not lines:
+            continue
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+# -- application metrics -------------------------------------------------------
+
+CHAT_STAGE_SECONDS = Histogram(
+    "eventease_chat_stage_seconds",
+    "Time spent per /chat stage (history_load, embed_query, search, prompt_build, llm, history_update).",
+    ["stage"],
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "eventease_ingest_stage_seconds",
+    "Time spent per ingest stage (parse, embed, commit); embed excludes waiting for the parser.",
+    ["stage"],
+)
+PROVIDER_ERRORS = Counter(
+    "eventease_provider_errors_total",
+    "Failed upstream provider requests, by upstream and HTTP status (or 'transport').",
+    ["upstream", "status"],
+)
+EMBEDDING_FALLBACKS = Counter(
+    "eventease_embedding_fallbacks_total",
+    "Embedding batches that fell back from Gradient to the local embedding model.",
+)
+CHAT_REQUESTS = Counter(
+    "eventease_chat_requests_total",
+    "Answered chat requests, by whether the answer came from the answer cache.",
+    ["cached"],
+)
@@ -0,0 +1,149 @@
+# app/utils/partitions.py
+"""
+Metadata partitions for filtered search.
+
+For each filterable meta key (source, event_id, tags) the index keeps the
+sorted list of store rows carrying each value, so a filtered query only
+gathers and scores the rows in the matching partitions. Same
+load/sync/reset/save protocol as utils/ann.py; saved per segment
+(``seg-000001.partitions.npz``). Tombstoned rows stay in their partitions and
+are dropped at match time.
+"""
+import logging
+from array import array
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils import segments
+from utils.ann import segment_spans, unsaved_segments
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+FILTER_KEYS = ("source", "event_id", "tags")
+
+
+def normalize_filters(filters: Dict | None) -> Tuple | None:
+    """
+    Canonical, hashable form of a filter: ((key, (values...)), ...).
+    A list of values matches any of them; different keys must all match.
+    """
+    if not filters:
+        return None
+    out = []
+    for key in sorted(filters):
+        if key not in FILTER_KEYS:
+            raise ValueError(f"Unknown filter key: {key!r} (expected one of {', '.join(FILTER_KEYS)})")
+        values = filters[key]
+        if values is None:
+            continue
+        if isinstance(values, (str, int)):
+            values = [values]
+        out.append((key, tuple(sorted({str(v) for v in values}))))
+    return tuple(out) or None
+
+
+def _row_values(meta: Dict):
+    """(key, value) pairs a row's meta is filed under."""
+    for key in FILTER_KEYS:
+        values = meta.get(key)
+        if values is None:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        for value in {str(v) for v in values}:
+            yield key, value
+
+
+class MetadataIndex:
+    KIND = "partitions"
+
+    def __init__(self, store):
+        self.store = store
+        self._clear()
+
+    def _clear(self):
+        # (key, value) -> rows in increasing order
+        self.partitions: Dict[Tuple[str, str], array] = {}
+        self.count = 0
+        # segments whose part file is on disk
+        self._parts: set = set()
+
+    def reset(self):
+        self._clear()
+
+    def _load_part(self, name: str, first: int, end: int) -> bool:
+        try:
+            part = segments.read_sidecar(self.store.vector_dir, name, self.KIND)
+        except Exception as e:
+            LOGGER.warning("Could not read metadata partitions of %s, they will be rebuilt: %s", name, e)
+            return False
+        if part is None or int(part["count"]) != end - first:
+            return False
+        offsets, rows = part["offsets"], part["rows"] + first
+        for i, label in enumerate(part["names"].tolist()):
+            key, value = label.split("\t", 1)
+            held = self.partitions.get((key, value))
+            if held is None:
+                held = self.partitions[(key, value)] = array("q")
+            held.frombytes(rows[offsets[i] : offsets[i + 1]].tobytes())
+        self.count = end
+        self._parts.add(name)
+        return True
+
+    def sync(self):
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is not None and self._load_part(name, first, end):
+                continue
+            for row in range(first, end):
+                for label in _row_values(self.store._row(row).get("meta") or {}):
+                    rows = self.partitions.get(label)
+                    if rows is None:
+                        rows = self.partitions[label] = array("q")
+                    rows.append(row)
+            self.count = end
+
+    def match(self, filters: Tuple) -> np.ndarray:
+        """Sorted live rows matching a normalize_filters() result."""
+        result = None
+        for key, values in filters:
+            parts = [np.frombuffer(self.partitions[(key, v)], dtype=np.int64) for v in values if (key, v) in self.partitions]
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if not result.size:
+                return result
+        if self.store._deleted_count:
+            result = result[~self.store.deleted_mask(result)]
+        return result
+
+    def values(self, key: str) -> List[str]:
+        return sorted(v for k, v in self.partitions if k == key)
+
+    def save(self):
+        # a part is built from the segment's own rows, so saving never walks the whole index
+        for name, first, end in unsaved_segments(self.store, self.count, self._parts):
+            partitions: Dict[Tuple[str, str], List[int]] = {}
+            for row in range(first, end):
+                for label in _row_values(self.store._row(row).get("meta") or {}):
+                    partitions.setdefault(label, []).append(row - first)
+            names = list(partitions)
+            offsets = np.zeros(len(names) + 1, dtype=np.int64)
+            np.cumsum([len(partitions[n]) for n in names], out=offsets[1:])
+            segments.write_sidecar(
+                self.store.vector_dir,
+                name,
+                self.KIND,
+                names=np.array([f"{k}\t{v}" for k, v in names], dtype=str),
+                offsets=offsets,
+                rows=np.array([r for n in names for r in partitions[n]], dtype=np.int64),
+                count=np.int64(end - first),
+            )
+            self._parts.add(name)
+
+    def load(self):
+        # superseded by the per-segment parts
+        segments.delete_legacy_sidecar(self.store.vector_dir, "partitions.npz")
+        for name, first, end in segment_spans(self.store, self.count):
+            if name is None or not self._load_part(name, first, end):
+                break
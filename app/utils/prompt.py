@@ -0,0 +1,135 @@
+# app/utils/prompt.py
+"""
+Token-budgeted prompt assembly.
+
+Parts are added in priority order until settings.PROMPT_MAX_TOKENS is used up:
+
+1. instructions and the user's question (always included)
+2. recent conversation history, newest first: the latest exchange verbatim,
+   older turns shortened to PROMPT_HISTORY_TURN_TOKENS, all within
+   PROMPT_HISTORY_TOKENS
+3. retrieved chunks in rank order, with text already present in a
+   higher-ranked chunk removed (the splitter's overlaps, duplicate chunks);
+   the first chunk that does not fit is truncated and the rest are dropped
+"""
+from typing import Dict, List, Tuple
+
+from utils.config import settings
+from utils.tokens import count_tokens, truncate_tokens
+
+SYSTEM_PROMPT = (
+    "You are EventEase — an assistant answering user questions about an event. "
+    "Answer concisely and naturally without mentioning chunk IDs or source references."
+)
+
+# overlaps are located by searching for this many leading characters of one chunk
+# in the last _OVERLAP_WINDOW characters of another
+_OVERLAP_PROBE = 32
+_OVERLAP_WINDOW = 1000
+# a truncated chunk shorter than this is not worth including
+_MIN_CHUNK_TOKENS = 32
+# latest user/assistant exchange is never shortened
+_VERBATIM_TURNS = 2
+# section headers and separators between prompt parts
+_FRAMING_TOKENS = 16
+
+
+def _suffix_prefix_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (at least _OVERLAP_PROBE chars)."""
+    probe = b[:_OVERLAP_PROBE]
+    if len(probe) < _OVERLAP_PROBE:
+        return 0
+    pos = a.find(probe, max(0, len(a) - _OVERLAP_WINDOW))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def strip_overlaps(text: str, kept: List[str]) -> str:
+    """Remove the parts of `text` that already appear at the edges of (or inside) kept chunks."""
+    for prev in kept:
+        if text in prev:
+            return ""
+        head = _suffix_prefix_overlap(prev, text)
+        if head:
+            text = text[head:].lstrip()
+        tail = _suffix_prefix_overlap(text, prev)
+        if tail:
+            text = text[: len(text) - tail].rstrip()
+        if not text:
+            return ""
+    return text
+
+
+def _history_lines(history: List[Dict], budget: int) -> Tuple[List[str], int]:
+    lines: List[str] = []
+    used = 0
+    for age, m in enumerate(reversed(history)):
+        text = m["text"]
+        if age >= _VERBATIM_TURNS:
+            text = truncate_tokens(text, settings.PROMPT_HISTORY_TURN_TOKENS)
+        line = f"{m['role'].upper()}: {text}"
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            break
+        lines.append(line)
+        used += tokens
+    lines.reverse()
+    return lines, used
+
+
+def build_prompt(query: str, contexts: List[Dict], history: List[Dict] | None = None) -> Tuple[str, Dict]:
+    """Return (prompt, usage) where usage reports how the token budget was spent."""
+    question = f"USER: {query}"
+    budget = settings.PROMPT_MAX_TOKENS
+    remaining = budget - _FRAMING_TOKENS - count_tokens(SYSTEM_PROMPT) - count_tokens(question) - count_tokens("ASSISTANT:")
+
+    history_lines, history_tokens = _history_lines(history or [], min(settings.PROMPT_HISTORY_TOKENS, max(remaining, 0)))
+    remaining -= history_tokens
+
+    blocks: List[str] = []
+    kept: List[str] = []
+    deduplicated = truncated = 0
+    context_tokens = 0
+    for c in contexts:
+        text = strip_overlaps(c["text"], kept)
+        if not text:
+            deduplicated += 1
+            continue
+        block = f"[{len(blocks) + 1}] {text}"
+        tokens = count_tokens(block)
+        if tokens > remaining:
+            if remaining < _MIN_CHUNK_TOKENS:
+                break
+            block = truncate_tokens(block, remaining)
+            tokens = count_tokens(block)
+            truncated += 1
+        blocks.append(block)
+        kept.append(c["text"])
+        context_tokens += tokens
+        remaining -= tokens
+        if remaining < _MIN_CHUNK_TOKENS:
+            break
+
+    parts = [SYSTEM_PROMPT]
+    if blocks:
+        parts.append("Context:\n" + "\n\n".join(blocks))
+    if history_lines:
+        parts.append("Conversation:")
+        parts.extend(history_lines)
+    parts.append(question)
+    parts.append("ASSISTANT:")
+    prompt = "\n\n".join(parts)
+    usage = {
+        "prompt_tokens": count_tokens(prompt),
+        "context_tokens": context_tokens,
+        "history_tokens": history_tokens,
+        "chunks_retrieved": len(contexts),
+        "chunks_used": len(blocks),
+        "chunks_deduplicated": deduplicated,
+        "chunks_truncated": truncated,
+        "history_messages": len(history_lines),
+    }
+    return prompt, usage
@@ -0,0 +1,266 @@
+# app/utils/segments.py
+"""
+On-disk segment format for the vector store.
+
+A vector directory holds a small ``manifest.json`` plus one set of files per
+append-only segment:
+
+    seg-000001.npy           float32 (n, dim) L2-normalized embeddings (mmap'd on load)
+    seg-000001.jsonl         one {"id","text","meta"} JSON record per line
+    seg-000001.offsets.npy   uint64 (n + 1) byte offsets into the .jsonl sidecar
+
+Deleted rows are not rewritten: their global row numbers are listed in a
+``tombstones-NNNNNN.npy`` file (int64, sorted) named by the manifest.
+
+Side indexes (BM25, metadata partitions, ANN backends) keep one part file per
+segment, ``seg-000001.<kind>.npz``, holding their state for that segment's rows
+with segment-local row numbers. Parts are written once, like the segment, so
+persisting or picking up a new segment only reads and writes that segment's parts.
+
+Segments are immutable once written; the manifest is replaced atomically after
+the segment files are on disk, so a crash mid-ingest never exposes half a segment.
+
+Several processes may share one directory: writers serialize on
+``write.lock`` (DirectoryLock) and increment the number in ``generation``
+after every published change, which readers poll to pick the change up.
+"""
+import json
+import mmap
+import os
+import re
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: single-process use only
+    fcntl = None
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+GENERATION_NAME = "generation"
+LOCK_NAME = "write.lock"
+_SEGMENT_RE = re.compile(r"^(?:seg|tombstones)-(\d+)\.")
+
+
+def _atomic_write_bytes(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path: str, arr: np.ndarray):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def empty_manifest(embedding_model: str | None = None) -> Dict:
+    return {
+        "format_version": FORMAT_VERSION,
+        "embedding_model": embedding_model,
+        "dim": None,
+        "next_segment": 1,
+        "segments": [],
+        "tombstones": None,
+    }
+
+
+def read_manifest(vector_dir: str) -> Dict | None:
+    path = os.path.join(vector_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    version = manifest.get("format_version")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector index format version {version} (expected {FORMAT_VERSION})")
+    return manifest
+
+
+def write_manifest(vector_dir: str, manifest: Dict):
+    data = json.dumps(manifest, indent=2).encode("utf-8")
+    _atomic_write_bytes(os.path.join(vector_dir, MANIFEST_NAME), data)
+
+
+def read_generation(vector_dir: str) -> int:
+    """Number of changes published to vector_dir so far (0 if none)."""
+    try:
+        with open(os.path.join(vector_dir, GENERATION_NAME), "rb") as f:
+            return int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_generation(vector_dir: str) -> int:
+    """Publish a change to readers of vector_dir. Call with the DirectoryLock held."""
+    generation = read_generation(vector_dir) + 1
+    _atomic_write_bytes(os.path.join(vector_dir, GENERATION_NAME), str(generation).encode("ascii"))
+    return generation
+
+
+class DirectoryLock:
+    """
+    Exclusive lock on a vector directory across processes (flock on
+    ``write.lock``) and threads. Not re-entrant.
+    """
+
+    def __init__(self, vector_dir: str):
+        self.path = os.path.join(vector_dir, LOCK_NAME)
+        self._thread_lock = threading.Lock()
+        self._fd: int | None = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._close()
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        self._close()
+        self._thread_lock.release()
+
+    def _close(self):
+        if self._fd is not None:
+            # closing the descriptor drops the flock
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def segment_paths(vector_dir: str, name: str) -> Dict[str, str]:
+    base = os.path.join(vector_dir, name)
+    return {
+        "embs": f"{base}.npy",
+        "records": f"{base}.jsonl",
+        "offsets": f"{base}.offsets.npy",
+    }
+
+
+def write_segment(vector_dir: str, name: str, ids: List[str], texts: List[str], metas: List[Dict], embs: np.ndarray):
+    """Write one immutable segment. The caller is responsible for updating the manifest."""
+    paths = segment_paths(vector_dir, name)
+    lines = [
+        (json.dumps({"id": i, "text": t, "meta": m}, ensure_ascii=False) + "\n").encode("utf-8")
+        for i, t, m in zip(ids, texts, metas)
+    ]
+    offsets = np.zeros(len(lines) + 1, dtype=np.uint64)
+    np.cumsum([len(line) for line in lines], out=offsets[1:])
+
+    _atomic_save_npy(paths["embs"], np.ascontiguousarray(embs, dtype=np.float32))
+    _atomic_write_bytes(paths["records"], b"".join(lines))
+    _atomic_save_npy(paths["offsets"], offsets)
+
+
+def write_tombstones(vector_dir: str, name: str, rows: np.ndarray):
+    _atomic_save_npy(os.path.join(vector_dir, f"{name}.npy"), np.asarray(rows, dtype=np.int64))
+
+
+def read_tombstones(vector_dir: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(vector_dir, f"{name}.npy"))
+
+
+def delete_tombstones(vector_dir: str, name: str):
+    try:
+        os.remove(os.path.join(vector_dir, f"{name}.npy"))
+    except FileNotFoundError:
+        pass
+
+
+def sidecar_path(vector_dir: str, name: str, kind: str) -> str:
+    return os.path.join(vector_dir, f"{name}.{kind}.npz")
+
+
+def write_sidecar(vector_dir: str, name: str, kind: str, **arrays):
+    """Write segment `name`'s part of a side index. Rebuildable, so not fsync'd."""
+    path = sidecar_path(vector_dir, name, kind)
+    # per-process temp name: two workers may write the same (identical) part
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def read_sidecar(vector_dir: str, name: str, kind: str) -> Dict[str, np.ndarray] | None:
+    """Segment `name`'s part of a side index, or None if it was never written."""
+    path = sidecar_path(vector_dir, name, kind)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as state:
+        return {key: state[key] for key in state.files}
+
+
+def delete_legacy_sidecar(vector_dir: str, filename: str):
+    """Remove a whole-store side index file from before per-segment parts (e.g. bm25.npz)."""
+    try:
+        os.remove(os.path.join(vector_dir, filename))
+    except FileNotFoundError:
+        pass
+
+
+def next_free_segment(vector_dir: str) -> int:
+    """Smallest file number greater than any segment or tombstone file present in vector_dir."""
+    highest = 0
+    for fname in os.listdir(vector_dir):
+        m = _SEGMENT_RE.match(fname)
+        if m:
+            highest = max(highest, int(m.group(1)))
+    return highest + 1
+
+
+def delete_segment(vector_dir: str, name: str):
+    """Remove a segment's files and its side index parts."""
+    paths = list(segment_paths(vector_dir, name).values())
+    paths += [os.path.join(vector_dir, f) for f in os.listdir(vector_dir) if f.startswith(f"{name}.") and f.endswith(".npz")]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class Segment:
+    """
+    Read-only view over one on-disk segment. Embeddings and the record sidecar
+    are memory-mapped; records are decoded only when a row is actually returned.
+    """
+
+    def __init__(self, vector_dir: str, name: str):
+        self.name = name
+        paths = segment_paths(vector_dir, name)
+        self.embs = np.load(paths["embs"], mmap_mode="r")
+        self.offsets = np.load(paths["offsets"])
+        self.count = int(self.embs.shape[0])
+        self._records_file = open(paths["records"], "rb")
+        self._records = mmap.mmap(self._records_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def record(self, i: int) -> Dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._records[start:end])
+
+    def records(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def close(self):
+        self._records.close()
+        self._records_file.close()
@@ -0,0 +1,62 @@
+# app/utils/tokens.py
+"""
+Local token counting. Uses tiktoken's BPE tables when the package is
+installed and its encoding can be loaded; otherwise falls back to the
+~4 characters per token approximation.
+"""
+import logging
+import threading
+
+from utils.config import settings
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.setLevel(logging.INFO)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+_CHARS_PER_TOKEN = 4
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+                except Exception as e:
+                    LOGGER.info("tiktoken unavailable (%s); approximating token counts.", e)
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` that fits in `max_tokens` (ellipsis included), cut back to a word boundary."""
+    if max_tokens <= 1:
+        return ""
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        if len(ids) <= max_tokens:
+            return text
+        cut = enc.decode(ids[: max_tokens - 1])
+    else:
+        if len(text) < max_tokens * _CHARS_PER_TOKEN:
+            return text
+        cut = text[: (max_tokens - 1) * _CHARS_PER_TOKEN]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
@@ -1,26 +1,40 @@
 # app/utils/vector_store.py
 import os
+import asyncio
+import bisect
 import pickle
-from typing import List, Dict
+import random
+from contextlib import contextmanager
+from typing import AsyncIterable, Callable, List, Dict, Sequence, Tuple
 from utils.config import settings
+from utils import segments
+from utils.ann import blocked_top_k, make_index, top_k
+from utils.lexical import BM25Index, reciprocal_rank_fusion
+from utils.partitions import MetadataIndex, normalize_filters
+from utils.embedding_cache import EmbeddingCache, content_hash, normalize_text
+from utils.batcher import MicroBatcher
+from utils.local_embeddings import get_local_embedder
+from utils.metrics import CHAT_STAGE_SECONDS, EMBEDDING_FALLBACKS, INGEST_STAGE_SECONDS, PROVIDER_ERRORS
+from utils.cache import TTLCache, normalize_query
+from utils.aio import get_http_client, run_blocking, upstream_limit
+import threading
+import time
+from utils.segments import Segment
 import numpy as np
-import requests
-import math
+import httpx
 import logging
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
 
-# Lazy import of sentence-transformers / openai to avoid heavy imports if not needed
-_sentence_transformer = None
-_openai = None
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+# hybrid search fuses the top max(k * factor, min depth) rows of each ranking
+_FUSION_DEPTH_FACTOR = 4
+_FUSION_MIN_DEPTH = 20
 
-def _ensure_sentence_transformer(model_name: str):
-    global _sentence_transformer
-    if _sentence_transformer is None:
-        from sentence_transformers import SentenceTransformer
-        _sentence_transformer = SentenceTransformer(model_name)
-    return _sentence_transformer
+# Lazy import of openai to avoid heavy imports if not needed
+# (the local embedding model is loaded by utils/local_embeddings.py on first use)
+_openai = None
 
 def _ensure_openai():
     global _openai
@@ -32,34 +46,578 @@ def _ensure_openai():
             _openai = None
     return _openai
 
+def _normalize_rows(embs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embs, axis=1, keepdims=True) + 1e-12
+    return embs / norms
+
+async def _single_batch(docs: List[Dict]):
+    yield docs
+
+class EmbeddingHTTPError(RuntimeError):
+    """Non-200 response from an embeddings endpoint."""
+
+    TRANSIENT = (408, 409, 425, 429, 500, 502, 503, 504)
+
+    def __init__(self, status: int, body: str = "", retry_after: str | None = None):
+        super().__init__(f"Embeddings endpoint returned {status}: {body}")
+        self.status = status
+        self.transient = status in self.TRANSIENT
+        try:
+            self.retry_after = min(float(retry_after), settings.EMBEDDING_BACKOFF_MAX) if retry_after else None
+        except ValueError:
+            self.retry_after = None
+
+def _version_key(meta: Dict) -> tuple:
+    # one document version per file name and event
+    return (meta.get("source"), meta.get("event_id"))
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(settings.EMBEDDING_BACKOFF_MAX, settings.EMBEDDING_BACKOFF_BASE * (2 ** attempt)))
+
+def _approx_tokens(text: str) -> int:
+    # ~4 characters per token, same heuristic as the loader's splitter
+    return len(text) // 4 + 1
+
+def _use_gradient_embeddings() -> bool:
+    return (
+        getattr(settings, "USE_GRADIENT_EMBEDDINGS", False)
+        or os.getenv("USE_GRADIENT_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+    )
+
 class VectorStore:
     def __init__(self, vector_dir: str):
         self.vector_dir = vector_dir
         os.makedirs(self.vector_dir, exist_ok=True)
-        self.index_path = os.path.join(self.vector_dir, "vs_index.pkl")
+        # pre-segment pickle index; only read once to migrate it to the segment format
+        self.legacy_index_path = os.path.join(self.vector_dir, "vs_index.pkl")
         # default (sentence-transformers) model name kept for fallback
         self.emb_model_name = getattr(settings, "EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
-        # batch size for embeddings requests
+        # batch size for embeddings requests; _batch_limit adapts below it on 413/429
         self.batch_size = getattr(settings, "EMBEDDING_BATCH_SIZE", 32)
-        # internal doc store: list of {"id","text","meta","emb"}
-        self._docs: List[Dict] = []
-        if os.path.exists(self.index_path):
+        self._batch_limit = self.batch_size
+        # persisted rows: immutable, memory-mapped segments (see utils/segments.py)
+        self._segments: List[Segment] = []
+        self._seg_starts: List[int] = []
+        self._base_size = 0
+        # rows appended by this process and not yet persisted: ids/text/meta kept in parallel
+        # lists, embeddings in one contiguous, L2-normalized float32 matrix whose capacity
+        # grows by doubling. persist() turns them into a segment and empties the tail.
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metas: List[Dict] = []
+        self._embs = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        # deleted rows stay in their segments; this mask (indexed by global row, only as
+        # long as the highest deleted row) hides them from search. Persisted as tombstones.
+        self._deleted = np.zeros(0, dtype=bool)
+        self._deleted_count = 0
+        self._tombstones_dirty = False
+        # (source, event_id) -> {content hash: [rows]} over live rows; built on the
+        # first replace_source() and kept current after that
+        self._sources: Dict[tuple, Dict[str, List[int]]] | None = None
+        # _lock guards in-memory rows and the index (held by searches and appends);
+        # _persist_lock serializes segment writes, clears and refreshes
+        self._lock = threading.RLock()
+        self._persist_lock = threading.RLock()
+        # several processes (workers) may share vector_dir: writers also hold the directory
+        # lock (see _write_lock) and refresh() picks up what other processes published
+        self._dir_lock = segments.DirectoryLock(self.vector_dir)
+        self._write_depth = 0
+        self._disk_generation = segments.read_generation(self.vector_dir)
+        self._manifest = segments.empty_manifest(self._embedding_model_id())
+        # content-addressed embedding cache shared by ingest and query paths
+        self.emb_cache: EmbeddingCache | None = None
+        if getattr(settings, "EMBEDDING_CACHE_ENABLED", True):
+            self.emb_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH or os.path.join(settings.DATA_DIR, "embedding_cache.sqlite3"),
+                memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                max_disk_mb=settings.EMBEDDING_CACHE_MAX_MB,
+                touch_flush_seconds=settings.EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS,
+            )
+        self._ingest_batch_slots: asyncio.Semaphore | None = None
+        # concurrent query embeddings are coalesced and sent to the provider together
+        self.query_batcher = MicroBatcher(
+            self._embed_query_misses,
+            max_batch=settings.QUERY_BATCH_MAX_SIZE,
+            max_wait=settings.QUERY_BATCH_MAX_WAIT_MS / 1000,
+        )
+        # corpus generation counter and the query -> top-k row ids cache built on it
+        self.generation = 0
+        self.results_cache = TTLCache(settings.RETRIEVAL_CACHE_SIZE, settings.RETRIEVAL_CACHE_TTL)
+        # nearest-neighbour backend (exact scan or IVF), see utils/ann.py
+        self.index = make_index(self)
+        # BM25 inverted index over the same rows, for exact-token matches
+        self.lexical = BM25Index(self)
+        # (meta key, value) -> rows, so filtered searches only score matching rows
+        self.partitions = MetadataIndex(self)
+        try:
+            self._load()
+        except Exception as e:
+            LOGGER.warning("Could not load existing vector index: %s", e)
+            self._reset()
+            self._manifest = segments.empty_manifest(self._embedding_model_id())
+            # never overwrite segment files left behind by the unreadable index
+            self._manifest["next_segment"] = segments.next_free_segment(self.vector_dir)
+            # retry from whatever is published next time refresh() runs
+            self._disk_generation = -1
+        self.index.load()
+        self.index.sync()
+        self.lexical.load()
+        self.lexical.sync()
+        self.partitions.load()
+        self.partitions.sync()
+
+    def __len__(self) -> int:
+        return self._base_size + self._size
+
+    def _embedding_model_id(self) -> str:
+        if _use_gradient_embeddings():
+            return getattr(settings, "GRADIENT_EMBEDDING_MODEL", None) or os.getenv("GRADIENT_EMBEDDING_MODEL") or self.emb_model_name
+        # names the ONNX variant too: its vectors differ from the torch model's
+        return get_local_embedder(self.emb_model_name).model_id
+
+    def _load(self):
+        manifest = segments.read_manifest(self.vector_dir)
+        if manifest is None:
+            if os.path.exists(self.legacy_index_path):
+                with self._write_lock():
+                    # another worker may have migrated it while we waited for the lock
+                    if os.path.exists(self.legacy_index_path) and not len(self):
+                        self._migrate_legacy_index()
+            return
+        configured = self._embedding_model_id()
+        if manifest.get("embedding_model") and manifest["embedding_model"] != configured:
+            LOGGER.warning(
+                "Vector index was built with embedding model %s but %s is configured; similarity scores may be meaningless.",
+                manifest["embedding_model"],
+                configured,
+            )
+        self._manifest = manifest
+        for seg in manifest["segments"]:
+            self._attach_segment(Segment(self.vector_dir, seg["name"]))
+        if manifest.get("tombstones"):
+            self._mark_deleted(segments.read_tombstones(self.vector_dir, manifest["tombstones"]))
+            self._tombstones_dirty = False
+        LOGGER.info("Mapped %d vector segments (%d rows).", len(self._segments), self._base_size)
+
+    def _attach_segment(self, seg: Segment):
+        self._segments.append(seg)
+        self._seg_starts.append(self._base_size)
+        self._base_size += seg.count
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Exclusive write access to vector_dir, across threads and processes. The
+        outermost acquisition first catches up with changes published by other
+        processes, so appended rows get the same global row numbers everywhere.
+        """
+        with self._persist_lock:
+            outermost = self._write_depth == 0
+            if outermost:
+                self._dir_lock.acquire()
+            self._write_depth += 1
             try:
-                with open(self.index_path, "rb") as f:
-                    self._docs = pickle.load(f)
-            except Exception as e:
-                LOGGER.warning("Could not load existing vector index: %s", e)
-                self._docs = []
+                if outermost:
+                    self._catch_up()
+                yield
+            finally:
+                self._write_depth -= 1
+                if outermost:
+                    self._dir_lock.release()
+
+    def refresh(self) -> bool:
+        """
+        Pick up segments and tombstones other processes published to vector_dir.
+        One small file read when nothing changed. Returns True if the corpus changed.
+        """
+        if segments.read_generation(self.vector_dir) == self._disk_generation:
+            return False
+        # the directory lock keeps a writer from replacing files while we read them
+        with self._persist_lock, self._dir_lock:
+            return self._catch_up()
+
+    def _catch_up(self) -> bool:
+        generation = segments.read_generation(self.vector_dir)
+        if generation == self._disk_generation:
+            return False
+        manifest = segments.read_manifest(self.vector_dir) or segments.empty_manifest(self._embedding_model_id())
+        ours = [seg["name"] for seg in self._manifest["segments"]]
+        theirs = [seg["name"] for seg in manifest["segments"]]
+        try:
+            if theirs[: len(ours)] == ours and not self._size:
+                self._apply_appended(manifest, theirs[len(ours) :])
+            else:
+                # cleared (or our unpublished tail is stale): start over from the manifest
+                self._reload(manifest)
+        except FileNotFoundError as e:
+            # a later change removed files this manifest names; the next refresh sees that one
+            LOGGER.info("Vector index changed while refreshing (%s); will retry.", e)
+            return False
+        self._disk_generation = generation
+        LOGGER.info("Vector index refreshed to generation %d (%d rows, %d live).", generation, len(self), self.live_count)
+        return True
+
+    def _read_tombstones(self, manifest: Dict) -> np.ndarray:
+        name = manifest.get("tombstones")
+        return segments.read_tombstones(self.vector_dir, name) if name else np.zeros(0, dtype=np.int64)
+
+    def _apply_appended(self, manifest: Dict, names: List[str]):
+        # open every file before touching state, so a failed read changes nothing
+        new_segments = [Segment(self.vector_dir, name) for name in names]
+        tombstones_changed = manifest.get("tombstones") != self._manifest.get("tombstones")
+        deleted = self._read_tombstones(manifest) if tombstones_changed else None
+        with self._lock:
+            first_row = len(self)
+            for seg in new_segments:
+                self._attach_segment(seg)
+            if deleted is not None:
+                before = np.flatnonzero(self._deleted)
+                self._deleted = np.zeros(0, dtype=bool)
+                self._deleted_count = 0
+                self._mark_deleted(deleted)
+                self._tombstones_dirty = False
+            self._manifest = manifest
+            self.index.sync()
+            self.lexical.sync()
+            self.partitions.sync()
+            self._bump_generation()
+            if self._sources is not None:
+                rows = [self._row(i) for i in range(first_row, len(self))]
+                self._index_sources(first_row, [r.get("meta") or {} for r in rows], [r["text"] for r in rows])
+                if deleted is not None:
+                    self._unindex_sources(np.setdiff1d(deleted, before))
+
+    def _reload(self, manifest: Dict):
+        fresh = [Segment(self.vector_dir, seg["name"]) for seg in manifest["segments"]]
+        deleted = self._read_tombstones(manifest)
+        with self._lock:
+            self._reset()
+            self._manifest = manifest
+            for seg in fresh:
+                self._attach_segment(seg)
+            self._mark_deleted(deleted)
+            self._tombstones_dirty = False
+            # the segments' saved parts are loaded, anything missing is rebuilt
+            self.index = make_index(self)
+            self.lexical = BM25Index(self)
+            self.partitions = MetadataIndex(self)
+            for side in (self.index, self.lexical, self.partitions):
+                side.load()
+                side.sync()
+            self._bump_generation()
+
+    def _migrate_legacy_index(self):
+        # one-time conversion of the old pickle index; nothing is unpickled after this
+        with open(self.legacy_index_path, "rb") as f:
+            state = pickle.load(f)
+        if isinstance(state, list):
+            # list of {"id","text","meta","emb"} dicts
+            if state:
+                self._append_rows(
+                    [d["id"] for d in state],
+                    [d["text"] for d in state],
+                    [d.get("meta", {}) for d in state],
+                    np.vstack([d["emb"] for d in state]),
+                )
+        elif len(state["ids"]):
+            self._append_rows(state["ids"], state["texts"], state["metas"], state["embs"])
+        self.persist()
+        os.replace(self.legacy_index_path, f"{self.legacy_index_path}.migrated")
+        LOGGER.info("Migrated legacy pickle index to segment format (%d rows).", len(self))
+
+    def _reset(self):
+        for seg in self._segments:
+            seg.close()
+        self._segments, self._seg_starts, self._base_size = [], [], 0
+        self._ids, self._texts, self._metas = [], [], []
+        self._embs = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._deleted = np.zeros(0, dtype=bool)
+        self._deleted_count = 0
+        self._tombstones_dirty = False
+        self._sources = None
+
+    def _clear(self):
+        """Drop every row, in memory and on disk."""
+        with self._write_lock():
+            names = [seg["name"] for seg in self._manifest["segments"]]
+            tombstones = self._manifest.get("tombstones")
+            next_segment = self._manifest["next_segment"]
+            with self._lock:
+                self._reset()
+                self._sources = {}
+                self.index.reset()
+                self.lexical.reset()
+                self.partitions.reset()
+                self._bump_generation()
+            self._manifest = segments.empty_manifest(self._embedding_model_id())
+            # segment names are never reused, so readers can't confuse old and new files
+            self._manifest["next_segment"] = next_segment
+            segments.write_manifest(self.vector_dir, self._manifest)
+            for name in names:
+                segments.delete_segment(self.vector_dir, name)
+            if tombstones:
+                segments.delete_tombstones(self.vector_dir, tombstones)
+            self._disk_generation = segments.bump_generation(self.vector_dir)
+
+    def _bump_generation(self):
+        # every corpus change gets a new generation; caches keyed on it go stale
+        self.generation += 1
+        self.results_cache.clear()
+
+    def _dim(self) -> int | None:
+        if self._size:
+            return self._embs.shape[1]
+        return self._manifest.get("dim")
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        store_dim = self._dim()
+        if store_dim not in (None, 0, dim):
+            raise ValueError(f"Embedding dimension mismatch: store has {store_dim}, got {dim}")
+        capacity = self._embs.shape[0]
+        if needed <= capacity and self._embs.shape[1] == dim:
+            return
+        new_capacity = max(needed, 2 * capacity, 64)
+        grown = np.zeros((new_capacity, dim), dtype=np.float32)
+        if self._size:
+            grown[: self._size] = self._embs[: self._size]
+        self._embs = grown
+
+    def _append_rows(self, ids: List[str], texts: List[str], metas: List[Dict], embs):
+        embs = _normalize_rows(np.asarray(embs, dtype=np.float32))
+        n = embs.shape[0]
+        self._ensure_capacity(self._size + n, embs.shape[1])
+        self._embs[self._size : self._size + n] = embs
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metas.extend(metas)
+        self._size += n
+
+    def _row(self, i: int) -> Dict:
+        """Return {"id","text","meta"} for global row i."""
+        if i >= self._base_size:
+            j = i - self._base_size
+            return {"id": self._ids[j], "text": self._texts[j], "meta": self._metas[j]}
+        s = bisect.bisect_right(self._seg_starts, i) - 1
+        return self._segments[s].record(i - self._seg_starts[s])
+
+    def _blocks(self):
+        """Yield the embedding matrices covering all rows, in global row order."""
+        for seg in self._segments:
+            yield seg.embs
+        if self._size:
+            yield self._embs[: self._size]
+
+    def _row_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Gather the embeddings of the given (sorted) global rows."""
+        out = []
+        start = 0
+        for block in self._blocks():
+            end = start + block.shape[0]
+            lo, hi = np.searchsorted(rows, [start, end])
+            if lo < hi:
+                out.append(np.asarray(block[rows[lo:hi] - start], dtype=np.float32))
+            start = end
+        return np.vstack(out)
+
+    def _scores(self, q_emb: np.ndarray) -> np.ndarray:
+        # rows are pre-normalized, so cosine similarity is one matmul per block
+        sims = np.concatenate([block @ q_emb for block in self._blocks()])
+        if self._deleted_count:
+            sims[: self._deleted.shape[0]][self._deleted] = -np.inf
+        return sims
+
+    def memory_stats(self) -> Dict:
+        """
+        Embedding bytes: mmap'd float32 segments (paged in on access), the in-memory
+        tail and the ANN index. A lock-free snapshot: nothing here is computed.
+        """
+        dim = self._dim() or 0
+        return {
+            "rows": len(self),
+            "dim": dim,
+            "segment_bytes": self._base_size * dim * 4,
+            "tail_bytes": int(self._embs.nbytes),
+            "index": self.index.stats(),
+        }
+
+    def measure_index_recall(self) -> Dict | None:
+        """Re-estimate the quantized index's recall now (None for other backends); memory_stats() reports it."""
+        index = self.index
+        if not hasattr(index, "update_recall"):
+            return None
+        # persist and refresh change the rows the estimate reads; searches keep running
+        with self._persist_lock:
+            return self.index.update_recall(force=True)
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - self._deleted_count
+
+    def _mark_deleted(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if not rows.size:
+            return
+        needed = int(rows.max()) + 1
+        if needed > self._deleted.shape[0]:
+            grown = np.zeros(max(needed, 2 * self._deleted.shape[0]), dtype=bool)
+            grown[: self._deleted.shape[0]] = self._deleted
+            self._deleted = grown
+        self._deleted[rows] = True
+        self._deleted_count = int(self._deleted.sum())
+        self._tombstones_dirty = True
+
+    def deleted_mask(self, rows: np.ndarray) -> np.ndarray:
+        """Boolean mask of which of the given global rows are tombstoned."""
+        out = np.zeros(rows.shape[0], dtype=bool)
+        if self._deleted_count:
+            inside = rows < self._deleted.shape[0]
+            out[inside] = self._deleted[rows[inside]]
+        return out
+
+    def _source_index(self) -> Dict[tuple, Dict[str, List[int]]]:
+        """(source, event_id) -> {content hash: [rows]} for live rows. Call with _persist_lock held."""
+        if self._sources is None:
+            sources: Dict[tuple, Dict[str, List[int]]] = {}
+            live = np.flatnonzero(~self.deleted_mask(np.arange(len(self))))
+            for i in live:
+                row = self._row(int(i))
+                meta = row.get("meta") or {}
+                h = meta.get("hash") or content_hash(row["text"])
+                sources.setdefault(_version_key(meta), {}).setdefault(h, []).append(int(i))
+            self._sources = sources
+            LOGGER.info("Indexed %d live rows across %d sources.", len(live), len(sources))
+        return self._sources
+
+    def _index_sources(self, first_row: int, metas: List[Dict], texts: List[str]):
+        if self._sources is None:
+            return
+        for i, (meta, text) in enumerate(zip(metas, texts)):
+            h = meta.get("hash") or content_hash(text)
+            self._sources.setdefault(_version_key(meta), {}).setdefault(h, []).append(first_row + i)
+
+    def _unindex_sources(self, rows):
+        """Forget newly deleted rows (tombstoned by another process)."""
+        for i in rows:
+            i = int(i)
+            row = self._row(i)
+            meta = row.get("meta") or {}
+            hashes = self._sources.get(_version_key(meta), {})
+            h = meta.get("hash") or content_hash(row["text"])
+            if i in hashes.get(h, ()):
+                hashes[h].remove(i)
+                if not hashes[h]:
+                    del hashes[h]
 
     def persist(self):
-        with open(self.index_path, "wb") as f:
-            pickle.dump(self._docs, f)
+        """
+        Write the tail as a new segment and any changed tombstones, publish both in a
+        single manifest update, then bump the generation file so other processes
+        sharing vector_dir pick the change up.
+        """
+        with self._write_lock():
+            with self._lock:
+                n = self._size
+                tombstones = np.flatnonzero(self._deleted) if self._tombstones_dirty else None
+            if not n and tombstones is None:
+                return
+            written = None
+            if n:
+                written = f"seg-{self._manifest['next_segment']:06d}"
+                segments.write_segment(self.vector_dir, written, self._ids[:n], self._texts[:n], self._metas[:n], self._embs[:n])
+                self._manifest["next_segment"] += 1
+                self._manifest["dim"] = int(self._embs.shape[1])
+                self._manifest["embedding_model"] = self._manifest.get("embedding_model") or self._embedding_model_id()
+                self._manifest["segments"].append({"name": written, "count": n})
+            old_tombstones = None
+            if tombstones is not None:
+                old_tombstones = self._manifest.get("tombstones")
+                name = None
+                if tombstones.size:
+                    name = f"tombstones-{self._manifest['next_segment']:06d}"
+                    segments.write_tombstones(self.vector_dir, name, tombstones)
+                    self._manifest["next_segment"] += 1
+                self._manifest["tombstones"] = name
+            segments.write_manifest(self.vector_dir, self._manifest)
+            if written:
+                # serve the written rows from the mapped segment (shared with other workers
+                # through the page cache) instead of the private tail; row numbers are unchanged
+                seg = Segment(self.vector_dir, written)
+                with self._lock:
+                    self._attach_segment(seg)
+                    self._ids, self._texts, self._metas = self._ids[n:], self._texts[n:], self._metas[n:]
+                    # keep only the rows appended meanwhile, not the spare capacity
+                    self._embs = self._embs[n : self._size].copy()
+                    self._size -= n
+            if tombstones is not None:
+                self._tombstones_dirty = False
+            if old_tombstones:
+                segments.delete_tombstones(self.vector_dir, old_tombstones)
+            # only writers change the side indexes and we hold the write lock, so searches
+            # keep running while the new segment's parts are written
+            for side in (self.index, self.lexical, self.partitions):
+                side.save()
+            self._disk_generation = segments.bump_generation(self.vector_dir)
 
-    def _call_gradient_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def compact(self, force: bool = False) -> Dict | None:
+        """
+        Rewrite the segments that hold tombstoned rows without those rows, once more
+        than VECTOR_COMPACT_RATIO of all rows are tombstoned (or always with `force`).
+        Segments without tombstones are kept as they are, with their parts. Row
+        numbers change, so this process reloads and other processes pick the new
+        manifest up as a reload on their next refresh. Returns what was compacted,
+        or None if nothing was.
+        """
+        ratio = settings.VECTOR_COMPACT_RATIO
+        if not force and (ratio <= 0 or self._deleted_count <= ratio * len(self)):
+            return None
+        with self._write_lock():
+            self.persist()
+            if not self._deleted_count or (not force and self._deleted_count <= ratio * len(self)):
+                return None
+            removed = self._deleted_count
+            manifest = {**self._manifest, "segments": [], "tombstones": None}
+            rewritten = []
+            for seg, first in zip(self._segments, self._seg_starts):
+                dead = self.deleted_mask(np.arange(first, first + seg.count))
+                if not dead.any():
+                    manifest["segments"].append({"name": seg.name, "count": seg.count})
+                    continue
+                rewritten.append(seg.name)
+                live = np.flatnonzero(~dead)
+                if not live.size:
+                    continue
+                name = f"seg-{manifest['next_segment']:06d}"
+                manifest["next_segment"] += 1
+                records = [seg.record(int(i)) for i in live]
+                segments.write_segment(
+                    self.vector_dir, name,
+                    [r["id"] for r in records], [r["text"] for r in records], [r.get("meta") or {} for r in records],
+                    seg.embs[live],
+                )
+                manifest["segments"].append({"name": name, "count": int(live.size)})
+            segments.write_manifest(self.vector_dir, manifest)
+            old_tombstones = self._manifest.get("tombstones")
+            # kept segments load their parts, the rewritten ones are indexed afresh
+            self._reload(manifest)
+            for side in (self.index, self.lexical, self.partitions):
+                side.save()
+            for name in rewritten:
+                segments.delete_segment(self.vector_dir, name)
+            if old_tombstones:
+                segments.delete_tombstones(self.vector_dir, old_tombstones)
+            self._disk_generation = segments.bump_generation(self.vector_dir)
+        LOGGER.info("Compacted %d segments: dropped %d tombstoned rows (%d rows left).", len(rewritten), removed, len(self))
+        return {"segments": len(rewritten), "removed": removed, "rows": len(self)}
+
+    async def _call_gradient_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Call Gradient's OpenAI-compatible embeddings endpoint:
         POST {GRADIENT_API_BASE}/v1/embeddings
         payload: {"model": <model>, "input": texts}
+        Non-200 responses raise EmbeddingHTTPError so callers can retry or split.
         """
         api_key = getattr(settings, "GRADIENT_API_KEY", None) or os.getenv("GRADIENT_API_KEY")
         base = getattr(settings, "GRADIENT_API_BASE", None) or os.getenv("GRADIENT_API_BASE", "https://inference.do-ai.run")
@@ -71,32 +629,79 @@ class VectorStore:
         headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
 
         # Use only DigitalOcean Gradient AI endpoint
-        base_candidates = [
-            base.rstrip("/"),
-        ]
+        url = f"{base.rstrip('/')}/v1/embeddings"
         payload = {"model": model, "input": texts}
 
-        last_error = None
-        for b in base_candidates:
-            url = f"{b}/v1/embeddings"
+        async with upstream_limit("gradient-embeddings"):
+            resp = await get_http_client().post(url, headers=headers, json=payload)
+        if resp.status_code != 200:
+            PROVIDER_ERRORS.inc(upstream="gradient-embeddings", status=str(resp.status_code))
+            LOGGER.warning(
+                "Gradient embeddings non-200 (%d) at %s: %s",
+                resp.status_code,
+                url,
+                resp.text[:500],
+            )
+            raise EmbeddingHTTPError(resp.status_code, resp.text[:500], resp.headers.get("Retry-After"))
+        data = resp.json()
+        embeddings = [item["embedding"] for item in data.get("data", [])]
+        return embeddings
+
+    async def _gradient_embeddings_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """
+        _call_gradient_embeddings with exponential backoff (full jitter) on transient
+        failures. A 413 splits the batch in half; 413/429 also shrink the adaptive
+        batch size used for planning later batches.
+        """
+        attempt = 0
+        while True:
             try:
-                resp = requests.post(url, headers=headers, json=payload, timeout=30)
-                if resp.status_code != 200:
-                    LOGGER.warning(
-                        "Gradient embeddings non-200 (%d) at %s: %s",
-                        resp.status_code,
-                        url,
-                        resp.text[:500],
-                    )
-                    resp.raise_for_status()
-                data = resp.json()
-                embeddings = [item["embedding"] for item in data.get("data", [])]
-                return embeddings
-            except Exception as e:
-                last_error = e
-                LOGGER.warning("Gradient embeddings endpoint failed (%s): %s", url, e)
-                continue
-        raise RuntimeError(f"All Gradient embeddings endpoints failed: {last_error}")
+                embs = await self._call_gradient_embeddings(texts)
+                self._grow_batch_limit()
+                return embs
+            except EmbeddingHTTPError as e:
+                if e.status == 413 and len(texts) > 1:
+                    self._shrink_batch_limit(len(texts) // 2)
+                    mid = len(texts) // 2
+                    head = await self._gradient_embeddings_with_retry(texts[:mid])
+                    return head + await self._gradient_embeddings_with_retry(texts[mid:])
+                if e.status == 429:
+                    self._shrink_batch_limit(self._batch_limit * 3 // 4)
+                if not e.transient or attempt >= settings.EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else _backoff_delay(attempt)
+            except httpx.TransportError as e:
+                # timeouts, refused/reset connections
+                PROVIDER_ERRORS.inc(upstream="gradient-embeddings", status="transport")
+                if attempt >= settings.EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = _backoff_delay(attempt)
+                LOGGER.warning("Gradient embeddings transport error: %s", e)
+            attempt += 1
+            LOGGER.info("Retrying Gradient embeddings batch (size=%d) in %.2fs (attempt %d).", len(texts), delay, attempt)
+            await asyncio.sleep(delay)
+
+    def _shrink_batch_limit(self, limit: int):
+        self._batch_limit = max(1, min(self._batch_limit, limit))
+        LOGGER.info("Embedding batch size reduced to %d.", self._batch_limit)
+
+    def _grow_batch_limit(self):
+        # additive increase back towards the configured batch size
+        if self._batch_limit < self.batch_size:
+            self._batch_limit += 1
+
+    def _plan_batches(self, texts: List[str]) -> List[tuple]:
+        """Split texts into [lo, hi) batches bounded by the adaptive size and a token budget."""
+        batches, lo, tokens = [], 0, 0
+        for i, text in enumerate(texts):
+            t = _approx_tokens(text)
+            if i > lo and (i - lo >= self._batch_limit or tokens + t > settings.EMBEDDING_MAX_BATCH_TOKENS):
+                batches.append((lo, i))
+                lo, tokens = i, 0
+            tokens += t
+        if lo < len(texts):
+            batches.append((lo, len(texts)))
+        return batches
 
     def _call_openai_embeddings(self, texts: List[str]) -> List[List[float]]:
         openai = _ensure_openai()
@@ -110,85 +715,524 @@ class VectorStore:
         embeddings = [d["embedding"] for d in resp["data"]]
         return embeddings
 
-    def _call_sentence_transformers(self, texts: List[str]) -> List[List[float]]:
-        model = _ensure_sentence_transformer(self.emb_model_name)
-        embs = model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-        return [e.tolist() for e in embs]
+    def preload_local_model(self):
+        """Load the local embedding fallback now instead of inside the first request that needs it."""
+        get_local_embedder(self.emb_model_name).embed_sync(["warm-up"])
+
+    async def _embed_texts(self, texts: List[str], progress: Callable | None = None, slots: asyncio.Semaphore | None = None) -> np.ndarray:
+        """
+        Embed texts as an (n, dim) float32 array. Texts already in the embedding
+        cache are served from it; only the misses are sent to a provider.
+        progress("embedding", done, total) is reported per batch; `slots` bounds
+        how many provider batches may be in flight across callers.
+        """
+        if not texts:
+            return np.zeros((0, self._dim() or 0), dtype=np.float32)
+        if self.emb_cache is None:
+            return await self._embed_uncached(texts, progress=progress, slots=slots)
+
+        model_id = self._embedding_model_id()
+        # the memory tier answers inline; only its misses go to SQLite, off the event loop
+        vecs = self.emb_cache.get_many(model_id, texts, memory_only=True)
+        unseen = [i for i, v in enumerate(vecs) if v is None]
+        if unseen:
+            found = await run_blocking(self.emb_cache.get_many, model_id, [texts[i] for i in unseen])
+            for i, v in zip(unseen, found):
+                vecs[i] = v
+        # embed each distinct missing text once
+        missing: Dict[str, List[int]] = {}
+        for i, v in enumerate(vecs):
+            if v is None:
+                missing.setdefault(texts[i], []).append(i)
+        if missing:
+            hits = len(texts) - sum(len(idxs) for idxs in missing.values())
+            batch_progress = None
+            if progress:
+                # cache hits count as embedded; report provider batches on top of them
+                batch_progress = lambda stage, done, total: progress(stage, hits + done, len(texts))
+                batch_progress("embedding", 0, len(missing))
+            fresh = await self._embed_uncached(list(missing), progress=batch_progress, slots=slots)
+            for idxs, emb in zip(missing.values(), fresh):
+                for i in idxs:
+                    vecs[i] = emb
+        elif progress:
+            progress("embedding", len(texts), len(texts))
+        return np.vstack(vecs)
 
-    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+    async def _embed_uncached(self, texts: List[str], progress: Callable | None = None, slots: asyncio.Semaphore | None = None) -> np.ndarray:
         """
-        Embed texts using local sentence-transformers since DigitalOcean Gradient AI 
-        doesn't support embeddings endpoints.
+        Embed texts with Gradient, falling back to the local model (utils/local_embeddings.py)
+        per batch, as an (n, dim) float32 array.
+        Up to EMBEDDING_MAX_IN_FLIGHT batches are sent concurrently.
         """
-        all_embs: List[List[float]] = []
+        plan = self._plan_batches(texts)
+        parts: List[np.ndarray | None] = [None] * len(plan)
         
         # Try Gradient embeddings first (but it will likely fail with DigitalOcean)
-        use_gradient_flag = (
-            getattr(settings, "USE_GRADIENT_EMBEDDINGS", False)
-            or os.getenv("USE_GRADIENT_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
-        )
-        
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i : i + self.batch_size]
-            
-            if use_gradient_flag:
-                try:
-                    emb_batch = self._call_gradient_embeddings(batch)
-                    LOGGER.info("Embedded batch using Gradient (size=%d).", len(batch))
-                    all_embs.extend(emb_batch)
-                    continue
-                except Exception as e:
-                    LOGGER.error("Gradient embeddings failed: %s", e)
-                    LOGGER.info("Falling back to sentence-transformers for this batch")
-            
-            # Use sentence-transformers as fallback (or primary if Gradient disabled)
+        use_gradient_flag = _use_gradient_embeddings()
+        gradient_model = getattr(settings, "GRADIENT_EMBEDDING_MODEL", None) or os.getenv("GRADIENT_EMBEDDING_MODEL")
+        in_flight = asyncio.Semaphore(settings.EMBEDDING_MAX_IN_FLIGHT)
+        done = 0
+
+        async def run(j: int, lo: int, hi: int):
+            nonlocal done
+            async with in_flight:
+                if slots is not None:
+                    async with slots:
+                        embs = await self._embed_batch(texts[lo:hi], use_gradient_flag, gradient_model)
+                else:
+                    embs = await self._embed_batch(texts[lo:hi], use_gradient_flag, gradient_model)
+            parts[j] = embs
+            done += hi - lo
+            if progress:
+                progress("embedding", done, len(texts))
+
+        tasks = [asyncio.ensure_future(run(j, lo, hi)) for j, (lo, hi) in enumerate(plan)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # one batch failed (or we were cancelled): don't leave the others running
+            for task in tasks:
+                task.cancel()
+            raise
+                
+        return np.vstack(parts)
+
+    async def _embed_batch(self, batch: List[str], use_gradient_flag: bool, gradient_model: str | None) -> np.ndarray:
+        if use_gradient_flag:
             try:
-                emb_batch = self._call_sentence_transformers(batch)
-                LOGGER.info("Embedded batch using sentence-transformers (size=%d).", len(batch))
-                all_embs.extend(emb_batch)
+                emb_batch = np.asarray(await self._gradient_embeddings_with_retry(batch), dtype=np.float32)
+                LOGGER.debug("Embedded batch using Gradient (size=%d).", len(batch))
+                await self._cache_batch(gradient_model, batch, emb_batch)
+                return emb_batch
             except Exception as e:
-                LOGGER.error("Sentence-transformers embeddings failed: %s", e)
-                raise RuntimeError(f"All embedding methods failed: {e}")
-                
-        return all_embs
+                LOGGER.error("Gradient embeddings failed: %s", e)
+                LOGGER.info("Falling back to the local embedding model for this batch")
+                EMBEDDING_FALLBACKS.inc()
+
+        # Use the local model as fallback (or primary if Gradient disabled)
+        try:
+            # runs on the local embedder's own inference thread, batched with concurrent requests
+            embedder = get_local_embedder(self.emb_model_name)
+            emb_batch = await embedder.embed(batch)
+            LOGGER.info("Embedded batch using the local model (size=%d).", len(batch))
+            await self._cache_batch(embedder.model_id, batch, emb_batch)
+            return emb_batch
+        except Exception as e:
+            LOGGER.error("Local embeddings failed: %s", e)
+            raise RuntimeError(f"All embedding methods failed: {e}")
+
+    async def _embed_query_misses(self, queries: List[str]) -> np.ndarray:
+        # _embed_query has already looked in both cache tiers
+        return await self._embed_uncached(queries)
+
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """Normalized embedding of one query; cache misses go through the micro-batcher."""
+        if self.emb_cache is not None:
+            model_id = self._embedding_model_id()
+            cached = self.emb_cache.get_many(model_id, [query], memory_only=True)[0]
+            if cached is None:
+                cached = (await run_blocking(self.emb_cache.get_many, model_id, [query]))[0]
+            if cached is not None:
+                return _normalize_rows(cached[None, :])[0]
+        emb = await self.query_batcher.submit(query, key=normalize_text(query))
+        return _normalize_rows(emb[None, :])[0]
+
+    def _ingest_slots(self) -> asyncio.Semaphore:
+        # created lazily so it binds to the running event loop
+        if self._ingest_batch_slots is None:
+            self._ingest_batch_slots = asyncio.Semaphore(settings.INGEST_MAX_EMBED_BATCHES)
+        return self._ingest_batch_slots
+
+    async def _cache_batch(self, model: str | None, texts: List[str], embs):
+        # keyed by the model that actually produced the vectors, so fallback
+        # embeddings never answer lookups for the configured model
+        if self.emb_cache is not None and model:
+            await run_blocking(self.emb_cache.put_many, model, texts, embs)
+
+    async def _embed_stream(
+        self, batches: "List[Dict] | AsyncIterable[List[Dict]]", prepare: Callable | None = None, progress: Callable | None = None
+    ) -> Tuple[List[Dict], np.ndarray | None]:
+        """
+        Embed docs as their batches arrive (e.g. from a file that is still being
+        parsed, see aio.iter_blocking), so embedding overlaps parsing. At most
+        INGEST_MAX_EMBED_BATCHES batches wait for their embeddings before the next
+        one is read. prepare(batch) may rewrite or drop docs before they are embedded.
+        Returns every embedded doc, in order, with its (n, dim) embeddings; the
+        first embedding error cancels the remaining batches.
+        The "embed" ingest stage is observed here, less the time spent waiting for
+        the next batch (the parser's own time is its "parse" stage).
+        """
+        if isinstance(batches, list):
+            batches = _single_batch(batches)
+        started = time.perf_counter()
+        waiting = 0.0
+        docs: List[Dict] = []
+        tasks: List[asyncio.Task] = []
+        embedded: List[int] = []
+
+        def reporter(j: int):
+            # one running total across the batches
+            def report(stage, done, total):
+                embedded[j] = done
+                if progress:
+                    progress("embedding", sum(embedded), len(docs))
+            return report
+
+        pending = batches.__aiter__()
+        try:
+            while True:
+                wait_started = time.perf_counter()
+                try:
+                    batch = await pending.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    waiting += time.perf_counter() - wait_started
+                if prepare is not None:
+                    batch = prepare(batch)
+                if not batch:
+                    continue
+                running = [t for t in tasks if not t.done()]
+                if len(running) >= settings.INGEST_MAX_EMBED_BATCHES:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task.done():
+                        # re-raises a failed batch's error
+                        task.result()
+                docs.extend(batch)
+                embedded.append(0)
+                # bulk ingests share a bounded number of in-flight provider batches
+                tasks.append(asyncio.ensure_future(
+                    self._embed_texts([d["text"] for d in batch], progress=reporter(len(tasks)), slots=self._ingest_slots())
+                ))
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - started - waiting, stage="embed")
+            aclose = getattr(batches, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        return docs, (np.vstack(parts) if parts else None)
 
-    def add_documents(self, docs: List[Dict], override: bool = False):
+    async def add_documents(self, docs: "List[Dict] | AsyncIterable[List[Dict]]", override: bool = False, progress: Callable | None = None):
         """
-        docs: list of {"id","text","meta"}
+        docs: list of {"id","text","meta"}, or an async iterable of such lists
+        (streamed: embedding starts with the first batch, see _embed_stream).
         This will embed docs.text using the configured embeddings provider.
+        progress(stage, done, total) is called with "embedding" and then "committing".
+        Returns {"added": number of docs}.
         """
-        if override:
-            self._docs = []
+        docs, embs = await self._embed_stream(docs, progress=progress)
+        if not docs:
+            if override:
+                await run_blocking(self._clear)
+            return {"added": 0}
 
-        texts = [d["text"] for d in docs]
-        # get embeddings
-        embs = self._embed_texts(texts)  # list of lists
+        if progress:
+            progress("committing", len(docs), len(docs))
+        with INGEST_STAGE_SECONDS.time(stage="commit"):
+            await run_blocking(self._add_embedded, docs, embs, override)
+        LOGGER.info("Added %d documents to vector store (total=%d).", len(docs), len(self))
+        return {"added": len(docs)}
 
-        for d, emb in zip(docs, embs):
-            item = {"id": d["id"], "text": d["text"], "meta": d.get("meta", {}), "emb": np.array(emb, dtype=np.float32)}
-            self._docs.append(item)
+    def _add_embedded(self, docs: List[Dict], embs: np.ndarray, override: bool):
+        with self._write_lock():
+            if override:
+                self._clear()
+            with self._lock:
+                first_row = len(self)
+                metas = [d.get("meta", {}) for d in docs]
+                texts = [d["text"] for d in docs]
+                self._append_rows([d["id"] for d in docs], texts, metas, embs)
+                self.index.sync()
+                self.lexical.sync()
+                self.partitions.sync()
+                self._bump_generation()
+            self._index_sources(first_row, metas, texts)
+            self.persist()
 
-        self.persist()
-        LOGGER.info("Added %d documents to vector store (total=%d).", len(docs), len(self._docs))
+    async def replace_source(
+        self, source: str, docs: "List[Dict] | AsyncIterable[List[Dict]]", progress: Callable | None = None, event_id: str | None = None
+    ) -> Dict:
+        """
+        Make `docs` the current version of `source` (within `event_id`, if given);
+        docs may be streamed as an async iterable of lists, like add_documents.
+        Chunks whose content hash is already stored for the source are kept as they
+        are; only new or changed chunks are embedded. Chunks missing from the new
+        version are tombstoned. Additions and removals are published together, so
+        searches see either the old or the new version of the source, never a mix.
+        """
+        key = (source, event_id)
+        stored = await run_blocking(self._source_hashes, key)
+        hashes: set = set()
+        seen = 0
+
+        def new_chunks(batch: List[Dict]) -> List[Dict]:
+            nonlocal seen
+            seen += len(batch)
+            fresh = []
+            for d in batch:
+                meta = {**d.get("meta", {}), "source": source}
+                if event_id is not None:
+                    meta["event_id"] = event_id
+                meta["hash"] = meta.get("hash") or content_hash(d["text"])
+                # identical chunks repeated within one document are stored once
+                if meta["hash"] in hashes:
+                    continue
+                hashes.add(meta["hash"])
+                if meta["hash"] not in stored:
+                    fresh.append({**d, "meta": meta})
+            return fresh
+
+        new_docs, embs = await self._embed_stream(docs, prepare=new_chunks, progress=progress)
+        if progress:
+            progress("committing", seen, seen)
+        with INGEST_STAGE_SECONDS.time(stage="commit"):
+            result = await run_blocking(self._commit_source, key, hashes, new_docs, embs)
+        LOGGER.info(
+            "Replaced source %s: %d added, %d unchanged, %d removed (live rows=%d).",
+            source, result["added"], result["unchanged"], result["removed"], self.live_count,
+        )
+        return result
+
+    def _source_hashes(self, key: tuple) -> set:
+        self.refresh()
+        with self._persist_lock:
+            return set(self._source_index().get(key, {}))
 
-    def similarity_search(self, query: str, k: int = 4):
+    def _commit_source(self, key: tuple, hashes: set, new_docs: List[Dict], embs: np.ndarray | None) -> Dict:
+        with self._write_lock():
+            current = self._source_index().get(key, {})
+            # duplicates of a kept chunk, and every row of a chunk that is gone
+            stale = [r for h, rows in current.items() for r in (rows[1:] if h in hashes else rows)]
+            # another ingest of this source may have committed some of these meanwhile
+            fresh = [i for i, d in enumerate(new_docs) if d["meta"]["hash"] not in current]
+            unchanged = sum(1 for h in current if h in hashes)
+            if not fresh and not stale:
+                return {"added": 0, "unchanged": unchanged, "removed": 0}
+            docs = [new_docs[i] for i in fresh]
+            metas = [d["meta"] for d in docs]
+            texts = [d["text"] for d in docs]
+            with self._lock:
+                first_row = len(self)
+                if docs:
+                    self._append_rows([d["id"] for d in docs], texts, metas, embs[fresh])
+                self._mark_deleted(stale)
+                self.index.sync()
+                self.lexical.sync()
+                self.partitions.sync()
+                self._bump_generation()
+            self._sources[key] = {h: rows[:1] for h, rows in current.items() if h in hashes}
+            self._index_sources(first_row, metas, texts)
+            self.persist()
+            self.compact()
+        return {"added": len(docs), "unchanged": unchanged, "removed": len(stale)}
+
+    async def similarity_search(self, query: str, k: int = 4):
+        """Return top-k nearest docs by cosine similarity."""
+        return await self.search(query, k=k, mode="vector")
+
+    async def similarity_search_batch(self, queries: "Sequence[str] | np.ndarray", k: int = 4, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity for many queries: strings (embedded in one
+        pass, through the embedding cache) or a (q, dim) array of embeddings.
+        Returns (q, k) int64 row indices and float32 scores, best first; slots past
+        the last live row are -1 / -inf. Rows are materialized with get_rows().
+        """
+        if isinstance(queries, np.ndarray):
+            embs = queries
+        else:
+            embs = await self._embed_texts(list(queries))
+        return await run_blocking(self.similarity_search_vectors, embs, k, exact)
+
+    def similarity_search_vectors(self, embs: np.ndarray, k: int = 4, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Blocking raw-vector entry point of similarity_search_batch. Uses the
+        configured ANN backend, or the tiled exact scan (ann.blocked_top_k) with
+        `exact`, e.g. to measure the backend's recall.
         """
-        Return top-k nearest docs by cosine similarity.
+        embs = np.asarray(embs, dtype=np.float32)
+        if embs.ndim == 1:
+            embs = embs[None, :]
+        dim = self._dim()
+        if dim and embs.shape[1] != dim:
+            raise ValueError(f"Embedding dimension mismatch: store has {dim}, got {embs.shape[1]}")
+        q_embs = _normalize_rows(embs)
+        with self._lock:
+            if exact:
+                return blocked_top_k(self, q_embs, k)
+            return self.index.search_batch(q_embs, k)
+
+    def get_rows(self, indices) -> List[Dict | None]:
+        """{"id","text","meta"} of the given row indices (as returned by the batch searches); None for -1."""
+        with self._lock:
+            return [self._row(int(i)) if i >= 0 else None for i in indices]
+
+    async def search(self, query: str, k: int = 4, mode: str = "vector", filters: Dict | None = None):
         """
-        if not self._docs:
+        Return the top-k docs for `query`:
+          "vector"   cosine similarity of embeddings
+          "lexical"  BM25 over the chunk text
+          "hybrid"   both rankings fused with reciprocal rank fusion
+        `filters` restricts the search to rows whose meta matches, e.g.
+        {"event_id": "devfest", "tags": ["workshop", "keynote"]}: a list matches
+        any of its values, different keys must all match.
+        Repeated (normalized) queries are answered from the retrieval cache until
+        the corpus changes.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
+        filters = normalize_filters(filters)
+        if self.live_count == 0:
             return []
-        # embed query
-        q_emb_list = self._embed_texts([query])
-        q_emb = np.array(q_emb_list[0], dtype=np.float32)
-
-        embs = np.vstack([d["emb"] for d in self._docs])
-        # cosine similarity
-        q_norm = np.linalg.norm(q_emb) + 1e-12
-        doc_norms = np.linalg.norm(embs, axis=1) + 1e-12
-        sims = (embs @ q_emb) / (doc_norms * q_norm)
-        idxs = np.argsort(sims)[::-1][:k]
-        results = []
-        for i in idxs:
-            d = self._docs[int(i)]
-            results.append({"id": d["id"], "text": d["text"], "meta": d["meta"], "score": float(sims[int(i)])})
+        key = (self.generation, normalize_query(query), k, mode, filters)
+        hit = self.results_cache.get(key)
+        if hit is not None:
+            # rows are read under the store lock, so never on the event loop
+            results = await run_blocking(self._rows_for, key[0], *hit)
+            if results is not None:
+                return results
+        q_emb = None
+        if mode != "lexical":
+            # embed query
+            with CHAT_STAGE_SECONDS.time(stage="embed_query"):
+                q_emb = await self._embed_query(query)
+        with CHAT_STAGE_SECONDS.time(stage="search"):
+            if filters:
+                search, args = self._search_filtered, (q_emb, query, k, mode, filters)
+            elif mode == "lexical":
+                search, args = self._search_lexical, (query, k)
+            elif mode == "vector":
+                search, args = self._search_vector, (q_emb, k)
+            else:
+                search, args = self._search_hybrid, (q_emb, query, k)
+            generation, idxs, sims, results = await run_blocking(self._search_rows, search, *args)
+        # the generation the ids belong to, which a commit may have moved past key[0] meanwhile
+        self.results_cache.set((generation,) + key[1:], (idxs, sims))
+        return results
+
+    async def search_batch(self, queries: List[str], k: int = 4, mode: str = "vector", filters: Dict | None = None) -> List[List[Dict]]:
+        """
+        search() for many queries at once: cache misses are embedded together and
+        vector retrieval scores them all in one matrix-matrix pass over the rows.
+        Returns one result list per query, in order.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
+        filters = normalize_filters(filters)
+        out: List[List[Dict] | None] = [None] * len(queries)
+        if self.live_count == 0:
+            return [[] for _ in queries]
+        generation = self.generation
+        # distinct normalized query -> positions of the queries it answers
+        todo: Dict[str, List[int]] = {}
+        cached: Dict[int, tuple] = {}
+        for i, query in enumerate(queries):
+            key = (generation, normalize_query(query), k, mode, filters)
+            hit = self.results_cache.get(key)
+            if hit is not None:
+                cached[i] = hit
+            else:
+                todo.setdefault(key[1], []).append(i)
+        if cached:
+            rows = await run_blocking(lambda: [self._rows_for(generation, *hit) for hit in cached.values()])
+            for i, results in zip(cached, rows):
+                if results is None:
+                    # the corpus changed meanwhile: search again below
+                    todo.setdefault(normalize_query(queries[i]), []).append(i)
+                out[i] = results
+        if todo:
+            texts = [queries[idxs[0]] for idxs in todo.values()]
+            q_embs = None
+            if mode != "lexical":
+                q_embs = _normalize_rows(await self._embed_texts(texts))
+            generation, hits = await run_blocking(self._search_many_rows, q_embs, texts, k, mode, filters)
+            for (norm, idxs), (row_ids, sims, results) in zip(todo.items(), hits):
+                self.results_cache.set((generation, norm, k, mode, filters), (row_ids, sims))
+                for i in idxs:
+                    out[i] = results
+        return out
+
+    def _search_rows(self, search: Callable, *args):
+        """
+        Run one of the _search_* functions and build its result rows, on the worker
+        thread. The store lock is held throughout, so the ids and rows come from one
+        generation (returned first) however the corpus changed while the query was embedded.
+        """
+        with self._lock:
+            generation = self.generation
+            idxs, sims = search(*args)
+            return generation, idxs, sims, self._rows_for(generation, idxs, sims)
+
+    def _search_many_rows(self, *args):
+        with self._lock:
+            generation = self.generation
+            return generation, [(idxs, sims, self._rows_for(generation, idxs, sims)) for idxs, sims in self._search_many(*args)]
+
+    def _search_many(self, q_embs: np.ndarray | None, texts: List[str], k: int, mode: str, filters: tuple):
+        """Per-query (row ids, scores) for search_batch."""
+        if filters:
+            return [self._search_filtered(None if q_embs is None else q_embs[j], text, k, mode, filters) for j, text in enumerate(texts)]
+        if mode == "lexical":
+            return [self._search_lexical(text, k) for text in texts]
+        depth = k if mode == "vector" else max(k * _FUSION_DEPTH_FACTOR, _FUSION_MIN_DEPTH)
+        with self._lock:
+            v_idxs, v_sims = self.index.search_batch(q_embs, depth)
+            if mode == "vector":
+                return list(zip(v_idxs, v_sims))
+            l_hits = [self.lexical.search(text, depth)[0] for text in texts]
+        return [reciprocal_rank_fusion([v[np.isfinite(s)], l], k) for v, s, l in zip(v_idxs, v_sims, l_hits)]
+
+    def _search_vector(self, q_emb: np.ndarray, k: int):
+        with self._lock:
+            return self.index.search(q_emb, k)
+
+    def _search_lexical(self, query: str, k: int):
+        with self._lock:
+            return self.lexical.search(query, k)
+
+    def _search_hybrid(self, q_emb: np.ndarray, query: str, k: int):
+        # fuse deeper candidate lists than k so rows ranked moderately by both can win
+        depth = max(k * _FUSION_DEPTH_FACTOR, _FUSION_MIN_DEPTH)
+        with self._lock:
+            v_idxs, v_sims = self.index.search(q_emb, depth)
+            l_idxs, _ = self.lexical.search(query, depth)
+        v_idxs = v_idxs[np.isfinite(v_sims)]
+        return reciprocal_rank_fusion([v_idxs, l_idxs], k)
+
+    def _search_filtered(self, q_emb: np.ndarray | None, query: str, k: int, mode: str, filters: tuple):
+        # exact scoring restricted to the matching partitions; never touches other rows
+        with self._lock:
+            rows = self.partitions.match(filters)
+            if not rows.size:
+                return rows, np.empty(0, dtype=np.float32)
+            depth = k if mode != "hybrid" else max(k * _FUSION_DEPTH_FACTOR, _FUSION_MIN_DEPTH)
+            if mode != "lexical":
+                sims = self._row_vectors(rows) @ q_emb
+                best = top_k(sims, depth)
+                v_idxs, v_sims = rows[best], sims[best]
+                if mode == "vector":
+                    return v_idxs, v_sims
+            l_idxs, l_sims = self.lexical.search(query, depth, rows=rows)
+            if mode == "lexical":
+                return l_idxs, l_sims
+        return reciprocal_rank_fusion([v_idxs, l_idxs], k)
+
+    def _rows_for(self, generation: int, idxs: np.ndarray, sims: np.ndarray) -> List[Dict] | None:
+        """Materialize result rows; None if the corpus changed since the ids were computed."""
+        with self._lock:
+            if generation != self.generation:
+                return None
+            results = []
+            for i, score in zip(idxs, sims):
+                if score == -np.inf:
+                    # tombstoned rows sort last; fewer than k live rows matched
+                    break
+                row = self._row(int(i))
+                row["score"] = float(score)
+                results.append(row)
         return results
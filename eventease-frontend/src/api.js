@@ -7,11 +7,27 @@ export const chat = async (query, conversation_id = "demo_user") => {
     return res.data;
 };
 
-export const ingestFile = async (file, override = false) => {
+export const getIngestJob = async (jobId) => {
+    const res = await axios.get(`${API_BASE}/ingest/${jobId}`);
+    return res.data;
+};
+
+// Uploads the file, then polls the background ingest job until it finishes.
+// onProgress (optional) receives each job status snapshot.
+export const ingestFile = async (file, override = false, onProgress = null) => {
     const formData = new FormData();
     formData.append("file", file);
     const res = await axios.post(`${API_BASE}/ingest?override=${override}`, formData, {
         headers: { "Content-Type": "multipart/form-data" },
     });
-    return res.data;
+    let job = res.data;
+    while (!["succeeded", "failed", "cancelled"].includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await getIngestJob(res.data.job_id);
+        if (onProgress) onProgress(job);
+    }
+    if (job.status !== "succeeded") {
+        throw new Error(job.error || `Ingestion ${job.status}.`);
+    }
+    return job;
 };
@@ -15,8 +15,17 @@ export default function FileUpload() {
         setIsUploading(true);
         setStatus("Uploading...");
         try {
-            const res = await ingestFile(file, true);
-            setStatus(res.detail || "File uploaded and indexed!");
+            await ingestFile(file, false, (job) => {
+                if (job.stage === "parsing") {
+                    setStatus(`Reading pages ${job.pages_parsed}/${job.pages_total ?? "?"}...`);
+                } else if (job.stage === "embedding") {
+                    const eta = job.eta_seconds != null ? ` (~${Math.ceil(job.eta_seconds)}s left)` : "";
+                    setStatus(`Indexing chunks ${job.chunks_embedded}/${job.chunks_total ?? "?"}${eta}...`);
+                } else if (job.stage === "committing") {
+                    setStatus("Saving index...");
+                }
+            });
+            setStatus("File uploaded and indexed!");
             // Optional: clear file after successful upload
             setFile(null);
         } catch (err) {